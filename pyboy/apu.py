@@ -0,0 +1,383 @@
+"""
+The APU: four sound channels behind 0xFF10-0xFF3F.
+
+Nothing is done per sample in Python. tick() only counts cycles, and
+they are caught up on when a register is written or the output is
+read. Catching up goes a segment at a time: register writes and the
+frame sequencer's length, sweep and envelope clocks (every 8192
+cycles) split segments, so nothing about a channel changes inside one
+and its samples are worked out as arrays from its phase.
+
+A muted APU keeps the registers, length counters, sweep and envelopes
+just as they would be, but makes no samples.
+"""
+import numpy as np
+
+
+CLOCK_HZ = 4194304
+SAMPLE_RATE = 48000
+# samples output holds by default
+CAPACITY = 8192
+SEQUENCER_CYCLES = 8192
+
+# registers, as offsets from 0xFF10; channel n's five start at n * 5
+NR10, NR11, NR12, NR13, NR14 = range(0x00, 0x05)
+NR21, NR22, NR23, NR24 = range(0x06, 0x0A)
+NR30, NR31, NR32, NR33, NR34 = range(0x0A, 0x0F)
+NR41, NR42, NR43, NR44 = range(0x10, 0x14)
+NR50, NR51, NR52 = range(0x14, 0x17)
+WAVE = 0x20
+
+POWER = 0x80
+TRIGGER = 0x80
+LENGTH_ENABLE = 0x40
+ENVELOPE_UP = 0x08
+SWEEP_DOWN = 0x08
+WAVE_DAC = 0x80
+NOISE_SHORT = 0x08
+
+SQUARE1, SQUARE2, WAVE_CHANNEL, NOISE = range(4)
+
+# bits that always read back as 1
+READ_MASKS = bytes([
+    0x80, 0x3F, 0x00, 0xFF, 0xBF,
+    0xFF, 0x3F, 0x00, 0xFF, 0xBF,
+    0x7F, 0xFF, 0x9F, 0xFF, 0xBF,
+    0xFF, 0xFF, 0x00, 0x00, 0xBF,
+    0x00, 0x00, 0x70]) + bytes([0xFF] * 9) + bytes(16)
+
+DUTIES = np.array([[0, 0, 0, 0, 0, 0, 0, 1],
+                   [1, 0, 0, 0, 0, 0, 0, 1],
+                   [1, 0, 0, 0, 0, 1, 1, 1],
+                   [0, 1, 1, 1, 1, 1, 1, 0]], np.uint8)
+
+# NR32's output level as a right shift of the wave samples
+WAVE_SHIFTS = (4, 0, 1, 2)
+
+NOISE_DIVISORS = (8, 16, 32, 48, 64, 80, 96, 112)
+
+
+def lfsr_sequence(width):
+    """
+    The noise channel's output, one value per LFSR step from reset,
+    for a whole period of the width bit LFSR.
+    """
+    lfsr = 0x7FFF
+    out = bytearray()
+    for _ in range((1 << width) - 1):
+        out.append(~lfsr & 1)
+        bit = (lfsr ^ (lfsr >> 1)) & 1
+        lfsr = (lfsr >> 1) | (bit << 14)
+        if width == 7:
+            lfsr = (lfsr & ~0x40) | (bit << 6)
+    return np.frombuffer(bytes(out), np.uint8)
+
+
+LFSR15 = lfsr_sequence(15)
+LFSR7 = lfsr_sequence(7)
+
+
+class Channel(object):
+    """
+    The running state of one channel; its settings stay in the APU's
+    registers.
+    """
+    def __init__(self, base):
+        self.base = base
+        self.on = False
+        self.length = 0
+        self.volume = 0
+        self.envelope_timer = 0
+        # cycles into the current waveform period, or LFSR step
+        self.phase = 0
+        self.lfsr = 0
+
+
+class APU(object):
+    """
+    Register at 0xFF10. tick() with the cycles run, then read() the
+    stereo int16 samples made since the last read.
+    """
+    def __init__(self, muted=False, sample_rate=SAMPLE_RATE,
+                 capacity=CAPACITY):
+        self.muted = muted
+        self.sample_rate = sample_rate
+        self._cycles_per_sample = CLOCK_HZ / float(sample_rate)
+        self._regs = bytearray(0x30)
+        self._regs[NR50] = 0x77
+        self._regs[NR51] = 0xF3
+        self._power = True
+        self.channels = [Channel(base) for base in (0x00, 0x05, 0x0A, 0x0F)]
+        self._sweep_enabled = False
+        self._sweep_timer = 0
+        self._shadow = 0
+        self._pending = 0
+        self._sequencer_cycles = 0
+        self._step = 0
+        # cycles from the start of the next segment to the next sample
+        self._sample_time = 0.0
+        self.output = np.zeros((capacity, 2), np.int16)
+        self.available = 0
+        self.dropped = 0
+
+    def fork(self, forks=None):
+        """
+        An APU in the same state, holding the same unread samples.
+        """
+        apu = APU(self.muted, self.sample_rate, len(self.output))
+        apu._regs[:] = self._regs
+        for ours, theirs in zip(self.channels, apu.channels):
+            theirs.__dict__.update(vars(ours))
+        for name in ("_power", "_sweep_enabled", "_sweep_timer", "_shadow",
+                     "_pending", "_sequencer_cycles", "_step",
+                     "_sample_time", "available", "dropped"):
+            setattr(apu, name, getattr(self, name))
+        apu.output[:self.available] = self.output[:self.available]
+        return apu
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __getitem__(self, addr):
+        if addr == NR52:
+            self._catch_up()
+            status = sum(1 << i for i, ch in enumerate(self.channels)
+                         if ch.on)
+            return READ_MASKS[NR52] | (POWER if self._power else 0) | status
+        return self._regs[addr] | READ_MASKS[addr]
+
+    def __setitem__(self, addr, val):
+        self._catch_up()
+        regs = self._regs
+        if addr >= WAVE:
+            regs[addr] = val
+        elif addr == NR52:
+            if not val & POWER:
+                regs[:NR52] = bytes(NR52)
+                for ch in self.channels:
+                    ch.on = False
+                    ch.length = 0
+            self._power = bool(val & POWER)
+        elif self._power and addr < NR52:
+            regs[addr] = val
+            if addr < NR50:
+                self._write_channel(addr // 5, addr % 5, val)
+
+    def _write_channel(self, i, reg, val):
+        ch = self.channels[i]
+        if reg == 1:
+            if i == WAVE_CHANNEL:
+                ch.length = 256 - val
+            else:
+                ch.length = 64 - (val & 0x3F)
+        elif not self._dac_on(i):
+            ch.on = False
+        elif reg == 4 and val & TRIGGER:
+            self._trigger(i, ch)
+
+    def _dac_on(self, i):
+        if i == WAVE_CHANNEL:
+            return bool(self._regs[NR30] & WAVE_DAC)
+        return bool(self._regs[i * 5 + 2] & 0xF8)
+
+    def _frequency(self, ch):
+        regs = self._regs
+        return (regs[ch.base + 4] & 7) << 8 | regs[ch.base + 3]
+
+    def _trigger(self, i, ch):
+        ch.on = True
+        if ch.length == 0:
+            ch.length = 256 if i == WAVE_CHANNEL else 64
+        ch.phase = 0
+        ch.lfsr = 0
+        if i != WAVE_CHANNEL:
+            envelope = self._regs[ch.base + 2]
+            ch.volume = envelope >> 4
+            ch.envelope_timer = envelope & 7
+        if i == SQUARE1:
+            sweep = self._regs[NR10]
+            self._shadow = self._frequency(ch)
+            self._sweep_timer = (sweep >> 4 & 7) or 8
+            self._sweep_enabled = bool(sweep & 0x77)
+            if sweep & 7 and self._sweep_next() > 2047:
+                ch.on = False
+
+    def tick(self, cycles):
+        self._pending += cycles
+
+    def read(self):
+        """
+        The samples made since the last read, as a view of output that
+        is good until the APU next makes samples.
+        """
+        self._catch_up()
+        block = self.output[:self.available]
+        self.available = 0
+        return block
+
+    def _idle(self):
+        for ch in self.channels:
+            if ch.on or (ch.length and
+                         self._regs[ch.base + 4] & LENGTH_ENABLE):
+                return False
+        return True
+
+    def _catch_up(self):
+        cycles = self._pending
+        if not cycles:
+            return
+        self._pending = 0
+        if self.muted and self._idle():
+            # no clock would change anything, so just keep count
+            total = self._sequencer_cycles + cycles
+            self._step = (self._step + total // SEQUENCER_CYCLES) & 7
+            self._sequencer_cycles = total % SEQUENCER_CYCLES
+            return
+        while cycles:
+            n = min(cycles, SEQUENCER_CYCLES - self._sequencer_cycles)
+            if not self.muted:
+                self._synthesize(n)
+            cycles -= n
+            self._sequencer_cycles += n
+            if self._sequencer_cycles == SEQUENCER_CYCLES:
+                self._sequencer_cycles = 0
+                self._clock_sequencer()
+
+    def _clock_sequencer(self):
+        step = self._step
+        if not step & 1:
+            self._clock_lengths()
+        if step == 2 or step == 6:
+            self._clock_sweep()
+        if step == 7:
+            self._clock_envelopes()
+        self._step = (step + 1) & 7
+
+    def _clock_lengths(self):
+        regs = self._regs
+        for ch in self.channels:
+            if ch.length and regs[ch.base + 4] & LENGTH_ENABLE:
+                ch.length -= 1
+                if not ch.length:
+                    ch.on = False
+
+    def _clock_envelopes(self):
+        for i in (SQUARE1, SQUARE2, NOISE):
+            ch = self.channels[i]
+            envelope = self._regs[ch.base + 2]
+            if not envelope & 7 or not ch.on:
+                continue
+            ch.envelope_timer -= 1
+            if ch.envelope_timer > 0:
+                continue
+            ch.envelope_timer = envelope & 7
+            if envelope & ENVELOPE_UP:
+                ch.volume = min(ch.volume + 1, 15)
+            else:
+                ch.volume = max(ch.volume - 1, 0)
+
+    def _sweep_next(self):
+        sweep = self._regs[NR10]
+        delta = self._shadow >> (sweep & 7)
+        if sweep & SWEEP_DOWN:
+            return self._shadow - delta
+        return self._shadow + delta
+
+    def _clock_sweep(self):
+        if self._sweep_timer:
+            self._sweep_timer -= 1
+        if self._sweep_timer:
+            return
+        sweep = self._regs[NR10]
+        self._sweep_timer = (sweep >> 4 & 7) or 8
+        if not self._sweep_enabled or not sweep & 0x70:
+            return
+        ch = self.channels[SQUARE1]
+        frequency = self._sweep_next()
+        if frequency > 2047:
+            ch.on = False
+        elif sweep & 7:
+            self._shadow = frequency
+            self._regs[NR13] = frequency & 0xFF
+            self._regs[NR14] = (self._regs[NR14] & ~7) | frequency >> 8
+            if self._sweep_next() > 2047:
+                ch.on = False
+
+    def _synthesize(self, cycles):
+        """
+        Make the samples for the next cycles cycles, none of which
+        changes any channel.
+        """
+        cps = self._cycles_per_sample
+        count = 0
+        if cycles > self._sample_time:
+            count = int(np.ceil((cycles - self._sample_time) / cps))
+        times = self._sample_time + np.arange(count) * cps
+        self._sample_time += count * cps - cycles
+        capacity = len(self.output)
+        if count > capacity:
+            times = times[-capacity:]
+            self.dropped += count - capacity
+            count = capacity
+        left = np.zeros(count)
+        right = np.zeros(count)
+        panning = self._regs[NR51]
+        for i, ch in enumerate(self.channels):
+            if not ch.on:
+                continue
+            values = self._channel_values(i, ch, times, cycles)
+            if panning & (0x10 << i):
+                left += values
+            if panning & (1 << i):
+                right += values
+        self._emit(left, right)
+
+    def _channel_values(self, i, ch, times, cycles):
+        """
+        Channel i's output, 0 to 15, at times cycles from now, moving
+        its phase on by cycles.
+        """
+        regs = self._regs
+        if i == NOISE:
+            polynomial = regs[NR43]
+            period = NOISE_DIVISORS[polynomial & 7] << (polynomial >> 4)
+            table = LFSR7 if polynomial & NOISE_SHORT else LFSR15
+            steps = ((ch.phase + times) // period).astype(np.intp)
+            values = table[(ch.lfsr + steps) % len(table)] * ch.volume
+            total = ch.phase + cycles
+            ch.lfsr = (ch.lfsr + total // period) % len(table)
+            ch.phase = total % period
+            return values
+        frequency = self._frequency(ch)
+        if i == WAVE_CHANNEL:
+            period = (2048 - frequency) * 2
+            wave = np.frombuffer(regs, np.uint8, 16, WAVE)
+            samples = np.stack((wave >> 4, wave & 0xF), axis=1).ravel()
+            samples >>= WAVE_SHIFTS[regs[NR32] >> 5 & 3]
+            positions = ((ch.phase + times) // period).astype(np.intp)
+            values = samples[positions & 31]
+            ch.phase = (ch.phase + cycles) % (period * 32)
+            return values
+        period = (2048 - frequency) * 4
+        duty = DUTIES[regs[ch.base + 1] >> 6]
+        positions = ((ch.phase + times) // period).astype(np.intp)
+        values = duty[positions & 7] * ch.volume
+        ch.phase = (ch.phase + cycles) % (period * 8)
+        return values
+
+    def _emit(self, left, right):
+        count = len(left)
+        if not count:
+            return
+        start = self.available
+        if start + count > len(self.output):
+            # nobody is reading; start again rather than grow
+            self.dropped += start
+            start = 0
+        volume = self._regs[NR50]
+        # four channels at 15 each, then NR50's 1-8 per side
+        scale = 32767 / 60.0 / 8
+        out = self.output[start:start + count]
+        out[:, 0] = left * (scale * ((volume >> 4 & 7) + 1))
+        out[:, 1] = right * (scale * ((volume & 7) + 1))
+        self.available = start + count
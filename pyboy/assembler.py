@@ -0,0 +1,275 @@
+"""
+A small assembler, for building test and benchmark ROMs.
+
+The instruction table is read off a Z80's dispatch tables, and each
+handler's name is turned into its assembly by opcodes.mnemonic(). So
+it only knows the instructions the cpu dispatches, written the way the
+profiler prints them:
+
+    ld a, (hl+)    ldh (a8), a    ld (a16), a    jr nz, r8    bit 7, h
+
+An operand placeholder takes an expression: a number (0x10, $10, %101
+or 16), a label, or a sum of them. jr takes the address to jump to.
+Labels end in a colon. org sets the address, db and dw lay down
+bytes and words, and ds reserves zeros. Comments start with ';'.
+"""
+from cartridge import BANK_SIZE, CARTRIDGE_TYPE, RAM_SIZE
+from opcodes import mnemonic
+from z80 import Z80
+
+
+# operand placeholders, and how many bytes each takes
+IMMEDIATES = {"d8": 1, "a8": 1, "r8": 1, "d16": 2, "a16": 2}
+
+# names that can't be expressions
+REGISTERS = set(["a", "b", "c", "d", "e", "h", "l", "af", "bc", "de", "hl",
+                 "sp", "nz", "z", "nc"])
+
+# stop is followed by a byte the cpu skips
+PADDING = {"stop": b"\x00"}
+
+# the logo the boot ROM checks for
+LOGO = bytes([
+    0xCE, 0xED, 0x66, 0x66, 0xCC, 0x0D, 0x00, 0x0B, 0x03, 0x73, 0x00, 0x83,
+    0x00, 0x0C, 0x00, 0x0D, 0x00, 0x08, 0x11, 0x1F, 0x88, 0x89, 0x00, 0x0E,
+    0xDC, 0xCC, 0x6E, 0xE6, 0xDD, 0xDD, 0xD9, 0x99, 0xBB, 0xBB, 0x67, 0x63,
+    0x6E, 0x0E, 0xEC, 0xCC, 0xDD, 0xDC, 0x99, 0x9F, 0xBB, 0xB9, 0x33, 0x3E,
+])
+
+ENTRY = 0x100
+HEADER_END = 0x150
+TITLE = 0x134
+ROM_BANKS = 0x148
+HEADER_CHECKSUM = 0x14D
+GLOBAL_CHECKSUM = 0x14E
+
+
+def _instructions():
+    """
+    {op: [(operands, encoding)]} for every handler the cpu dispatches
+    to.
+    """
+    cpu = Z80(None)
+    handlers = [(bytes([code]), handler)
+                for code, handler in cpu.op_map.items() if code != 0xCB]
+    handlers += [(bytes([0xCB, code]), handler)
+                 for code, handler in cpu.extra_ops_map.items()]
+    table = {}
+    for encoding, handler in handlers:
+        op, _, operands = mnemonic(handler.__name__).partition(" ")
+        operands = tuple(o.replace(" ", "") for o in operands.split(",")
+                         if o)
+        table.setdefault(op, []).append((operands, encoding))
+    return table
+
+
+INSTRUCTIONS = _instructions()
+
+
+def _number(text):
+    try:
+        if text.startswith("$"):
+            return int(text[1:], 16)
+        if text.startswith("%"):
+            return int(text[1:], 2)
+        return int(text, 0)
+    except ValueError:
+        return None
+
+
+def _is_expression(text):
+    return (bool(text) and text.lower() not in REGISTERS and
+            not text.startswith("("))
+
+
+def _match(pattern, operand):
+    """
+    How well operand fits pattern: None for not at all, else
+    (score, placeholder, expression). Exact matches score highest.
+    """
+    if pattern == operand.lower():
+        return 2, None, None
+    if pattern in IMMEDIATES:
+        if _is_expression(operand):
+            return 0, pattern, operand
+        return None
+    if pattern in ("(a8)", "(a16)"):
+        if operand.startswith("(") and operand.endswith(")"):
+            inner = operand[1:-1]
+            if _is_expression(inner):
+                return 1, pattern[1:-1], inner
+        return None
+    if pattern == "sp+r8":
+        if operand.lower()[:3] in ("sp+", "sp-"):
+            return 1, "r8", operand[2:]
+        return None
+    value = _number(pattern)
+    if value is not None and _number(operand) == value:
+        return 2, None, None
+    return None
+
+
+def _select(op, operands):
+    """
+    The encoding and (placeholder, expression) operands for one
+    instruction, or None.
+    """
+    best = None
+    for pattern, encoding in INSTRUCTIONS.get(op, ()):
+        if len(pattern) != len(operands):
+            continue
+        matches = [_match(p, o) for p, o in zip(pattern, operands)]
+        if None in matches:
+            continue
+        score = sum(m[0] for m in matches)
+        if best is None or score > best[0]:
+            best = (score, encoding,
+                    [(m[1], m[2]) for m in matches if m[1]])
+    return best and best[1:]
+
+
+def _evaluate(expression, labels, line):
+    value = 0
+    sign = 1
+    term = ""
+    for ch in expression.replace(" ", "") + "+":
+        if ch in "+-" and term:
+            number = _number(term)
+            if number is None:
+                if term not in labels:
+                    raise ValueError("line %d: unknown label %s" %
+                                     (line, term))
+                number = labels[term]
+            value += sign * number
+            sign = 1 if ch == "+" else -1
+            term = ""
+        elif ch == "-":
+            sign = -sign
+        elif ch != "+":
+            term += ch
+    return value
+
+
+def _encode(placeholder, value, line):
+    if placeholder == "a8" and 0xFF00 <= value <= 0xFFFF:
+        value -= 0xFF00
+    width = IMMEDIATES[placeholder] * 8
+    signed = placeholder == "r8"
+    low = -(1 << width - 1) if signed or placeholder[0] == "d" else 0
+    high = (1 << width - 1) - 1 if signed else (1 << width) - 1
+    if not low <= value <= high:
+        raise ValueError("line %d: %s out of range: %d" %
+                         (line, placeholder, value))
+    value &= (1 << width) - 1
+    return bytes([value & 0xFF, value >> 8][:IMMEDIATES[placeholder]])
+
+
+def _parse(source, origin):
+    """
+    The labels and a list of (address, line, kind, data) items.
+    """
+    labels = {}
+    items = []
+    address = origin
+    for line, text in enumerate(source.splitlines(), 1):
+        text = text.split(";")[0].strip()
+        while ":" in text:
+            label, _, text = text.partition(":")
+            label = label.strip()
+            if label in labels:
+                raise ValueError("line %d: %s defined twice" % (line, label))
+            labels[label] = address
+            text = text.strip()
+        if not text:
+            continue
+        op, _, rest = text.partition(" ")
+        op = op.lower()
+        operands = [o.strip() for o in rest.split(",") if o.strip()]
+        if op == "org":
+            address = _evaluate(operands[0], labels, line)
+            continue
+        if op == "ds":
+            size = _evaluate(operands[0], labels, line)
+            items.append((address, line, "bytes", [("d8", "0")] * size))
+            address += size
+            continue
+        if op in ("db", "dw"):
+            placeholder = "d8" if op == "db" else "d16"
+            items.append((address, line, "bytes",
+                          [(placeholder, o) for o in operands]))
+            address += len(operands) * IMMEDIATES[placeholder]
+            continue
+        operands = [o.replace(" ", "") for o in operands]
+        selected = _select(op, operands)
+        if selected is None:
+            raise ValueError("line %d: can't assemble %r" % (line, text))
+        encoding, placeholders = selected
+        encoding += PADDING.get(op, b"")
+        size = len(encoding) + sum(IMMEDIATES[p] for p, _ in placeholders)
+        items.append((address, line, "instruction",
+                      (op, encoding, placeholders, size)))
+        address += size
+    return labels, items
+
+
+def assemble(source, origin=0):
+    """
+    Assemble source, starting at origin. Returns the code as a list
+    of (address, bytes), one per run of contiguous code, and the
+    labels as a dict of addresses.
+    """
+    labels, items = _parse(source, origin)
+    segments = []
+    for address, line, kind, data in items:
+        if kind == "bytes":
+            code = b"".join(_encode(p, _evaluate(e, labels, line), line)
+                            for p, e in data)
+        else:
+            op, encoding, placeholders, size = data
+            code = encoding
+            for placeholder, expression in placeholders:
+                value = _evaluate(expression, labels, line)
+                if op == "jr":
+                    # relative to the next instruction
+                    value -= address + size
+                code += _encode(placeholder, value, line)
+        if segments and segments[-1][0] + len(segments[-1][1]) == address:
+            segments[-1] = (segments[-1][0], segments[-1][1] + code)
+        else:
+            segments.append((address, code))
+    return segments, labels
+
+
+def cartridge(source, title="", cartridge_type=0x00, banks=2, ram_size=0):
+    """
+    A cartridge image running source, which is assembled from 0x150,
+    the end of the header. The entry point jumps to the label main,
+    or to 0x150 if there isn't one. Addresses past 0x8000 are image
+    offsets, for filling the banks of a bigger cartridge.
+    """
+    segments, labels = assemble(source, HEADER_END)
+    rom = bytearray(banks * BANK_SIZE)
+    for address, code in segments:
+        if address < HEADER_END and address + len(code) > ENTRY:
+            raise ValueError("code at 0x%04X overwrites the header" %
+                             address)
+        if address + len(code) > len(rom):
+            raise ValueError("code at 0x%04X is past the end of the ROM" %
+                             address)
+        rom[address:address + len(code)] = code
+    main = labels.get("main", HEADER_END)
+    rom[ENTRY:ENTRY + 4] = bytes([0x00, 0xC3, main & 0xFF, main >> 8])
+    rom[ENTRY + 4:ENTRY + 4 + len(LOGO)] = LOGO
+    rom[TITLE:TITLE + 16] = title.encode("ascii")[:16].ljust(16, b"\0")
+    rom[CARTRIDGE_TYPE] = cartridge_type
+    rom[ROM_BANKS] = banks.bit_length() - 2
+    rom[RAM_SIZE] = ram_size
+    checksum = 0
+    for byte in rom[TITLE:HEADER_CHECKSUM]:
+        checksum = (checksum - byte - 1) & 0xFF
+    rom[HEADER_CHECKSUM] = checksum
+    # the sum of every byte but its own two, which are still zero
+    total = sum(rom) & 0xFFFF
+    rom[GLOBAL_CHECKSUM] = total >> 8
+    rom[GLOBAL_CHECKSUM + 1] = total & 0xFF
+    return bytes(rom)
@@ -0,0 +1,17 @@
+"""
+Performance benchmarks on synthetic workloads.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json
+
+prints a JSON report of emulated MHz, instructions/s and frames/s for
+every workload under every engine, and with a baseline exits non-zero
+if anything got slower than the tolerance allows.
+
+    python -m benchmarks --validate
+
+instead runs every workload under each of validator.ENGINES and the
+plain interpreter side by side, and exits non-zero if any diverge.
+"""
+from benchmarks.runner import ENGINES, compare, load, run, run_all, save
+from benchmarks.workloads import WORKLOADS
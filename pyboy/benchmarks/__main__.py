@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+from benchmarks import ENGINES, WORKLOADS, compare, load, run_all, save
+import validator
+
+
+def validate_all(workloads, frames):
+    """
+    Check every optimized engine against the interpreter on
+    workloads, printing what diverges. Returns how many did.
+    """
+    failed = 0
+    for workload in workloads or sorted(WORKLOADS):
+        rom = WORKLOADS[workload][0]()
+        for engine in sorted(validator.ENGINES):
+            divergence = validator.validate(rom, engine, frames)
+            if divergence:
+                failed += 1
+                sys.stdout.write("%s on %s: %s\n" % (
+                    workload, engine, validator.describe(divergence)))
+            else:
+                sys.stdout.write("%s on %s: ok\n" % (workload, engine))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks")
+    parser.add_argument("--workload", action="append",
+                        choices=sorted(WORKLOADS))
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES))
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--lanes", type=int, default=64)
+    parser.add_argument("--output", help="save the report here")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--validate", action="store_true",
+                        help="check the optimized engines instead of "
+                        "timing anything")
+    args = parser.parse_args(argv)
+
+    if args.validate:
+        return 1 if validate_all(args.workload, args.frames) else 0
+
+    report = run_all(args.workload, args.engine, args.frames, args.lanes)
+    if args.output:
+        save(report, args.output)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    if not args.baseline:
+        return 0
+    regressions = compare(report, load(args.baseline), args.tolerance)
+    for r in regressions:
+        sys.stderr.write("%(workload)s on %(engine)s: %(baseline).3f -> "
+                         "%(current).3f MHz\n" % r)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Run workloads under each engine and compare the results against a
+baseline.
+
+Every engine is given the same amount of emulated work, frames frames'
+worth of cycles, and reports the wall clock time it took. The
+translated engine builds its translation before the clock starts, so
+its time is running the translated code alone. The lockstep
+engine shares that work out over its lanes, and has flat memory with
+no bank controller, so it skips workloads that need one.
+"""
+import json
+import platform
+import time
+
+import numpy as np
+
+from benchmarks.workloads import WORKLOADS
+from gameboy import CYCLES_PER_FRAME, GameBoy
+from lockstep import LockstepZ80
+from translator import BlockRunner
+
+
+def run_gameboy(rom, frames, lanes):
+    """
+    The whole machine: cpu, PPU timing and interrupts, headless and
+    muted.
+    """
+    gb = GameBoy(rom, headless=True, muted=True)
+    start = time.perf_counter()
+    gb.run_frames(frames)
+    seconds = time.perf_counter() - start
+    counters = gb.counters()
+    return seconds, counters["cycles"], counters["instructions"]
+
+
+def run_translated(rom, frames, lanes):
+    """
+    The whole machine as run_gameboy() runs it, with a BlockRunner
+    running the cpu from the ROM's translation.
+    """
+    gb = GameBoy(rom, headless=True, muted=True)
+    BlockRunner(gb).start()
+    start = time.perf_counter()
+    gb.run_frames(frames)
+    seconds = time.perf_counter() - start
+    counters = gb.counters()
+    return seconds, counters["cycles"], counters["instructions"]
+
+
+def run_z80(rom, frames, lanes):
+    """
+    The cpu on its own, over the GameBoy's memory map.
+    """
+    cpu = GameBoy(rom, headless=True, muted=True).cpu
+    start = time.perf_counter()
+    cycles = cpu.run(frames * CYCLES_PER_FRAME)
+    seconds = time.perf_counter() - start
+    return seconds, cycles, cpu.instructions
+
+
+def run_lockstep(rom, frames, lanes):
+    engine = LockstepZ80(lanes, rom)
+    target = frames * CYCLES_PER_FRAME
+    start = time.perf_counter()
+    while engine.cycles.sum() < target and not engine.halted.all():
+        engine.step()
+    seconds = time.perf_counter() - start
+    return seconds, int(engine.cycles.sum()), engine.instructions
+
+
+# name: (runner, whether it has a bank controller)
+ENGINES = {
+    "gameboy": (run_gameboy, True),
+    "translated": (run_translated, True),
+    "z80": (run_z80, True),
+    "lockstep": (run_lockstep, False),
+}
+
+
+def run(workload, engine, frames=10, lanes=64):
+    """
+    Run one workload under one engine, as a result dict.
+    """
+    build, banked = WORKLOADS[workload]
+    runner, banking = ENGINES[engine]
+    if banked and not banking:
+        raise ValueError("%s can't run %s" % (engine, workload))
+    seconds, cycles, instructions = runner(build(), frames, lanes)
+    return {
+        "workload": workload,
+        "engine": engine,
+        "seconds": seconds,
+        "cycles": cycles,
+        "instructions": instructions,
+        "mhz": cycles / seconds / 1e6,
+        "instructions_per_second": instructions / seconds,
+        "frames_per_second": cycles / float(CYCLES_PER_FRAME) / seconds,
+    }
+
+
+def run_all(workloads=None, engines=None, frames=10, lanes=64):
+    """
+    Every workload under every engine that can run it, by default all
+    of them, as a report ready to save.
+    """
+    results = []
+    for workload in workloads or sorted(WORKLOADS):
+        for engine in engines or sorted(ENGINES):
+            if WORKLOADS[workload][1] and not ENGINES[engine][1]:
+                continue
+            results.append(run(workload, engine, frames, lanes))
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "frames": frames,
+        "lanes": lanes,
+        "results": results,
+    }
+
+
+def save(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=0.1, metric="mhz"):
+    """
+    The results in report that are more than tolerance (a fraction)
+    slower than the same workload and engine in baseline, as dicts
+    of workload, engine, baseline, current and change.
+    """
+    before = dict(((r["workload"], r["engine"]), r[metric])
+                  for r in baseline["results"])
+    regressions = []
+    for r in report["results"]:
+        old = before.get((r["workload"], r["engine"]))
+        if old and r[metric] < old * (1 - tolerance):
+            regressions.append({
+                "workload": r["workload"],
+                "engine": r["engine"],
+                "baseline": old,
+                "current": r[metric],
+                "change": r[metric] / old - 1,
+            })
+    return regressions
@@ -0,0 +1,109 @@
+"""
+Synthetic workloads, each a cartridge image assembled here so a
+benchmark needs no ROM files. Every workload loops forever.
+"""
+from assembler import cartridge
+
+
+ALU = """
+main:   ld a, $01
+        ld b, $03
+        ld c, $5A
+loop:   add a, b
+        adc a, $11
+        sub b
+        xor b
+        and $7F
+        or c
+        cp b
+        inc b
+        dec c
+        jr loop
+"""
+
+BIT_OPS = """
+main:   rlc b
+        rr c
+        swap a
+        bit 3, a
+        set 1, d
+        res 1, d
+        sla e
+        srl h
+        jr main
+"""
+
+# copies 2 KB from 0xC000 to 0xD000 a byte at a time
+MEMCPY = """
+main:   ld hl, $C000
+        ld de, $D000
+        ld bc, $0800
+loop:   ld a, (hl+)
+        ld (de), a
+        inc de
+        dec bc
+        ld a, b
+        or c
+        jr nz, loop
+        jr main
+"""
+
+# recurses 16 calls deep
+RECURSION = """
+main:   ld sp, $DFF0
+        ld a, 16
+        call descend
+        jr main
+descend:
+        dec a
+        call nz, descend
+        ret
+"""
+
+# switches through the 8 banks of an MBC1 cartridge, adding up the
+# byte each starts with
+BANK_SWITCH = """
+main:   ld b, 1
+loop:   ld a, b
+        ld ($2000), a
+        ld a, ($4000)
+        add a, e
+        ld e, a
+        inc b
+        ld a, b
+        and 7
+        ld b, a
+        jr loop
+""" + "".join("        org $%X\n        db %d\n" % (bank * 0x4000, bank)
+              for bank in range(1, 8))
+
+
+def alu():
+    return cartridge(ALU, "ALU")
+
+
+def bit_ops():
+    return cartridge(BIT_OPS, "BIT OPS")
+
+
+def memcpy():
+    return cartridge(MEMCPY, "MEMCPY")
+
+
+def recursion():
+    return cartridge(RECURSION, "RECURSION")
+
+
+def bank_switch():
+    return cartridge(BANK_SWITCH, "BANK SWITCH", cartridge_type=0x01,
+                     banks=8)
+
+
+# name: (builder, whether it needs a bank controller)
+WORKLOADS = {
+    "alu": (alu, False),
+    "bit_ops": (bit_ops, False),
+    "memcpy": (memcpy, False),
+    "recursion": (recursion, False),
+    "bank_switch": (bank_switch, True),
+}
@@ -0,0 +1,124 @@
+"""
+Record a run to disk without the emulator waiting on the disk.
+
+A CaptureWriter hands frames and their sound to a background thread
+through a bounded queue of preallocated slots. Pushing copies the
+frame and audio straight into a free slot, and the thread writes the
+slot's memory to the files as is. The video is raw: one byte per
+pixel, 160x144 shades per frame, back to back. The sound is a 16 bit
+stereo WAV.
+
+When every slot is full, the policy decides: DROP loses the frame and
+counts it, BLOCK waits for the writer to free a slot. An audio slot
+holds as much as an APU's output by default, so record() never loses
+sound; samples past the end of a slot are counted in truncated.
+"""
+import threading
+import wave
+from queue import Empty, Queue
+
+import numpy as np
+
+from apu import CAPACITY, SAMPLE_RATE
+from framebuffer import WIDTH, HEIGHT
+
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class CaptureWriter(object):
+    """
+    Writes path.raw and path.wav. slots is how many frames can be
+    waiting to be written, and audio_slot how many samples each can
+    carry with it.
+    """
+    def __init__(self, path, sample_rate=SAMPLE_RATE, slots=64,
+                 policy=DROP, audio_slot=CAPACITY):
+        if policy not in (DROP, BLOCK):
+            raise ValueError("unknown capture policy: %r" % (policy,))
+        self.policy = policy
+        self.frames = 0
+        self.dropped = 0
+        self.truncated = 0
+        self._video = open(path + ".raw", "wb")
+        self._audio = wave.open(path + ".wav", "wb")
+        self._audio.setnchannels(2)
+        self._audio.setsampwidth(2)
+        self._audio.setframerate(sample_rate)
+        self._frame_slots = np.zeros((slots, HEIGHT, WIDTH), np.uint8)
+        self._audio_slots = np.zeros((slots, audio_slot, 2), np.int16)
+        self._free = Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._work = Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def push(self, frame, audio=None):
+        """
+        Queue frame, a (144, 160) array of shades, and audio, an (n, 2)
+        int16 array of samples. Returns False if the frame was dropped.
+        Samples that don't fit in a slot are lost and counted in
+        truncated.
+        """
+        if self._error is not None:
+            raise self._error
+        try:
+            slot = self._free.get(self.policy == BLOCK)
+        except Empty:
+            self.dropped += 1
+            return False
+        np.copyto(self._frame_slots[slot], frame)
+        samples = 0
+        if audio is not None:
+            samples = min(len(audio), self._audio_slots.shape[1])
+            self._audio_slots[slot, :samples] = audio[:samples]
+            self.truncated += len(audio) - samples
+        self._work.put((slot, samples))
+        self.frames += 1
+        return True
+
+    def record(self, gameboy):
+        """
+        Push gameboy's last frame and the sound made since the last
+        record().
+        """
+        return self.push(gameboy.ppu.framebuffer, gameboy.apu.read())
+
+    def _write(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                break
+            slot, samples = item
+            try:
+                self._video.write(self._frame_slots[slot])
+                if samples:
+                    self._audio.writeframesraw(
+                        self._audio_slots[slot, :samples])
+            except Exception as e:
+                self._error = e
+            self._free.put(slot)
+
+    def close(self):
+        """
+        Write out everything queued and close the files.
+        """
+        if self._thread is None:
+            return
+        self._work.put(None)
+        self._thread.join()
+        self._thread = None
+        self._video.close()
+        self._audio.close()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,162 @@
+"""
+Cartridges. A plain 32 KB ROM maps straight in at 0x0000. An MBC1
+cartridge switches 16 KB ROM banks into 0x4000-0x7FFF and 8 KB banks
+of cartridge RAM into 0xA000-0xBFFF, driven by writes to its ROM.
+"""
+from memory import RamController, RomController, SharedRomController
+from memory import forked
+
+
+ROM_SIZE = 0x8000
+BANK_SIZE = 0x4000
+RAM_BANK_SIZE = 0x2000
+
+# header fields
+CARTRIDGE_TYPE = 0x147
+RAM_SIZE = 0x149
+
+MBC1_TYPES = (0x01, 0x02, 0x03)
+RAM_SIZES = {0: 0, 1: 0x800, 2: 0x2000, 3: 0x8000, 4: 0x20000, 5: 0x10000}
+
+
+def _is_mbc1(rom):
+    return len(rom) > CARTRIDGE_TYPE and rom[CARTRIDGE_TYPE] in MBC1_TYPES
+
+
+def _banks(size):
+    """
+    How many ROM banks an MBC1 cartridge of size bytes has.
+    """
+    banks = 2
+    while banks * BANK_SIZE < size:
+        banks *= 2
+    return banks
+
+
+def load_cartridge(rom):
+    """
+    The controllers for 0x0000 and 0xA000 that rom, a cartridge
+    image, needs.
+    """
+    if _is_mbc1(rom):
+        mbc = Mbc1(rom, RAM_SIZES.get(rom[RAM_SIZE], 0))
+        return mbc, mbc.ram
+    rom = RomController(bytes(rom[:ROM_SIZE]).ljust(ROM_SIZE, b"\xff"))
+    return rom, RamController(RAM_BANK_SIZE)
+
+
+def cartridge_image(rom):
+    """
+    rom padded out with 0xFF to the whole image its controller runs
+    from: every bank of an MBC1 cartridge, or 32 KB.
+    """
+    size = _banks(len(rom)) * BANK_SIZE if _is_mbc1(rom) else ROM_SIZE
+    return bytes(rom[:size]).ljust(size, b"\xff")
+
+
+def shared_cartridge(buf):
+    """
+    Like load_cartridge(), for a cartridge_image() in a buffer owned
+    by someone else, typically shared memory many processes run the
+    ROM from. The ROM isn't copied.
+    """
+    if _is_mbc1(buf):
+        mbc = Mbc1(buf, RAM_SIZES.get(buf[RAM_SIZE], 0), shared=True)
+        return mbc, mbc.ram
+    return SharedRomController(buf), RamController(RAM_BANK_SIZE)
+
+
+class CartridgeRam(object):
+    """
+    0xA000-0xBFFF on a cartridge with a bank controller: readable
+    only once enabled, and banked.
+    """
+    def __init__(self, size):
+        self._ram = RamController(max(size, RAM_BANK_SIZE))
+        self.enabled = False
+        self.bank = 0
+
+    def fork(self, forks=None):
+        ram = CartridgeRam.__new__(CartridgeRam)
+        ram._ram = self._ram.fork()
+        ram.enabled = self.enabled
+        ram.bank = self.bank
+        return ram
+
+    def __len__(self):
+        return RAM_BANK_SIZE
+
+    def __getitem__(self, addr):
+        if not self.enabled:
+            return 0xFF
+        return self._ram[(self.bank * RAM_BANK_SIZE + addr) % len(self._ram)]
+
+    def __setitem__(self, addr, val):
+        if self.enabled:
+            self._ram[(self.bank * RAM_BANK_SIZE + addr) %
+                      len(self._ram)] = val
+
+
+class Mbc1(object):
+    """
+    The ROM of an MBC1 cartridge. bank is the ROM bank at 0x4000, and
+    banks how many there are. A shared rom is a cartridge_image() in a
+    buffer owned by someone else, read in place.
+    """
+    def __init__(self, rom, ram_size=0, shared=False):
+        banks = _banks(len(rom))
+        if shared:
+            self._rom = memoryview(rom).toreadonly()
+        else:
+            self._rom = bytes(rom).ljust(banks * BANK_SIZE, b"\xff")
+        self.banks = banks
+        self.ram = CartridgeRam(ram_size)
+        self.bank = 1
+        self.bank_switches = 0
+        self._low = 1
+        self._high = 0
+        self._mode = 0
+        self._update()
+
+    def fork(self, forks):
+        """
+        An Mbc1 reading the same ROM, with the same banks switched in
+        and a fork of the cartridge RAM.
+        """
+        mbc = Mbc1.__new__(Mbc1)
+        mbc.__dict__.update(vars(self))
+        mbc.ram = forked(self.ram, forks)
+        return mbc
+
+    def __len__(self):
+        return ROM_SIZE
+
+    def __getitem__(self, addr):
+        if addr < BANK_SIZE:
+            return self._rom[self._low_offset + addr]
+        return self._rom[self._high_offset + addr]
+
+    def __setitem__(self, addr, val):
+        if addr < 0x2000:
+            self.ram.enabled = val & 0xF == 0xA
+        elif addr < 0x4000:
+            self._low = val & 0x1F or 1
+        elif addr < 0x6000:
+            self._high = val & 3
+        else:
+            self._mode = val & 1
+        self._update()
+
+    def _update(self):
+        mask = self.banks - 1
+        bank = (self._high << 5 | self._low) & mask
+        if bank != self.bank:
+            self.bank = bank
+            self.bank_switches += 1
+        # offsets from an address to where it is in the image
+        self._high_offset = (self.bank - 1) * BANK_SIZE
+        self._low_offset = 0
+        self.ram.bank = 0
+        if self._mode:
+            self._low_offset = (self._high << 5 & mask) * BANK_SIZE
+            self.ram.bank = self._high
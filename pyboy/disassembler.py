@@ -0,0 +1,298 @@
+"""
+Decode a ROM once, statically, into instructions and basic blocks.
+
+Decoding starts from the entry point, the rst and interrupt vectors
+and any other entries given, and follows every branch it can work out,
+so only reachable code is decoded and data is left alone. Each
+instruction is kept by (bank, address): bank is 0 below 0x4000 and the
+ROM bank otherwise. A branch from bank 0 into 0x4000-0x7FFF is taken
+to land in bank 1, since which bank is there isn't known statically;
+code in other banks is found from its own entries. Branches out of
+the ROM, into RAM, are noted but not followed.
+
+The basic blocks make a control-flow graph: each starts at a branch
+target or just after a branch and runs to the next one. Lengths,
+mnemonics and cycles come from the cpu's handlers, the same metadata
+the cpu and the assembler use.
+
+disassemble() caches its results on disk by the ROM's SHA-1, so a
+ROM is only decoded once.
+"""
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+
+from assembler import IMMEDIATES, PADDING
+from cartridge import BANK_SIZE, ROM_SIZE
+from opcodes import mnemonic
+from profiler import extra_op_cycles
+from z80 import Z80
+
+
+# bump when Instruction or Block change, to retire old caches
+VERSION = 1
+
+# where the cpu can start running: the cartridge entry point, the
+# rst vectors and the interrupt vectors
+ENTRIES = (0x100, 0x00, 0x08, 0x10, 0x18, 0x20, 0x28, 0x30, 0x38,
+           0x40, 0x48, 0x50, 0x58, 0x60)
+
+CONDITIONS = ("nz", "z", "nc", "c")
+BRANCHES = ("jr", "jp", "call", "rst", "ret", "reti")
+
+Instruction = namedtuple("Instruction", [
+    "bank",
+    "address",
+    "name",           # the handler's name
+    "text",           # assembly, operands filled in
+    "length",
+    "operands",       # immediate values, in order
+    "targets",        # addresses it can branch to
+    "conditional",
+    "ends_block",
+    "cycles",
+    "branch_cycles",
+])
+
+Block = namedtuple("Block", [
+    "bank",
+    "start",
+    "end",            # the address after the last instruction
+    "instructions",
+    "successors",     # (bank, address) of blocks it can go on to
+])
+
+
+def _handlers():
+    cpu = Z80(None)
+    ops = dict((code, (handler.__name__, handler.cycles,
+                       handler.branch_cycles))
+               for code, handler in cpu.op_map.items())
+    extra_ops = dict((code, (handler.__name__, extra_op_cycles(code),
+                             extra_op_cycles(code)))
+                     for code, handler in cpu.extra_ops_map.items())
+    return ops, extra_ops
+
+
+OPS, EXTRA_OPS = _handlers()
+
+
+def location(bank, address):
+    """
+    The key for address while bank is switched in: (0, address)
+    below 0x4000, else (bank, address), with bank 0 meaning bank 1.
+    """
+    if address < BANK_SIZE:
+        return 0, address
+    return bank or 1, address
+
+
+def rom_offset(bank, address):
+    if address < BANK_SIZE:
+        return address
+    return (bank or 1) * BANK_SIZE + address - BANK_SIZE
+
+
+def _format(placeholder, value, op):
+    if placeholder == "r8":
+        if op == "jr":
+            return "$%04X" % value
+        return "%d" % value
+    if placeholder == "a8":
+        return "$%04X" % (0xFF00 + value)
+    if IMMEDIATES[placeholder] == 1:
+        return "$%02X" % value
+    return "$%04X" % value
+
+
+def decode(rom, bank, address):
+    """
+    The instruction at address, with bank switched in, or None if
+    there isn't a whole one there that the cpu knows.
+    """
+    offset = rom_offset(bank, address)
+    if offset >= len(rom):
+        return None
+    code = rom[offset]
+    if code == 0xCB:
+        if offset + 1 >= len(rom) or rom[offset + 1] not in EXTRA_OPS:
+            return None
+        name, cycles, branch_cycles = EXTRA_OPS[rom[offset + 1]]
+        length = 2
+    elif code in OPS:
+        name, cycles, branch_cycles = OPS[code]
+        length = 1
+    else:
+        return None
+    text = mnemonic(name)
+    op, _, rest = text.partition(" ")
+    length += len(PADDING.get(op, b""))
+    operands = []
+    targets = []
+    filled = []
+    for operand in (o for o in rest.split(", ") if o):
+        for placeholder in IMMEDIATES:
+            if placeholder in operand:
+                size = IMMEDIATES[placeholder]
+                if offset + length + size > len(rom):
+                    return None
+                value = rom[offset + length]
+                if size == 2:
+                    value |= rom[offset + length + 1] << 8
+                elif placeholder == "r8" and value & 0x80:
+                    value -= 0x100
+                length += size
+                if op == "jr":
+                    value = (address + length + value) & 0xFFFF
+                operands.append(value)
+                if op in BRANCHES:
+                    targets.append(value)
+                operand = operand.replace(placeholder,
+                                          _format(placeholder, value, op))
+                break
+        filled.append(operand)
+    if op == "rst":
+        targets.append(int(rest, 16))
+    conditional = op in BRANCHES and filled[:1] != [] and \
+        filled[0] in CONDITIONS
+    ends_block = op in BRANCHES or op in ("halt", "stop")
+    if filled:
+        text = "%s %s" % (op, ", ".join(filled))
+    return Instruction(location(bank, address)[0], address, name, text,
+                       length, tuple(operands), tuple(targets), conditional,
+                       ends_block, cycles, branch_cycles)
+
+
+def _falls_through(instruction):
+    """
+    Whether the cpu can go on to the next instruction afterwards;
+    calls and rsts come back there.
+    """
+    op = instruction.text.split(" ")[0]
+    if op in ("call", "rst") or instruction.conditional:
+        return True
+    return op not in ("jr", "jp", "ret", "reti")
+
+
+def _entries(entries):
+    return tuple(sorted(location(*e) if isinstance(e, tuple)
+                        else location(0, e) for e in entries))
+
+
+class Disassembly(object):
+    """
+    The reachable code in rom, from entries, which are addresses or
+    (bank, address) pairs.
+    """
+    def __init__(self, rom, entries=ENTRIES):
+        self.rom = bytes(rom)
+        self.sha1 = hashlib.sha1(self.rom).hexdigest()
+        self.entries = _entries(entries)
+        self.instructions = {}
+        self.blocks = {}
+        # branch targets outside the ROM
+        self.external = set()
+        self._build_blocks(self._explore())
+
+    def _explore(self):
+        leaders = set(self.entries)
+        pending = list(self.entries)
+        while pending:
+            key = pending.pop()
+            while key not in self.instructions:
+                instruction = decode(self.rom, *key)
+                if instruction is None:
+                    break
+                self.instructions[key] = instruction
+                for target in instruction.targets:
+                    if target >= ROM_SIZE:
+                        self.external.add(target)
+                    else:
+                        leaders.add(location(key[0], target))
+                        pending.append(location(key[0], target))
+                if instruction.ends_block and not _falls_through(instruction):
+                    break
+                key = location(key[0], key[1] + instruction.length)
+                if key[1] >= ROM_SIZE:
+                    break
+                if instruction.ends_block:
+                    leaders.add(key)
+                    pending.append(key)
+                    break
+            else:
+                # ran into code that was already decoded
+                leaders.add(key)
+        return leaders & set(self.instructions)
+
+    def _build_blocks(self, leaders):
+        for start in leaders:
+            key = start
+            body = []
+            while True:
+                instruction = self.instructions[key]
+                body.append(instruction)
+                key = location(key[0], key[1] + instruction.length)
+                if (instruction.ends_block or key in leaders or
+                        key not in self.instructions):
+                    break
+            last = body[-1]
+            successors = [location(last.bank, target)
+                          for target in last.targets
+                          if location(last.bank, target) in leaders]
+            if key in leaders and _falls_through(last):
+                successors.append(key)
+            self.blocks[start] = Block(start[0], start[1],
+                                       last.address + last.length,
+                                       tuple(body), tuple(successors))
+
+    def instruction(self, bank, address):
+        return self.instructions.get(location(bank, address))
+
+    def block(self, bank, address):
+        """
+        The basic block starting at address with bank switched in, or
+        None if no block starts there.
+        """
+        return self.blocks.get(location(bank, address))
+
+    def listing(self):
+        """
+        The decoded code as text, a block at a time.
+        """
+        lines = []
+        for key in sorted(self.blocks):
+            block = self.blocks[key]
+            lines.append("%02X:%04X:" % key)
+            for i in block.instructions:
+                raw = self.rom[rom_offset(i.bank, i.address):
+                               rom_offset(i.bank, i.address) + i.length]
+                lines.append("    %04X  %-9s %s" % (i.address, raw.hex(),
+                                                     i.text))
+        return "\n".join(lines)
+
+
+def disassemble(rom, entries=ENTRIES, cache=None):
+    """
+    The Disassembly of rom, kept in the directory cache if one is
+    given, by SHA-1 of the ROM.
+    """
+    if cache is None:
+        return Disassembly(rom, entries)
+    sha1 = hashlib.sha1(bytes(rom)).hexdigest()
+    path = os.path.join(cache, "%s.dis" % sha1)
+    try:
+        with open(path, "rb") as f:
+            version, disassembly = pickle.load(f)
+        if version == VERSION and disassembly.entries == _entries(entries):
+            return disassembly
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        pass
+    disassembly = Disassembly(rom, entries)
+    if not os.path.isdir(cache):
+        os.makedirs(cache)
+    tmp = "%s.%d" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump((VERSION, disassembly), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return disassembly
@@ -0,0 +1,139 @@
+"""
+OAM DMA and CGB HDMA.
+
+Both copy a block of memory in one go: the source is viewed straight
+out of the controller it lives in and sliced into OAM or VRAM. Only
+when the source is something other than a plain byte buffer (I/O, a
+bank switched cartridge) is it read through the memory map instead.
+How long a transfer takes is accounted in cycles rather than spread
+over them.
+"""
+from memory import forked
+
+
+OAM_DMA_CYCLES = 640
+# a 16 byte HDMA block holds the cpu for this long
+HDMA_BLOCK_CYCLES = 32
+HDMA_BLOCK = 0x10
+
+# echo RAM, a mirror of 0xC000-0xDDFF
+ECHO_START = 0xE000
+ECHO_END = 0xFE00
+ECHO_OFFSET = 0x2000
+
+HDMA_SRC_HIGH, HDMA_SRC_LOW, HDMA_DST_HIGH, HDMA_DST_LOW, HDMA_START = \
+    range(5)
+HBLANK_MODE = 0x80
+
+
+def read_source(mem, addr, length):
+    """
+    The length bytes at addr, as a view when they can be had without
+    a copy.
+    """
+    if ECHO_START <= addr < ECHO_END:
+        addr -= ECHO_OFFSET
+    block = mem.view_block(addr, length)
+    if block is None:
+        block = mem.read_block(addr, length)
+    return block
+
+
+class OamDma(object):
+    """
+    The DMA register at 0xFF46. Writing a page number copies that page
+    to OAM, which the cpu then can't use until the transfer would have
+    finished.
+    """
+    def __init__(self, mem, oam):
+        self._mem = mem
+        self._oam = oam
+        self.value = 0xFF
+
+    def fork(self, forks):
+        dma = OamDma(forked(self._mem, forks), forked(self._oam, forks))
+        dma.value = self.value
+        return dma
+
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, addr):
+        return self.value
+
+    def __setitem__(self, addr, val):
+        self.value = val
+        self._oam.load(read_source(self._mem, val << 8, len(self._oam)),
+                       OAM_DMA_CYCLES)
+
+
+class Hdma(object):
+    """
+    The CGB HDMA registers at 0xFF51-0xFF55. Writing HDMA5 either
+    copies the whole block to VRAM at once (general purpose DMA) or,
+    with bit 7 set, arms a copy of 16 bytes at each HBlank. The cycles
+    the cpu should have been held for collect in stall for the run
+    loop to take.
+    """
+    def __init__(self, mem, vram):
+        self._mem = mem
+        self._vram = vram
+        self._regs = bytearray(4)
+        self.active = False
+        self.blocks = 0
+        self.stall = 0
+
+    def fork(self, forks):
+        hdma = Hdma(forked(self._mem, forks), forked(self._vram, forks))
+        hdma._regs[:] = self._regs
+        hdma.active = self.active
+        hdma.blocks = self.blocks
+        hdma.stall = self.stall
+        return hdma
+
+    def __len__(self):
+        return 5
+
+    def __getitem__(self, addr):
+        if addr != HDMA_START:
+            return 0xFF
+        if self.blocks == 0:
+            return 0xFF
+        status = 0 if self.active else HBLANK_MODE
+        return status | (self.blocks - 1)
+
+    def __setitem__(self, addr, val):
+        if addr != HDMA_START:
+            self._regs[addr] = val
+        elif self.active and not val & HBLANK_MODE:
+            self.active = False
+        else:
+            self.blocks = (val & 0x7F) + 1
+            if val & HBLANK_MODE:
+                self.active = True
+            else:
+                self._copy(self.blocks)
+
+    def take_stall(self):
+        stall = self.stall
+        self.stall = 0
+        return stall
+
+    def hblank(self):
+        self._copy(1)
+        self.active = self.blocks > 0
+
+    def _copy(self, blocks):
+        regs = self._regs
+        src = (regs[HDMA_SRC_HIGH] << 8 | regs[HDMA_SRC_LOW]) & 0xFFF0
+        dst = (regs[HDMA_DST_HIGH] << 8 | regs[HDMA_DST_LOW]) & 0x1FF0
+        length = min(blocks * HDMA_BLOCK, len(self._vram) - dst)
+        self._vram.load(dst, read_source(self._mem, src, length))
+        src += length
+        dst += length
+        regs[HDMA_SRC_HIGH] = src >> 8 & 0xFF
+        regs[HDMA_SRC_LOW] = src & 0xFF
+        regs[HDMA_DST_HIGH] = dst >> 8
+        regs[HDMA_DST_LOW] = dst & 0xFF
+        self.blocks -= blocks
+        self.stall += blocks * HDMA_BLOCK_CYCLES
@@ -0,0 +1,189 @@
+"""
+Run many independent GameBoy instances across a pool of worker
+processes.
+
+The ROM, every bank of it, is placed in shared memory once and every
+instance in every worker reads it from there, each through its own
+bank controller. Actions go out and observations come back
+through two more shared blocks, so a step moves no emulator state
+through pipes; the pipes only carry the step command and its ack.
+"""
+import time
+from multiprocessing import Pipe, Process, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+
+from cartridge import ROM_SIZE, cartridge_image, shared_cartridge
+from gameboy import GameBoy
+from shared import release
+
+
+WRAM = (0xC000, 0x2000)
+
+
+def _worker(conn, rom_name, rom_size, actions_name, obs_name, first, count,
+            observe):
+    rom_shm = SharedMemory(rom_name)
+    actions_shm = SharedMemory(actions_name)
+    obs_shm = SharedMemory(obs_name)
+    # each instance gets its own controller, for its own bank state,
+    # over the one image
+    gameboys = [GameBoy(shared_cartridge(rom_shm.buf[:rom_size])[0],
+                        headless=True, muted=True)
+                for _ in range(count)]
+    start, length = observe
+    actions = actions_shm.buf
+    obs = obs_shm.buf
+    try:
+        while True:
+            cmd, frames = conn.recv()
+            if cmd == "close":
+                break
+            try:
+                for i, gb in enumerate(gameboys, first):
+                    gb.joypad.buttons = actions[i]
+                    gb.run_frames(frames)
+                    obs[i * length:(i + 1) * length] = \
+                        gb.mem.read_block(start, length)
+            except Exception as e:
+                conn.send(e)
+            else:
+                conn.send(None)
+    finally:
+        del gameboys, actions, obs
+        for shm in (rom_shm, actions_shm, obs_shm):
+            release(shm)
+        conn.close()
+
+
+class Fleet(object):
+    """
+    instances GameBoys running rom, spread as evenly as possible over
+    workers processes (one per core by default). observe is the
+    (address, length) window of memory copied out for each instance
+    after every step.
+
+    Use as a context manager, or call close(), so the workers and the
+    shared memory are cleaned up.
+    """
+    def __init__(self, rom, instances, workers=None, observe=WRAM):
+        workers = min(workers or cpu_count(), instances)
+        self.instances = instances
+        self._obs_length = observe[1]
+        image = cartridge_image(rom)
+        self._rom = SharedMemory(create=True, size=len(image))
+        self._rom.buf[:len(image)] = image
+        self._actions = SharedMemory(create=True, size=instances)
+        self._obs = SharedMemory(create=True,
+                                 size=instances * self._obs_length)
+        self._actions.buf[:instances] = bytes(instances)
+        self._conns = []
+        self._procs = []
+        first = 0
+        for w in range(workers):
+            count = instances // workers + (w < instances % workers)
+            parent, child = Pipe()
+            proc = Process(target=_worker,
+                           args=(child, self._rom.name, len(image),
+                                 self._actions.name, self._obs.name, first,
+                                 count, observe))
+            proc.daemon = True
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+            first += count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def observations(self):
+        """
+        Every instance's observation window back to back, as a view
+        of the shared buffer the workers write into.
+        """
+        return self._obs.buf[:self.instances * self._obs_length]
+
+    def observation(self, i):
+        return self._obs.buf[i * self._obs_length:
+                             (i + 1) * self._obs_length]
+
+    def step(self, actions, frames=1):
+        """
+        Set each instance's joypad from actions (a sequence of joypad
+        bitmasks, one per instance), run every instance for frames
+        frames and return the observations.
+        """
+        self._actions.buf[:self.instances] = bytes(actions)
+        for conn in self._conns:
+            conn.send(("step", frames))
+        errors = [conn.recv() for conn in self._conns]
+        for e in errors:
+            if e is not None:
+                raise e
+        return self.observations
+
+    def close(self):
+        if not self._procs:
+            return
+        for conn in self._conns:
+            conn.send(("close", None))
+            conn.close()
+        for proc in self._procs:
+            proc.join()
+        self._conns = []
+        self._procs = []
+        # observations handed out by step() may still be held
+        for shm in (self._rom, self._actions, self._obs):
+            release(shm, unlink=True)
+
+
+def spin_rom():
+    """
+    A ROM that bumps 0xC000 and copies the joypad's button row into
+    0xC001 forever.
+    """
+    rom = bytearray(ROM_SIZE)
+    rom[0x100:0x10F] = bytes([
+        0x3E, 0x10,        # ld a, 0x10 (select buttons)
+        0xE0, 0x00,        # ldh (0xFF00), a
+        0x21, 0x00, 0xC0,  # ld hl, 0xC000
+        0x34,              # inc (hl)
+        0xF0, 0x00,        # ldh a, (0xFF00)
+        0xEA, 0x01, 0xC0,  # ld (0xC001), a
+        0x18, 0xF8,        # jr -8
+    ])
+    return bytes(rom)
+
+
+def benchmark(rom=None, instances=8, frames=2, worker_counts=None):
+    """
+    Time one step of frames frames over instances instances for each
+    worker count and report frames per second, plus the speedup over
+    a single worker. Scaling should be close to linear up to the
+    number of cores.
+    """
+    rom = rom or spin_rom()
+    worker_counts = worker_counts or sorted(set([1, 2, cpu_count()]))
+    results = []
+    for workers in worker_counts:
+        with Fleet(rom, instances, workers=workers) as fleet:
+            fleet.step(bytes(instances), 1)  # warm up
+            start = time.perf_counter()
+            fleet.step(bytes(instances), frames)
+            elapsed = time.perf_counter() - start
+        fps = instances * frames / elapsed
+        results.append({"workers": workers, "seconds": elapsed,
+                        "frames_per_second": fps,
+                        "speedup": fps / results[0]["frames_per_second"]
+                        if results else 1.0})
+    return results
+
+
+if __name__ == "__main__":
+    for result in benchmark():
+        print("%(workers)3d workers %(frames_per_second)8.2f frames/s "
+              "%(speedup)5.2fx" % result)
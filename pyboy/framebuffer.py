@@ -0,0 +1,192 @@
+"""
+The screen as a preallocated buffer other code can map without
+copying.
+
+A FrameBuffer is a small header followed by one or three frame slots.
+Each slot holds the 144x160 shades and, optionally, the same frame as
+RGBA. The PPU draws into the back slot and publishes it at VBlank.
+With double buffering there are three slots and publishing moves on to
+the next one, so the writer draws into the slot of the frame before
+last: a reader has the whole of the next frame to finish with the one
+it has. In shared mode the whole thing lives in
+multiprocessing.shared_memory, and a FrameBufferReader in another
+process maps the same memory by name.
+
+The header also stamps each slot with the sequence number of the frame
+it holds, set when the frame is published and cleared when the writer
+starts drawing over it. A reader that might be slower than that, or
+reads a single buffered frame, checks after reading a frame that
+intact() still says so, and reads again if not.
+"""
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from shared import release
+
+
+WIDTH = 160
+HEIGHT = 144
+
+SLOTS = 3
+
+# sequence number of the last published frame, index of the front slot,
+# then the sequence number of the frame in each slot, 0 while drawing
+HEADER_SIZE = 8 * (2 + SLOTS)
+
+# DMG greens, lightest first
+RGBA = np.array([[0xE0, 0xF8, 0xD0, 0xFF],
+                 [0x88, 0xC0, 0x70, 0xFF],
+                 [0x34, 0x68, 0x56, 0xFF],
+                 [0x08, 0x18, 0x20, 0xFF]], np.uint8)
+
+
+def buffer_size(double=False, rgba=False):
+    return HEADER_SIZE + _slot_size(rgba) * (SLOTS if double else 1)
+
+
+def _slot_size(rgba):
+    return WIDTH * HEIGHT * (5 if rgba else 1)
+
+
+def _views(buf, double, rgba):
+    """
+    The header and the (shades, rgba) arrays of each slot in buf.
+    """
+    header = np.frombuffer(buf, np.uint64, 2 + SLOTS)
+    slots = []
+    for i in range(SLOTS if double else 1):
+        offset = HEADER_SIZE + i * _slot_size(rgba)
+        shades = np.frombuffer(buf, np.uint8, WIDTH * HEIGHT, offset)
+        colors = None
+        if rgba:
+            colors = np.frombuffer(buf, np.uint8, WIDTH * HEIGHT * 4,
+                                   offset + WIDTH * HEIGHT)
+            colors = colors.reshape(HEIGHT, WIDTH, 4)
+        slots.append((shades.reshape(HEIGHT, WIDTH), colors))
+    return header, slots
+
+
+def _intact(header, sequence):
+    return sequence != 0 and sequence in header[2:].tolist()
+
+
+class FrameBuffer(object):
+    """
+    Where the PPU draws. back is the frame being drawn, front the last
+    published one; without double buffering they are the same array.
+    begin() starts a frame in back, publish() makes it the front one.
+    With rgba=True publish() also fills in the RGBA copy of the frame.
+    With shared=True the buffer is in shared memory called name.
+    """
+    def __init__(self, double=False, rgba=False, shared=False):
+        self.double = double
+        self.rgba = rgba
+        self._shm = None
+        self.name = None
+        size = buffer_size(double, rgba)
+        if shared:
+            self._shm = SharedMemory(create=True, size=size)
+            self.name = self._shm.name
+            buf = self._shm.buf
+        else:
+            buf = bytearray(size)
+        self._header, self._slots = _views(buf, double, rgba)
+        self._back = len(self._slots) - 1
+
+    @property
+    def sequence(self):
+        return int(self._header[0])
+
+    @property
+    def back(self):
+        return self._slots[self._back][0]
+
+    @property
+    def front(self):
+        return self._slots[int(self._header[1])][0]
+
+    @property
+    def front_rgba(self):
+        return self._slots[int(self._header[1])][1]
+
+    def begin(self):
+        """
+        Start drawing a frame in back, which is no longer intact() for
+        the frame it held. Returns back.
+        """
+        self._header[2 + self._back] = 0
+        return self.back
+
+    def publish(self):
+        """
+        Make the back frame the front one.
+        """
+        shades, colors = self._slots[self._back]
+        if colors is not None:
+            RGBA.take(shades, axis=0, out=colors)
+        sequence = self._header[0] + 1
+        self._header[2 + self._back] = sequence
+        self._header[1] = self._back
+        self._header[0] = sequence
+        if self.double:
+            self._back = (self._back + 1) % SLOTS
+
+    def intact(self, sequence):
+        """
+        Whether the frame published as sequence is still whole.
+        """
+        return _intact(self._header, sequence)
+
+    def close(self):
+        """
+        Free the shared memory. Readers keep their mapping until they
+        close too, and arrays still viewing it (a PPU's framebuffer)
+        keep it until they go.
+        """
+        self._header = self._slots = None
+        if self._shm is not None:
+            release(self._shm, unlink=True)
+            self._shm = None
+
+
+class FrameBufferReader(object):
+    """
+    Maps a shared FrameBuffer by name, for use in another process.
+    double and rgba must match the writer's.
+    """
+    def __init__(self, name, double=False, rgba=False):
+        self._shm = SharedMemory(name)
+        self._header, self._slots = _views(self._shm.buf, double, rgba)
+
+    @property
+    def sequence(self):
+        return int(self._header[0])
+
+    def latest(self):
+        """
+        Returns (sequence, shades, rgba) for the front frame; rgba is
+        None unless the writer keeps it. The arrays are views of the
+        shared memory, so they hold that frame only while
+        intact(sequence). sequence is 0 if the writer is drawing in
+        them already, as it is most of the time without double
+        buffering.
+        """
+        front = int(self._header[1])
+        shades, colors = self._slots[front]
+        return int(self._header[2 + front]), shades, colors
+
+    def intact(self, sequence):
+        """
+        Whether the arrays latest() returned with sequence still hold
+        that whole frame. Check after reading them; if not, the writer
+        has started drawing over it and latest() has a newer frame.
+        """
+        return _intact(self._header, sequence)
+
+    def close(self):
+        """
+        Unmap the shared memory, once arrays from latest() are gone.
+        """
+        self._header = self._slots = None
+        release(self._shm)
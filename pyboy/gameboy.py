@@ -0,0 +1,176 @@
+import interrupts
+from apu import APU
+from cartridge import load_cartridge, Mbc1, RAM_BANK_SIZE
+from dma import Hdma, OamDma
+from interrupts import InterruptRegister
+from joypad import Joypad
+from memory import MemoryController, RamController
+from memory import RomController, SharedRomController, forked
+from ppu import PPU
+from z80 import Z80
+
+
+CYCLES_PER_FRAME = 70224
+
+
+class GameBoy(object):
+    """
+    A Z80 and PPU wired to the DMG memory map. rom is the cartridge
+    image, plain or MBC1, or a ROM controller or Mbc1 to run from
+    directly; an Mbc1 has bank state, so it can't serve two GameBoys.
+    A headless GameBoy keeps all the LCD timing but never draws.
+    screen is the FrameBuffer to draw into, if not a private one. cgb
+    adds the CGB's HDMA registers. A muted GameBoy makes no sound
+    samples.
+    """
+    def __init__(self, rom, headless=False, screen=None, cgb=False,
+                 muted=False):
+        if isinstance(rom, Mbc1):
+            cart_ram = rom.ram
+        elif isinstance(rom, (RomController, SharedRomController)):
+            cart_ram = RamController(RAM_BANK_SIZE)
+        else:
+            rom, cart_ram = load_cartridge(rom)
+        self.rom = rom
+        self.joypad = Joypad()
+        self.interrupt_flags = InterruptRegister()
+        self.interrupt_enable = InterruptRegister()
+        self.ppu = PPU(self.interrupt_flags, headless=headless,
+                       screen=screen)
+        self.apu = APU(muted=muted)
+        self.mem = MemoryController()
+        self.mem.register_controller(self.rom, 0x0000)
+        self.mem.register_controller(self.ppu.vram, 0x8000)
+        self.mem.register_controller(cart_ram, 0xA000)
+        self.mem.register_controller(RamController(0x1000), 0xC000)  # wram0
+        self.mem.register_controller(RamController(0x1000), 0xD000)  # wram1
+        self.mem.register_mirror(0xE000, 0xC000, 0x1E00)  # echo
+        self.mem.register_controller(self.ppu.oam, 0xFE00)
+        self.mem.register_controller(RamController(0x60), 0xFEA0)
+        self.mem.register_controller(self.joypad, 0xFF00)
+        self.mem.register_controller(self.interrupt_flags, 0xFF0F)
+        self.mem.register_controller(OamDma(self.mem, self.ppu.oam), 0xFF46)
+        self.mem.register_controller(self.ppu, 0xFF40)
+        self.hdma = None
+        if cgb:
+            self.hdma = Hdma(self.mem, self.ppu.vram)
+            self.ppu.hdma = self.hdma
+            self.mem.register_controller(self.hdma, 0xFF51)
+        self.mem.register_controller(self.apu, 0xFF10)
+        self.mem.register_controller(RamController(0x7F), 0xFF01)  # io
+        self.mem.register_controller(RamController(0x7F), 0xFF80)  # hram
+        self.mem.register_controller(self.interrupt_enable, 0xFFFF)
+        self.cpu = Z80(self.mem)
+        self.cpu.pc = 0x100
+        self.cpu.sp = 0xFFFE
+        # cycles the last run went past its target, owed to the next
+        self._overshoot = 0
+        self.cycles = 0
+        self.interrupts = 0
+        # the BlockRunner running the cpu, if one was ever started
+        self.block_runner = None
+        self._counter_base = dict.fromkeys(self._read_counters(), 0)
+
+    def fork(self):
+        """
+        A GameBoy in the same state that runs on from here on its own,
+        for branching a search. Its memory is a fork() of this one's:
+        ROM is shared and RAM pages are shared until either side writes
+        them, so a fork costs about what it writes. VRAM, OAM and the
+        hardware registers are copied. It draws into a private screen,
+        and runners, samplers and other tools stay with this one.
+        """
+        forks = {}
+        gb = GameBoy.__new__(type(self))
+        gb.mem = self.mem.fork(forks)
+        gb.rom = forked(self.rom, forks)
+        gb.joypad = forked(self.joypad, forks)
+        gb.interrupt_flags = forked(self.interrupt_flags, forks)
+        gb.interrupt_enable = forked(self.interrupt_enable, forks)
+        gb.ppu = forked(self.ppu, forks)
+        gb.apu = forked(self.apu, forks)
+        gb.hdma = None
+        if self.hdma is not None:
+            gb.hdma = forked(self.hdma, forks)
+        gb.cpu = self.cpu.fork(forks)
+        gb._overshoot = self._overshoot
+        gb.cycles = self.cycles
+        gb.interrupts = self.interrupts
+        gb.block_runner = None
+        gb._counter_base = dict(self._counter_base)
+        return gb
+
+    def run_cycles(self, cycles):
+        """
+        Run the machine for cycles clock cycles. The cpu runs in
+        slices that end at the PPU's next mode change, and interrupts
+        are taken between slices, as are the cycles HDMA held the cpu.
+        """
+        cpu = self.cpu
+        ppu = self.ppu
+        apu = self.apu
+        hdma = self.hdma
+        target = cycles - self._overshoot
+        ran = 0
+        taken = 0
+        while ran < target:
+            n = cpu.run(min(target - ran, ppu.cycles_to_event))
+            ppu.tick(n)
+            apu.tick(n)
+            ran += n
+            if hdma is not None and hdma.stall:
+                n = hdma.take_stall()
+                ppu.tick(n)
+                apu.tick(n)
+                ran += n
+            n = interrupts.service(cpu, self.interrupt_flags,
+                                   self.interrupt_enable)
+            if n:
+                ppu.tick(n)
+                apu.tick(n)
+                ran += n
+                taken += 1
+        self._overshoot = ran - target
+        self.cycles += ran
+        self.interrupts += taken
+
+    def run_frames(self, frames=1):
+        self.run_cycles(frames * CYCLES_PER_FRAME)
+
+    def _read_counters(self):
+        tile_cache = self.ppu.vram.tile_cache
+        sprite_index = self.ppu.oam.sprite_index
+        counters = {
+            "instructions": self.cpu.instructions,
+            "cycles": self.cycles,
+            "frames": self.ppu.frames,
+            "halted_cycles": self.cpu.halted_cycles,
+            "interrupts": self.interrupts,
+            "bank_switches": getattr(self.rom, "bank_switches", 0),
+            "tile_cache_decodes": tile_cache.decoded,
+            "tile_cache_hits": tile_cache.hits,
+            "tile_cache_misses": tile_cache.misses,
+            "sprite_index_lookups": sprite_index.lookups,
+            "sprite_index_builds": sprite_index.builds,
+        }
+        runner = self.block_runner
+        if runner is not None:
+            counters["blocks_run"] = runner.blocks_run
+            counters["interpreted"] = runner.interpreted
+        return counters
+
+    def counters(self):
+        """
+        The performance counters since the last reset_counters(), as a
+        dict. The run loop keeps its counts in locals and adds them up
+        when it returns, so they are current between runs. With a
+        BlockRunner started there are also blocks_run and interpreted,
+        its translated blocks and the instructions it had to
+        interpret.
+        """
+        base = self._counter_base
+        return dict((name, value - base.get(name, 0))
+                    for name, value in self._read_counters().items())
+
+    def reset_counters(self):
+        self._counter_base = self._read_counters()
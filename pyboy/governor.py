@@ -0,0 +1,82 @@
+"""
+Run a GameBoy in real time.
+
+The Governor paces whole frames against time.perf_counter, sleeping
+off whatever time a frame leaves over. When the host falls behind it
+stops drawing frames, never emulating them, until it has caught up
+or max_skip frames in a row have gone undrawn.
+"""
+import time
+
+
+FRAME_HZ = 59.73
+
+
+class Governor(object):
+    """
+    Paces gameboy at hz frames a second. In turbo mode frames run back
+    to back, still drawn, and nothing is skipped.
+    """
+    def __init__(self, gameboy, hz=FRAME_HZ, max_skip=4, turbo=False,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.gameboy = gameboy
+        self.period = 1.0 / hz
+        self.max_skip = max_skip
+        self.turbo = turbo
+        self._clock = clock
+        self._sleep = sleep
+        self._due = None
+        self._skipped_in_row = 0
+        self.frames = 0
+        self.rendered = 0
+        self.skipped = 0
+        self._slack = 0.0
+
+    def reset(self):
+        """
+        Start pacing afresh from now, after a pause.
+        """
+        self._due = None
+        self._skipped_in_row = 0
+
+    def run(self, frames=1):
+        for _ in range(frames):
+            self.step()
+
+    def step(self):
+        """
+        Emulate one frame, drawing it only if there is time, then wait
+        until the next one is due.
+        """
+        now = self._clock()
+        if self._due is None:
+            self._due = now
+        ppu = self.gameboy.ppu
+        behind = not self.turbo and now > self._due + self.period
+        if behind and self._skipped_in_row < self.max_skip:
+            ppu.skip_frame()
+            self._skipped_in_row += 1
+            self.skipped += 1
+        else:
+            self._skipped_in_row = 0
+            if not ppu.headless:
+                self.rendered += 1
+        self.gameboy.run_frames(1)
+        self.frames += 1
+        self._due += self.period
+        slack = self._due - self._clock()
+        self._slack += slack
+        if self.turbo:
+            self._due = None
+        elif slack > 0:
+            self._sleep(slack)
+        elif -slack > self.period * (self.max_skip + 1):
+            # too far behind to ever catch up; don't try
+            self._due = self._clock()
+
+    @property
+    def stats(self):
+        return {"frames": self.frames, "rendered": self.rendered,
+                "skipped": self.skipped,
+                "average_slack": self._slack / self.frames
+                if self.frames else 0.0}
@@ -0,0 +1,112 @@
+"""
+Count memory accesses by address.
+
+A MemoryHeatmap instruments a MemoryController by giving the instance
+its own read_byte, write_byte, read_word and write_word, which count
+and then call the plain methods. Stopping deletes them again, so an
+uninstrumented controller runs exactly the plain code. The cpu picks
+the swap up on its next run().
+
+Counts are kept per address in two array('L')s and summed per page or
+per registered controller when asked for.
+"""
+from array import array
+
+import numpy as np
+
+
+ADDRESSES = 0x10000
+METHODS = ("read_byte", "write_byte", "read_word", "write_word")
+
+
+class MemoryHeatmap(object):
+    """
+    Counts of every read and write through mem, by address.
+    """
+    def __init__(self, mem):
+        self.mem = mem
+        self.reads = array("L", [0]) * ADDRESSES
+        self.writes = array("L", [0]) * ADDRESSES
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        mem = self.mem
+        reads = self.reads
+        writes = self.writes
+        read_byte = mem.read_byte
+        write_byte = mem.write_byte
+        read_word = mem.read_word
+        write_word = mem.write_word
+
+        def counted_read_byte(addr):
+            reads[addr] += 1
+            return read_byte(addr)
+
+        def counted_write_byte(val, addr):
+            writes[addr] += 1
+            write_byte(val, addr)
+
+        def counted_read_word(addr):
+            reads[addr] += 1
+            reads[(addr + 1) & 0xFFFF] += 1
+            return read_word(addr)
+
+        def counted_write_word(val, addr):
+            writes[addr] += 1
+            writes[(addr + 1) & 0xFFFF] += 1
+            write_word(val, addr)
+
+        mem.read_byte = counted_read_byte
+        mem.write_byte = counted_write_byte
+        mem.read_word = counted_read_word
+        mem.write_word = counted_write_word
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            for name in METHODS:
+                delattr(self.mem, name)
+            self.running = False
+
+    def heatmap(self):
+        """
+        A (2, 256, 256) array of reads and writes, by page and then
+        offset in the page, ready to plot.
+        """
+        return np.array([np.frombuffer(self.reads, "L"),
+                         np.frombuffer(self.writes, "L")]).reshape(2, 256, 256)
+
+    def pages(self):
+        """
+        (reads, writes) per 256 byte page.
+        """
+        counts = self.heatmap().sum(axis=2)
+        return counts[0], counts[1]
+
+    def controllers(self):
+        """
+        (controller, start, reads, writes) for each registered
+        controller, counting only the addresses it answers for.
+        """
+        memory_map = self.mem._memory_map
+        owner = np.full(ADDRESSES, -1, np.intp)
+        # earlier registrations win where they overlap
+        for i in reversed(range(len(memory_map))):
+            con = memory_map[i]
+            owner[con.start:con.start + con.length] = i
+        mapped = owner >= 0
+        counts = [np.bincount(owner[mapped],
+                              np.frombuffer(counts, "L")[mapped],
+                              len(memory_map))
+                  for counts in (self.reads, self.writes)]
+        return [(con.controller, con.start, int(counts[0][i]),
+                 int(counts[1][i])) for i, con in enumerate(memory_map)]
@@ -0,0 +1,50 @@
+VBLANK = 1 << 0
+STAT = 1 << 1
+TIMER = 1 << 2
+SERIAL = 1 << 3
+JOYPAD = 1 << 4
+
+# Interrupts in priority order with the address each one calls.
+VECTORS = ((VBLANK, 0x40), (STAT, 0x48), (TIMER, 0x50),
+           (SERIAL, 0x58), (JOYPAD, 0x60))
+
+
+class InterruptRegister(object):
+    """
+    One of the two interrupt registers, IF at 0xFF0F or IE at 0xFFFF.
+    Hardware that raises an interrupt sets its bit in IF's value.
+    """
+    def __init__(self):
+        self.value = 0
+
+    def fork(self, forks=None):
+        register = InterruptRegister()
+        register.value = self.value
+        return register
+
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, addr):
+        return 0xE0 | self.value
+
+    def __setitem__(self, addr, val):
+        self.value = val & 0x1F
+
+
+def service(cpu, flags, enable):
+    """
+    Wake the cpu if any enabled interrupt is pending and, if the cpu
+    has interrupts enabled, call the highest priority one. Returns the
+    cycles spent.
+    """
+    pending = flags.value & enable.value
+    if not pending:
+        return 0
+    cpu.halted = False
+    if not cpu.ime:
+        return 0
+    for bit, vector in VECTORS:
+        if pending & bit:
+            flags.value &= ~bit
+            return cpu.interrupt(vector)
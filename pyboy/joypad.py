@@ -0,0 +1,43 @@
+RIGHT = 1 << 0
+LEFT = 1 << 1
+UP = 1 << 2
+DOWN = 1 << 3
+A = 1 << 4
+B = 1 << 5
+SELECT = 1 << 6
+START = 1 << 7
+
+SELECT_DIRECTIONS = 1 << 4
+SELECT_BUTTONS = 1 << 5
+
+
+class Joypad(object):
+    """
+    The P1 register at 0xFF00. buttons is a bitmask of the constants
+    above, set by whoever is driving the emulator. The game selects a
+    row by clearing bit 4 or 5 and reads the pressed keys of that row
+    as cleared bits in the low nibble.
+    """
+    def __init__(self):
+        self.buttons = 0
+        self._select = SELECT_DIRECTIONS | SELECT_BUTTONS
+
+    def fork(self, forks=None):
+        joypad = Joypad()
+        joypad.buttons = self.buttons
+        joypad._select = self._select
+        return joypad
+
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, addr):
+        pressed = 0
+        if not self._select & SELECT_DIRECTIONS:
+            pressed |= self.buttons & 0xF
+        if not self._select & SELECT_BUTTONS:
+            pressed |= self.buttons >> 4
+        return 0xC0 | self._select | (~pressed & 0xF)
+
+    def __setitem__(self, addr, val):
+        self._select = val & (SELECT_DIRECTIONS | SELECT_BUTTONS)
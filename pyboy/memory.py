@@ -1,10 +1,24 @@
 from collections import namedtuple
 
 
+PAGE_BITS = 8
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
 MappedController = namedtuple('MappedController',
                               ('controller', 'start', 'length'))
 
 
+def forked(obj, forks):
+    """
+    The fork of obj in forks, made with obj.fork(forks) and kept there
+    the first time it is asked for.
+    """
+    if id(obj) not in forks:
+        forks[id(obj)] = obj.fork(forks)
+    return forks[id(obj)]
+
+
 class MemoryController(object):
     def __init__(self):
         self._memory_map = []
@@ -13,6 +27,14 @@ class MemoryController(object):
         con = MappedController(controller, start, len(controller))
         self._memory_map.append(con)
 
+    def register_mirror(self, start, target, length):
+        """
+        Make the length addresses from start answer for those from
+        target, as echo RAM does for work RAM.
+        """
+        self.register_controller(MirrorController(self, target, length),
+                                 start)
+
     def _get_controller(self, addr):
         for con in self._memory_map:
             if addr >= con.start:
@@ -20,6 +42,47 @@ class MemoryController(object):
                     return con
         raise IndexError("memory out of range: 0x%x" % addr)
 
+    def _get_run(self, addr, end):
+        """
+        The controller at addr and where, before end, the run of
+        addresses it answers for stops. A controller registered
+        earlier takes over wherever it overlaps a later one.
+        """
+        con = self._get_controller(addr)
+        stop = min(end, con.start + con.length)
+        for other in self._memory_map:
+            if other is con:
+                break
+            if addr < other.start < stop:
+                stop = other.start
+        return con, stop
+
+    def fork(self, forks=None):
+        """
+        Return a new MemoryController with the same memory map, with
+        every controller in it forked by its fork(). ROM forks to
+        itself, so it is shared for good, and RAM shares its pages copy
+        on write, so a fork only costs memory for the pages it writes.
+
+        forks maps the id() of everything forked so far to its fork,
+        so hardware reached from more than one place, like the PPU
+        behind VRAM, OAM and the LCD registers, is forked once.
+
+        Raises TypeError if a controller has no fork().
+        """
+        for con in self._memory_map:
+            if getattr(con.controller, "fork", None) is None:
+                raise TypeError("can't fork the %s at 0x%04X" %
+                                (type(con.controller).__name__, con.start))
+        forks = {} if forks is None else forks
+        child = MemoryController()
+        forks[id(self)] = child
+        child._memory_map = [
+            MappedController(forked(con.controller, forks), con.start,
+                             con.length)
+            for con in self._memory_map]
+        return child
+
     def read_byte(self, addr):
         con = self._get_controller(addr)
         return con.controller[addr - con.start]
@@ -28,6 +91,66 @@ class MemoryController(object):
         con = self._get_controller(addr)
         con.controller[addr - con.start] = val
 
+    def read_block(self, addr, length):
+        """
+        Read length bytes starting at addr into a bytearray. Runs that
+        fall in a byte buffer controller or RAM are sliced out whole,
+        other controllers are read a byte at a time.
+        """
+        block = bytearray()
+        end = addr + length
+        while addr < end:
+            con, stop = self._get_run(addr, end)
+            controller = con.controller
+            if isinstance(controller, (bytes, bytearray)):
+                block += controller[addr - con.start:stop - con.start]
+            elif isinstance(controller, RamController):
+                block += controller.block(addr - con.start, stop - con.start)
+            else:
+                block.extend(controller[i - con.start]
+                             for i in range(addr, stop))
+            addr = stop
+        return block
+
+    def peek_block(self, addr, length):
+        """
+        Like read_block(), but byte buffer controllers are copied from
+        their storage directly, past any rules of their own about
+        reading, such as VRAM being locked while the PPU draws.
+        """
+        block = bytearray()
+        end = addr + length
+        while addr < end:
+            con, stop = self._get_run(addr, end)
+            controller = con.controller
+            if isinstance(controller, (bytes, bytearray)):
+                block += memoryview(controller)[addr - con.start:
+                                                stop - con.start]
+            elif isinstance(controller, RamController):
+                block += controller.block(addr - con.start, stop - con.start)
+            else:
+                block.extend(controller[i - con.start]
+                             for i in range(addr, stop))
+            addr = stop
+        return block
+
+    def view_block(self, addr, length):
+        """
+        A memoryview of the length bytes at addr, straight onto the
+        storage of the byte buffer controller or RAM page they lie in.
+        None when they span controllers or RAM pages, or the controller
+        is neither; read_block() works for those.
+        """
+        con, stop = self._get_run(addr, addr + length)
+        if stop < addr + length:
+            return None
+        start = addr - con.start
+        if isinstance(con.controller, RamController):
+            return con.controller.view(start, start + length)
+        if not isinstance(con.controller, (bytes, bytearray)):
+            return None
+        return memoryview(con.controller)[start:start + length]
+
     def read_word(self, addr):
         con = self._get_controller(addr)
         l = con.controller[addr - con.start]
@@ -40,6 +163,133 @@ class MemoryController(object):
         con.controller[addr - con.start + 1] = (val >> 8) & 0xFF
 
 
-class RamController(list):
+class RamController(object):
+    """
+    RAM kept in PAGE_SIZE pages. A fork() shares every page with its
+    parent, and whichever of them writes to a page first gets its own
+    copy of it; the pages neither writes stay shared.
+    """
     def __init__(self, size):
-        self.extend([0]*size)
+        self._length = size
+        self._pages = [bytearray(min(PAGE_SIZE, size - start))
+                       for start in range(0, size, PAGE_SIZE)]
+        # 1 for each page only this controller holds
+        self._owned = bytearray(b"\x01") * len(self._pages)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, addr):
+        return self._pages[addr >> PAGE_BITS][addr & PAGE_MASK]
+
+    def __setitem__(self, addr, val):
+        page = addr >> PAGE_BITS
+        if not self._owned[page]:
+            self._own(page)
+        self._pages[page][addr & PAGE_MASK] = val
+
+    def _own(self, page):
+        self._pages[page] = bytearray(self._pages[page])
+        self._owned[page] = 1
+
+    def block(self, start, stop):
+        """
+        The bytes from start to stop, as a bytearray.
+        """
+        block = bytearray()
+        while start < stop:
+            page = start >> PAGE_BITS
+            end = min(stop, (page + 1) << PAGE_BITS)
+            offset = start & PAGE_MASK
+            block += self._pages[page][offset:offset + end - start]
+            start = end
+        return block
+
+    def view(self, start, stop):
+        """
+        A writable memoryview of the bytes from start to stop, or None
+        if they span pages. The page becomes this controller's own.
+        """
+        page = start >> PAGE_BITS
+        if stop > (page + 1) << PAGE_BITS:
+            return None
+        if not self._owned[page]:
+            self._own(page)
+        offset = start & PAGE_MASK
+        return memoryview(self._pages[page])[offset:offset + stop - start]
+
+    def copy(self):
+        ram = RamController(0)
+        ram._length = self._length
+        ram._pages = [bytearray(page) for page in self._pages]
+        ram._owned = bytearray(b"\x01") * len(ram._pages)
+        return ram
+
+    def fork(self, forks=None):
+        ram = RamController(0)
+        ram._length = self._length
+        ram._pages = list(self._pages)
+        ram._owned = bytearray(len(ram._pages))
+        self._owned[:] = ram._owned
+        return ram
+
+
+class MirrorController(object):
+    """
+    Addresses that read and write length others from target in the
+    same memory map.
+    """
+    def __init__(self, mem, target, length):
+        self._mem = mem
+        self.target = target
+        self._length = length
+
+    def fork(self, forks):
+        return MirrorController(forked(self._mem, forks), self.target,
+                                self._length)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, addr):
+        return self._mem.read_byte(self.target + addr)
+
+    def __setitem__(self, addr, val):
+        self._mem.write_byte(val, self.target + addr)
+
+
+class RomController(bytes):
+    """
+    Read only memory. Writes are dropped, the way the hardware
+    ignores them when there is no bank controller listening.
+    """
+    def __setitem__(self, addr, val):
+        pass
+
+    def fork(self, forks=None):
+        return self
+
+
+class SharedRomController(object):
+    """
+    Read only memory over a buffer owned by someone else, typically a
+    multiprocessing.shared_memory block holding a ROM many processes
+    run. Nothing is copied. Like RomController, writes are dropped.
+    """
+    def __init__(self, buf):
+        self._buf = memoryview(buf).toreadonly()
+
+    def __len__(self):
+        return len(self._buf)
+
+    def __getitem__(self, addr):
+        return self._buf[addr]
+
+    def __setitem__(self, addr, val):
+        pass
+
+    def fork(self, forks=None):
+        return self
+
+    def release(self):
+        self._buf.release()
@@ -0,0 +1,56 @@
+"""
+Names for the instructions, worked out from the Z80 handler names.
+
+The handlers are named after their assembly: ld_a_addr_hl_inc is
+ld a, (hl+) and bit_7_d is bit 7, d. mnemonic() turns one into the
+other.
+"""
+
+# immediates that are addresses when they are loaded from or stored to
+ADDRESSES = ("a8", "a16")
+
+# names the general rule gets wrong
+SPECIAL = {
+    "extra_ops": "prefix cb",
+    "ldh_a16_a": "ld (a16), a",
+    "ldh_a_a16": "ld a, (a16)",
+    "ld_hl_sp_r8": "ld hl, sp+r8",
+}
+
+
+def mnemonic(name):
+    """
+    The assembly for the handler called name.
+    """
+    name = name.lower()
+    if name in SPECIAL:
+        return SPECIAL[name]
+    tokens = name.split("_")
+    op = tokens[0]
+    operands = []
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token == "addr":
+            token = tokens[i]
+            i += 1
+            if i < len(tokens) and tokens[i] in ("inc", "dec"):
+                token += "+" if tokens[i] == "inc" else "-"
+                i += 1
+            token = "(%s)" % token
+        elif token in ADDRESSES and op in ("ld", "ldh"):
+            token = "(%s)" % token
+        operands.append(token)
+    if not operands:
+        return op
+    return "%s %s" % (op, ", ".join(operands))
+
+
+def opcode_label(code, extra=False):
+    """
+    How reports show an opcode: 0x3E, or CB 0x7C for the 0xCB table.
+    """
+    if extra:
+        return "CB 0x%02X" % code
+    return "0x%02X" % code
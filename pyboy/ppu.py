@@ -0,0 +1,606 @@
+"""
+The LCD controller.
+
+Lines are drawn with NumPy. VRAM and OAM are viewed as uint8 arrays
+straight through the buffer protocol. A line is drawn by fetching the
+32 tile rows it crosses, decoding their 2bpp bit planes with array
+shifts, and mapping colour numbers to shades with a take on a palette
+lookup table. Python only loops over the (at most ten) sprites on the
+line.
+"""
+import numpy as np
+
+import interrupts
+from framebuffer import FrameBuffer, WIDTH, HEIGHT
+from memory import forked
+
+
+# LCD registers, as offsets from 0xFF40
+LCDC, STAT, SCY, SCX, LY, LYC, DMA, BGP, OBP0, OBP1, WY, WX = range(12)
+
+LCD_ON = 1 << 7
+WINDOW_MAP = 1 << 6
+WINDOW_ON = 1 << 5
+TILE_DATA = 1 << 4
+BG_MAP = 1 << 3
+OBJ_SIZE = 1 << 2
+OBJ_ON = 1 << 1
+BG_ON = 1 << 0
+
+LYC_INTERRUPT = 1 << 6
+OAM_INTERRUPT = 1 << 5
+VBLANK_INTERRUPT = 1 << 4
+HBLANK_INTERRUPT = 1 << 3
+COINCIDENCE = 1 << 2
+
+MODE_HBLANK = 0
+MODE_VBLANK = 1
+MODE_OAM = 2
+MODE_TRANSFER = 3
+
+OAM_CYCLES = 80
+TRANSFER_CYCLES = 172
+LINE_CYCLES = 456
+
+LINES = 154
+
+SPRITES_PER_LINE = 10
+
+BEHIND_BG = 1 << 7
+Y_FLIP = 1 << 6
+X_FLIP = 1 << 5
+OBJ_PALETTE = 1 << 4
+
+# Bit shift that puts pixel x of a tile row in bit 0.
+SHIFTS = np.arange(7, -1, -1, dtype=np.uint8)
+
+# PALETTES[p] maps colour numbers to shades under palette register p.
+PALETTES = np.array([[(p >> (2 * c)) & 3 for c in range(4)]
+                     for p in range(256)], np.uint8)
+
+TILES = 384
+TILE_DATA_SIZE = TILES * 16
+
+# Tile numbers in the 0x8800 addressing mode, where map entries are
+# signed offsets from tile 256.
+SIGNED_TILES = 256 + np.arange(256).astype(np.int8).astype(np.intp)
+
+XS = np.arange(WIDTH)
+
+
+def decode_rows(lo, hi):
+    """
+    Decode tile rows from their two bit planes into an (n, 8) array
+    of colour numbers.
+    """
+    return (((hi[:, None] >> SHIFTS) & 1) << 1 |
+            ((lo[:, None] >> SHIFTS) & 1))
+
+
+class TileCache(object):
+    """
+    Every tile in VRAM decoded to an 8x8 array of colour numbers.
+    Writes to tile data mark just the tiles they touch, and those are
+    decoded again the next time the renderer refreshes the cache.
+    """
+    def __init__(self, vram):
+        self.tiles = np.zeros((TILES, 8, 8), np.uint8)
+        self._data = np.frombuffer(vram, np.uint8)[:TILE_DATA_SIZE]
+        self._data = self._data.reshape(TILES, 8, 2)
+        self._dirty = bytearray(TILES)
+        self._dirty_view = np.frombuffer(self._dirty, np.uint8)
+        self.stale = False
+        self.decoded = 0
+        # refreshes that found every tile up to date, and ones that
+        # had to decode some
+        self.hits = 0
+        self.misses = 0
+        self.decoded_this_frame = 0
+        self.decoded_last_frame = 0
+
+    def invalidate(self, start, stop=None):
+        """
+        Mark the tiles holding VRAM bytes start to stop (or just
+        start) as dirty.
+        """
+        if start >= TILE_DATA_SIZE:
+            return
+        if stop is None:
+            self._dirty[start >> 4] = 1
+        else:
+            stop = min(stop, TILE_DATA_SIZE)
+            self._dirty_view[start >> 4:(stop + 15) >> 4] = 1
+        self.stale = True
+
+    def refresh(self):
+        if not self.stale:
+            self.hits += 1
+            return
+        self.misses += 1
+        dirty = np.flatnonzero(self._dirty_view)
+        data = self._data[dirty]
+        rows = decode_rows(data[:, :, 0].ravel(), data[:, :, 1].ravel())
+        self.tiles[dirty] = rows.reshape(-1, 8, 8)
+        self._dirty_view[:] = 0
+        self.stale = False
+        self.decoded += len(dirty)
+        self.decoded_this_frame += len(dirty)
+
+    def start_frame(self):
+        self.decoded_last_frame = self.decoded_this_frame
+        self.decoded_this_frame = 0
+
+    def load(self, cache):
+        """
+        Take on everything about another cache of the same VRAM.
+        """
+        self.tiles[:] = cache.tiles
+        self._dirty[:] = cache._dirty
+        self.stale = cache.stale
+        self.decoded = cache.decoded
+        self.hits = cache.hits
+        self.misses = cache.misses
+        self.decoded_this_frame = cache.decoded_this_frame
+        self.decoded_last_frame = cache.decoded_last_frame
+
+
+class SpriteIndex(object):
+    """
+    The sprites on every line, worked out from OAM in one go. Writes to
+    OAM mark the index stale and it is only built again when a line is
+    asked for after that, or the sprite height changes.
+    """
+    def __init__(self, oam):
+        self._oam = np.frombuffer(oam, np.uint8).reshape(40, 4)
+        self._lines = None
+        self._height = 0
+        self.stale = True
+        self.builds = 0
+        self.lookups = 0
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self, height):
+        """
+        For each line, the OAM indexes of its sprites, highest priority
+        first: the first ten in OAM order, then sorted by x with ties
+        going to the lower index.
+        """
+        top = self._oam[:, 0].astype(np.intp) - 16
+        lines = np.arange(HEIGHT)[:, None]
+        on_line = (top <= lines) & (lines < top + height)
+        on_line &= on_line.cumsum(axis=1) <= SPRITES_PER_LINE
+        order = np.argsort(self._oam[:, 1], kind="stable")
+        self._lines = [order[shown] for shown in on_line[:, order]]
+        self._height = height
+        self.stale = False
+        self.builds += 1
+
+    def load(self, index):
+        """
+        Take on everything about another index of the same OAM.
+        """
+        self._lines = index._lines
+        self._height = index._height
+        self.stale = index.stale
+        self.builds = index.builds
+        self.lookups = index.lookups
+
+    def line(self, ly, height):
+        self.lookups += 1
+        if self.stale or height != self._height:
+            self.build(height)
+        return self._lines[ly]
+
+
+class VideoRam(bytearray):
+    """
+    0x8000-0x9FFF. The cpu can't get at it while the PPU is drawing.
+    The renderer views it as one array, so it is a plain buffer rather
+    than paged RAM, and a fork copies it whole.
+    """
+    def __init__(self, ppu):
+        super(VideoRam, self).__init__(0x2000)
+        self._ppu = ppu
+        self.tile_cache = TileCache(self)
+
+    def fork(self, forks):
+        return forked(self._ppu, forks).vram
+
+    def __getitem__(self, addr):
+        if self._ppu.mode == MODE_TRANSFER:
+            return 0xFF
+        return bytearray.__getitem__(self, addr)
+
+    def __setitem__(self, addr, val):
+        if self._ppu.mode == MODE_TRANSFER:
+            return
+        bytearray.__setitem__(self, addr, val)
+        self._ppu.writes += 1
+        if type(addr) is slice:
+            self.tile_cache.invalidate(*addr.indices(len(self))[:2])
+        else:
+            self.tile_cache.invalidate(addr)
+
+    def load(self, start, data):
+        """
+        Copy data in at start, as HDMA does, whatever the PPU is doing.
+        """
+        bytearray.__setitem__(self, slice(start, start + len(data)), data)
+        self._ppu.writes += 1
+        self.tile_cache.invalidate(start, start + len(data))
+
+
+class ObjectAttributeMemory(bytearray):
+    """
+    0xFE00-0xFE9F. Locked while the PPU is searching it and drawing,
+    and for dma_cycles after an OAM DMA.
+    """
+    def __init__(self, ppu):
+        super(ObjectAttributeMemory, self).__init__(0xA0)
+        self._ppu = ppu
+        self.sprite_index = SpriteIndex(self)
+        self.dma_cycles = 0
+
+    def fork(self, forks):
+        return forked(self._ppu, forks).oam
+
+    def __getitem__(self, addr):
+        if self._ppu.mode >= MODE_OAM or self.dma_cycles:
+            return 0xFF
+        return bytearray.__getitem__(self, addr)
+
+    def __setitem__(self, addr, val):
+        if self._ppu.mode < MODE_OAM and not self.dma_cycles:
+            bytearray.__setitem__(self, addr, val)
+            self._ppu.writes += 1
+            self.sprite_index.invalidate()
+
+    def load(self, data, cycles=0):
+        """
+        Replace all of OAM with data, as OAM DMA does, whatever the
+        PPU is doing. The cpu is then locked out for cycles.
+        """
+        bytearray.__setitem__(self, slice(0, len(self)), data)
+        self._ppu.writes += 1
+        self.sprite_index.invalidate()
+        self.dma_cycles = cycles
+
+
+class ScanlineRenderer(object):
+    """
+    Draws lines of the PPU's framebuffer from its VRAM, OAM and
+    registers.
+    """
+    def __init__(self, ppu):
+        self._regs = ppu._regs
+        self.vram = np.frombuffer(ppu.vram, np.uint8)
+        self.oam = np.frombuffer(ppu.oam, np.uint8).reshape(40, 4)
+        self._screen = ppu.screen
+        self.framebuffer = self._screen.back
+        self.tile_cache = ppu.vram.tile_cache
+        self.sprite_index = ppu.oam.sprite_index
+        self.window_line = 0
+        self._bg = np.zeros(WIDTH, np.uint8)
+
+    def start_frame(self):
+        self.window_line = 0
+        self.framebuffer = self._screen.begin()
+        self.tile_cache.start_frame()
+
+    def carry_on(self, window_line):
+        """
+        Go on with a frame that was in progress, window_line lines into
+        the window, in the screen's new back slot once another frame
+        has been published from the one it was drawn in. The lines
+        already drawn there come along.
+        """
+        self.window_line = window_line
+        screen = self._screen
+        self.framebuffer = screen.begin()
+        if not np.shares_memory(self.framebuffer, screen.front):
+            self.framebuffer[:] = screen.front
+
+    def _tile_rows(self, map_base, tile_row, y):
+        """
+        The 32 decoded pixel rows of one row of a tile map, as 256
+        colour numbers.
+        """
+        start = map_base + tile_row * 32
+        ids = self.vram[start:start + 32]
+        if not self._regs[LCDC] & TILE_DATA:
+            ids = SIGNED_TILES[ids]
+        return self.tile_cache.tiles[ids, y & 7].ravel()
+
+    def render_line(self, ly):
+        regs = self._regs
+        lcdc = regs[LCDC]
+        bg = self._bg
+        self.tile_cache.refresh()
+        if lcdc & BG_ON:
+            y = (ly + regs[SCY]) & 0xFF
+            pixels = self._tile_rows(0x1C00 if lcdc & BG_MAP else 0x1800,
+                                     y >> 3, y)
+            bg[:] = pixels[(XS + regs[SCX]) & 0xFF]
+            wx = regs[WX] - 7
+            if lcdc & WINDOW_ON and ly >= regs[WY] and wx < WIDTH:
+                y = self.window_line
+                self.window_line += 1
+                pixels = self._tile_rows(
+                    0x1C00 if lcdc & WINDOW_MAP else 0x1800, y >> 3, y)
+                start = max(wx, 0)
+                bg[start:] = pixels[start - wx:WIDTH - wx]
+        else:
+            bg[:] = 0
+        line = self.framebuffer[ly]
+        line[:] = PALETTES[regs[BGP]].take(bg)
+        if lcdc & OBJ_ON:
+            self._render_sprites(ly, line)
+
+    def line_sprites(self, ly):
+        """
+        OAM indexes of the sprites on line ly, highest priority first.
+        """
+        height = 16 if self._regs[LCDC] & OBJ_SIZE else 8
+        return self.sprite_index.line(ly, height)
+
+    def _render_sprites(self, ly, line):
+        regs = self._regs
+        tall = regs[LCDC] & OBJ_SIZE
+        height = 16 if tall else 8
+        claimed = np.zeros(WIDTH, bool)
+        behind = np.zeros(WIDTH, bool)
+        shades = np.zeros(WIDTH, np.uint8)
+        for i in self.line_sprites(ly):
+            y, x, tile, attrs = self.oam[i]
+            row = ly - (int(y) - 16)
+            if attrs & Y_FLIP:
+                row = height - 1 - row
+            if tall:
+                tile &= 0xFE
+            colors = self.tile_cache.tiles[tile + (row >> 3), row & 7]
+            if attrs & X_FLIP:
+                colors = colors[::-1]
+            xs = int(x) - 8 + np.arange(8)
+            visible = (xs >= 0) & (xs < WIDTH) & (colors != 0)
+            xs = xs[visible]
+            colors = colors[visible]
+            free = ~claimed[xs]
+            xs = xs[free]
+            claimed[xs] = True
+            behind[xs] = bool(attrs & BEHIND_BG)
+            palette = regs[OBP1] if attrs & OBJ_PALETTE else regs[OBP0]
+            shades[xs] = PALETTES[palette].take(colors[free])
+        shown = claimed & ~(behind & (self._bg != 0))
+        line[shown] = shades[shown]
+
+
+class PPU(object):
+    """
+    Register the PPU at 0xFF40 for the LCD registers; vram and oam
+    are its memory. Frames are drawn into screen, a FrameBuffer, and
+    framebuffer is the shade of every pixel of the last one.
+
+    The PPU is driven by tick() with the cycles the cpu has run, and
+    cycles_to_event says how far the cpu may run before the next mode
+    change, so LY, STAT, the interrupts and the memory locks all
+    change on time.
+
+    In headless mode all of that still happens but no pixels are
+    drawn. render_next_frame() draws one frame anyway and
+    render_frame() draws one straight away from the current state.
+    skip_frame() works the other way round.
+
+    fork() makes a PPU in the same state, with its own copy of VRAM
+    and OAM and a private screen showing the same frames.
+
+    writes counts every write that could change what is drawn. Each
+    line drawn notes the count, so a line whose count is the same as
+    when it was last drawn can't have changed; frame_changed() and
+    changed_lines() report that for the last frame published.
+    """
+    def __init__(self, interrupt_flags, headless=False, screen=None):
+        self._if = interrupt_flags
+        self.headless = headless
+        self.vram = VideoRam(self)
+        self.oam = ObjectAttributeMemory(self)
+        self._regs = bytearray(12)
+        self._regs[LCDC] = 0x91
+        self._regs[BGP] = 0xFC
+        self.screen = screen or FrameBuffer()
+        self._renderer = ScanlineRenderer(self)
+        self.frames = 0
+        self.mode = MODE_OAM
+        self.ly = 0
+        self._dot = 0
+        self._next = OAM_CYCLES
+        self._stat_line = False
+        self._render_once = False
+        self._rendering = not headless
+        # a CGB machine's Hdma, which copies a block every HBlank
+        self.hdma = None
+        self.writes = 0
+        self._line_writes = [-1] * HEIGHT
+        self._line_changed = bytearray(HEIGHT)
+        self._changed = np.zeros(HEIGHT, bool)
+
+    def fork(self, forks):
+        screen = self.screen
+        ppu = PPU(forked(self._if, forks), headless=self.headless,
+                  screen=FrameBuffer(screen.double, screen.rgba))
+        # VRAM, OAM and HDMA lead back here
+        forks[id(self)] = ppu
+        bytearray.__setitem__(ppu.vram, slice(None), self.vram)
+        ppu.vram.tile_cache.load(self.vram.tile_cache)
+        bytearray.__setitem__(ppu.oam, slice(None), self.oam)
+        ppu.oam.sprite_index.load(self.oam.sprite_index)
+        ppu.oam.dma_cycles = self.oam.dma_cycles
+        ppu._regs[:] = self._regs
+        for name in ("frames", "mode", "ly", "_dot", "_next", "_stat_line",
+                     "_render_once", "_rendering", "writes"):
+            setattr(ppu, name, getattr(self, name))
+        ppu._line_writes = list(self._line_writes)
+        ppu._line_changed[:] = self._line_changed
+        ppu._changed[:] = self._changed
+        ppu.screen.front[:] = screen.front
+        ppu.screen.back[:] = screen.back
+        ppu._renderer.window_line = self._renderer.window_line
+        if self.hdma is not None:
+            ppu.hdma = forked(self.hdma, forks)
+        return ppu
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __getitem__(self, addr):
+        if addr == LY:
+            return self.ly
+        if addr == STAT:
+            coincidence = COINCIDENCE if self.ly == self._regs[LYC] else 0
+            return 0x80 | self._regs[STAT] | coincidence | self.mode
+        return self._regs[addr]
+
+    def __setitem__(self, addr, val):
+        if addr == LY:
+            return
+        if addr == STAT:
+            val &= 0x78
+        elif addr == LCDC and (val ^ self._regs[LCDC]) & LCD_ON:
+            self._switch(val & LCD_ON)
+        if addr != STAT and addr != LYC:
+            self.writes += 1
+        self._regs[addr] = val
+        self._update_stat()
+
+    @property
+    def framebuffer(self):
+        return self.screen.front
+
+    @property
+    def cycles_to_event(self):
+        """
+        Cycles until the next mode change.
+        """
+        if not self._regs[LCDC] & LCD_ON:
+            return LINE_CYCLES
+        return self._next - self._dot
+
+    def frame_changed(self):
+        """
+        Whether the last frame published differs from the one before.
+        """
+        return bool(self._changed.any())
+
+    def changed_lines(self):
+        """
+        The lines of the last frame published that differ from the
+        frame before.
+        """
+        return np.flatnonzero(self._changed)
+
+    def render_next_frame(self):
+        """
+        Draw the next frame even in headless mode.
+        """
+        self._render_once = True
+
+    def skip_frame(self):
+        """
+        Don't draw the frame in progress. Emulation carries on and the
+        screen keeps showing the last frame drawn.
+        """
+        self._rendering = False
+
+    def render_frame(self):
+        """
+        Draw a whole frame now from the current VRAM and registers.
+        A frame in progress carries on in the next slot.
+        """
+        window_line = self._renderer.window_line
+        self._renderer.start_frame()
+        for ly in range(HEIGHT):
+            self._render_line(ly)
+        self._publish()
+        self._renderer.carry_on(window_line)
+
+    def tick(self, cycles):
+        if self.oam.dma_cycles:
+            self.oam.dma_cycles = max(0, self.oam.dma_cycles - cycles)
+        if not self._regs[LCDC] & LCD_ON:
+            return
+        self._dot += cycles
+        while self._dot >= self._next:
+            self._next_mode()
+
+    def _switch(self, on):
+        self.ly = 0
+        self._dot = 0
+        if on:
+            self.mode = MODE_OAM
+            self._next = OAM_CYCLES
+            self._start_frame()
+        else:
+            self.mode = MODE_HBLANK
+
+    def _start_frame(self):
+        self._rendering = not self.headless or self._render_once
+        self._render_once = False
+        self._renderer.start_frame()
+
+    def _next_mode(self):
+        mode = self.mode
+        if mode == MODE_OAM:
+            self.mode = MODE_TRANSFER
+            self._next = OAM_CYCLES + TRANSFER_CYCLES
+        elif mode == MODE_TRANSFER:
+            self.mode = MODE_HBLANK
+            self._next = LINE_CYCLES
+            if self._rendering:
+                self._render_line(self.ly)
+            if self.hdma is not None and self.hdma.active:
+                self.hdma.hblank()
+        else:
+            self._dot -= LINE_CYCLES
+            self.ly += 1
+            if self.ly == HEIGHT:
+                self.mode = MODE_VBLANK
+                self._next = LINE_CYCLES
+                self._if.value |= interrupts.VBLANK
+                self.frames += 1
+                if self._rendering:
+                    self._publish()
+            elif self.ly == LINES:
+                self.ly = 0
+                self.mode = MODE_OAM
+                self._next = OAM_CYCLES
+                self._start_frame()
+            elif mode == MODE_HBLANK:
+                self.mode = MODE_OAM
+                self._next = OAM_CYCLES
+        self._update_stat()
+
+    def _render_line(self, ly):
+        writes = self.writes
+        self._line_changed[ly] = writes != self._line_writes[ly]
+        self._line_writes[ly] = writes
+        self._renderer.render_line(ly)
+
+    def _publish(self):
+        self._changed[:] = np.frombuffer(self._line_changed, bool)
+        self.screen.publish()
+
+    def _update_stat(self):
+        """
+        The STAT interrupt fires when any of its enabled sources
+        becomes true while none of them was.
+        """
+        stat = self._regs[STAT]
+        mode = self.mode
+        line = bool((stat & LYC_INTERRUPT and self.ly == self._regs[LYC]) or
+                    (stat & OAM_INTERRUPT and mode == MODE_OAM) or
+                    (stat & VBLANK_INTERRUPT and mode == MODE_VBLANK) or
+                    (stat & HBLANK_INTERRUPT and mode == MODE_HBLANK))
+        if line and not self._stat_line:
+            self._if.value |= interrupts.STAT
+        self._stat_line = line
@@ -0,0 +1,198 @@
+"""
+Count what a Z80 runs, opcode by opcode.
+
+Profiling works by swapping the cpu's dispatch tables for ones whose
+handlers count before returning, so an unprofiled cpu runs the plain
+handlers and pays nothing. The swap is seen by the next call to
+Z80.run().
+
+The tracer swaps the same tables, and the two can be started and
+stopped in any order: each installed table is a HandlerTable that
+knows the one below it. A tool stopped while another's table covers
+its own leaves its table passing straight through, and the table is
+dropped as soon as it is uncovered.
+"""
+from opcodes import mnemonic, opcode_label
+
+
+class HandlerTable(dict):
+    """
+    A dispatch table installed over below, with a handler made by
+    wrap(code, below) for every code in it. Handlers look up below
+    when called, so a table under them can change in place.
+    """
+    def __init__(self, below, wrap):
+        dict.__init__(self, ((code, wrap(code, below)) for code in below))
+        self.below = below
+        self.stopped = False
+
+
+def _passthrough(code, below):
+    def run():
+        return below[code]()
+    return run
+
+
+def install(cpu, attr, wrap):
+    """
+    Put a HandlerTable made with wrap over cpu's table attr, and
+    return it.
+    """
+    table = HandlerTable(getattr(cpu, attr), wrap)
+    setattr(cpu, attr, table)
+    return table
+
+
+def uninstall(cpu, attr, table):
+    """
+    Take table out of cpu's table attr. If it is on top, whatever it
+    covers comes back, less any stopped tables; if not, it is left to
+    pass straight through until it is uncovered.
+    """
+    if getattr(cpu, attr) is table:
+        below = table.below
+        while isinstance(below, HandlerTable) and below.stopped:
+            below = below.below
+        setattr(cpu, attr, below)
+    else:
+        table.stopped = True
+        for code in table:
+            table[code] = _passthrough(code, table.below)
+
+
+def plain(table):
+    """
+    The cpu's own handlers, under any installed tables.
+    """
+    while isinstance(table, HandlerTable):
+        table = table.below
+    return table
+
+
+def extra_op_cycles(code):
+    """
+    0xCB instructions take 8 cycles, or 16 when they work on (hl).
+    """
+    return 16 if code & 7 == 6 else 8
+
+
+class Profiler(object):
+    """
+    Executions and cycles for every opcode in counts and cycles, and
+    for the 0xCB table in extra_counts and extra_cycles.
+    """
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.counts = [0] * 256
+        self.cycles = [0] * 256
+        self.extra_counts = [0] * 256
+        self.extra_cycles = [0] * 256
+        self._op_map = plain(cpu.op_map)
+        self._extra_ops_map = plain(cpu.extra_ops_map)
+        self._tables = None
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        cpu = self.cpu
+        self._op_map = plain(cpu.op_map)
+        self._extra_ops_map = plain(cpu.extra_ops_map)
+        self._tables = (install(cpu, "op_map", self._counted),
+                        install(cpu, "extra_ops_map", self._counted_extra))
+        self.running = True
+
+    def stop(self):
+        if not self.running:
+            return
+        uninstall(self.cpu, "op_map", self._tables[0])
+        uninstall(self.cpu, "extra_ops_map", self._tables[1])
+        self._tables = None
+        self.running = False
+
+    def _counted(self, code, below):
+        counts = self.counts
+        cycles = self.cycles
+
+        def counted():
+            n = below[code]()
+            counts[code] += 1
+            cycles[code] += n
+            return n
+        return counted
+
+    def _counted_extra(self, code, below):
+        counts = self.extra_counts
+        cycles = self.extra_cycles
+        n = extra_op_cycles(code)
+
+        def counted():
+            below[code]()
+            counts[code] += 1
+            cycles[code] += n
+        return counted
+
+    def entries(self):
+        """
+        (label, mnemonic, count, cycles) for everything that ran, most
+        cycles first.
+        """
+        entries = []
+        for table, counts, cycles, extra in (
+                (self._op_map, self.counts, self.cycles, False),
+                (self._extra_ops_map, self.extra_counts, self.extra_cycles,
+                 True)):
+            for code, handler in table.items():
+                # 0xCB's cycles are in the instructions it calls
+                if counts[code] and (extra or code != 0xCB):
+                    entries.append((opcode_label(code, extra),
+                                    mnemonic(handler.__name__),
+                                    counts[code], cycles[code]))
+        entries.sort(key=lambda entry: (-entry[3], entry[0]))
+        return entries
+
+    def histogram(self):
+        """
+        How many instructions took each number of cycles. Conditional
+        instructions are split into taken and not taken from their
+        cycle totals. 0xCB instructions count once, at their full
+        cost.
+        """
+        histogram = {}
+        for code, handler in self._op_map.items():
+            count = self.counts[code]
+            if not count or code == 0xCB:
+                continue
+            base = handler.cycles
+            taken = 0
+            if handler.branch_cycles:
+                taken = ((self.cycles[code] - count * base) //
+                         (handler.branch_cycles - base))
+                histogram[handler.branch_cycles] = \
+                    histogram.get(handler.branch_cycles, 0) + taken
+            histogram[base] = histogram.get(base, 0) + count - taken
+        for code, count in enumerate(self.extra_counts):
+            if count:
+                n = extra_op_cycles(code)
+                histogram[n] = histogram.get(n, 0) + count
+        return histogram
+
+    def report(self, limit=None):
+        """
+        A table of entries(), limit lines long at most.
+        """
+        entries = self.entries()
+        total = sum(entry[3] for entry in entries) or 1
+        lines = ["%-9s %-16s %12s %14s %7s" % ("opcode", "instruction",
+                                               "count", "cycles", "share")]
+        for label, name, count, cycles in entries[:limit]:
+            lines.append("%-9s %-16s %12d %14d %6.2f%%" %
+                         (label, name, count, cycles, 100.0 * cycles / total))
+        return "\n".join(lines)
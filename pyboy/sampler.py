@@ -0,0 +1,136 @@
+"""
+Find where a game spends its time by sampling the program counter.
+
+Every interval cycles the sampler notes the cpu's pc, and the ROM
+bank when pc is in the switchable bank, in a histogram. While it runs
+it stands in for the cpu's run() and runs whatever run() was before,
+the interpreter or a BlockRunner, interval cycles at a time. Stopped,
+it is out of the way entirely, unless something has stood in for run()
+since; then it passes straight through until that stops.
+
+The histogram is an array('L') with a slot for every address, then
+one 16 KB stretch for each ROM bank past the first switchable one. So
+bank 1, and anything that isn't banked, keeps its plain address.
+"""
+from array import array
+
+from cartridge import BANK_SIZE
+
+
+ADDRESSES = 0x10000
+
+
+class PcSampler(object):
+    """
+    Samples gameboy's pc every interval cycles.
+    """
+    def __init__(self, gameboy, interval=1024):
+        self.cpu = gameboy.cpu
+        self.rom = gameboy.rom
+        self.interval = interval
+        banks = getattr(self.rom, "banks", 2)
+        self.histogram = array("L", [0]) * (ADDRESSES +
+                                             (banks - 2) * BANK_SIZE)
+        self.samples = 0
+        self._countdown = interval
+        self._previous = None
+        self._inner = None
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if not self.running:
+            # whatever stands in for run() already, say a BlockRunner
+            self._previous = vars(self.cpu).get("run")
+            self._inner = self.cpu.run
+            self.cpu.run = self._run
+            self.running = True
+
+    def stop(self):
+        if self.running:
+            # if something has wrapped run() since, it stays, and
+            # _run() passes straight through to what was there before
+            if vars(self.cpu).get("run") == self._run:
+                if self._previous is None:
+                    del self.cpu.run
+                else:
+                    self.cpu.run = self._previous
+            self.running = False
+
+    def _run(self, cycles):
+        run = self._inner
+        if not self.running:
+            return run(cycles)
+        ran = 0
+        while ran < cycles:
+            n = run(min(cycles - ran, self._countdown))
+            ran += n
+            self._countdown -= n
+            if self._countdown <= 0:
+                self._sample(self.cpu.pc)
+                self._countdown = max(self._countdown + self.interval, 1)
+        return ran
+
+    def _sample(self, pc):
+        bank = getattr(self.rom, "bank", 1)
+        if BANK_SIZE <= pc < 2 * BANK_SIZE and bank > 1:
+            pc = ADDRESSES + (bank - 2) * BANK_SIZE + pc - BANK_SIZE
+        self.histogram[pc] += 1
+        self.samples += 1
+
+    @staticmethod
+    def location(index):
+        """
+        The (bank, address) a histogram slot stands for. bank is 0 for
+        addresses outside the switchable bank.
+        """
+        if index >= ADDRESSES:
+            offset = index - ADDRESSES
+            return 2 + offset // BANK_SIZE, BANK_SIZE + offset % BANK_SIZE
+        if BANK_SIZE <= index < 2 * BANK_SIZE:
+            return 1, index
+        return 0, index
+
+    def top(self, n=20):
+        """
+        The n hottest (bank, address, samples), hottest first.
+        """
+        hot = sorted((count, index) for index, count
+                     in enumerate(self.histogram) if count)
+        return [self.location(index) + (count,)
+                for count, index in reversed(hot[-n:])]
+
+    def top_ranges(self, n=20, size=0x100):
+        """
+        The n hottest size byte ranges as (bank, start, samples).
+        """
+        ranges = {}
+        for index, count in enumerate(self.histogram):
+            if count:
+                start = index - index % size
+                ranges[start] = ranges.get(start, 0) + count
+        hot = sorted(ranges.items(), key=lambda item: -item[1])[:n]
+        return [self.location(start) + (count,) for start, count in hot]
+
+    def export(self, path, disassembly=None):
+        """
+        Write every address sampled as a line of bank, address and
+        samples, tab separated. Given the ROM's Disassembly, each line
+        also has the instruction there, where one was decoded.
+        """
+        with open(path, "w") as f:
+            for index, count in enumerate(self.histogram):
+                if count:
+                    bank, addr = self.location(index)
+                    line = "%d\t0x%04X\t%d" % (bank, addr, count)
+                    if disassembly is not None:
+                        instruction = disassembly.instruction(bank, addr)
+                        if instruction is not None:
+                            line += "\t" + instruction.text
+                    f.write(line + "\n")
@@ -0,0 +1,24 @@
+"""
+Closing multiprocessing.shared_memory blocks that may still be viewed.
+
+SharedMemory.close() raises BufferError while any memoryview or NumPy
+array of its buffer is alive, which is the normal state of affairs for
+buffers handed out to callers. release() unlinks first, so the name
+never leaks, and leaves the mapping to go away with the last view.
+"""
+
+
+def release(shm, unlink=False):
+    """
+    Close shm, unlinking it first if unlink. Views of it that are
+    still held stay valid, and the memory is unmapped when the last
+    of them goes.
+    """
+    if unlink:
+        shm.unlink()
+    try:
+        shm.close()
+    except BufferError:
+        # the views hold the mmap open; forget it so close() isn't
+        # tried again when shm is collected
+        shm._mmap = None
@@ -0,0 +1,163 @@
+from unittest import TestCase
+
+import numpy as np
+
+from apu import APU, CLOCK_HZ, SEQUENCER_CYCLES, LFSR7, LFSR15
+from apu import NR10, NR11, NR12, NR13, NR14, NR21, NR22, NR23, NR24
+from apu import NR30, NR32, NR33, NR34, NR42, NR43, NR44, NR51, NR52, WAVE
+
+
+class APUTests(TestCase):
+    def setUp(self):
+        self.apu = APU(muted=True)
+
+    def trigger_square(self, length=0, envelope=0xF0, frequency=0x700,
+                       length_enable=False):
+        self.apu[NR21] = 0x80 | length
+        self.apu[NR22] = envelope
+        self.apu[NR23] = frequency & 0xFF
+        self.apu[NR24] = (0x80 | frequency >> 8 |
+                          (0x40 if length_enable else 0))
+
+    def test_status(self):
+        self.assertEqual(self.apu[NR52], 0xF0)
+        self.trigger_square()
+        self.assertEqual(self.apu[NR52], 0xF2)
+
+    def test_read_masks(self):
+        self.apu[NR11] = 0x81
+        self.assertEqual(self.apu[NR11], 0xBF)
+        self.assertEqual(self.apu[NR13], 0xFF)
+
+    def test_length_counter(self):
+        self.trigger_square(length=60, length_enable=True)
+        # length is clocked every other sequencer step
+        self.apu.tick(6 * SEQUENCER_CYCLES)
+        self.assertEqual(self.apu[NR52] & 2, 2)
+        self.apu.tick(SEQUENCER_CYCLES)
+        self.assertEqual(self.apu[NR52] & 2, 0)
+
+    def test_dac_off_disables(self):
+        self.trigger_square()
+        self.apu[NR22] = 0x00
+        self.assertEqual(self.apu[NR52] & 2, 0)
+
+    def test_envelope(self):
+        self.trigger_square(envelope=0xF1)
+        self.apu.tick(8 * SEQUENCER_CYCLES * 3)
+        self.apu.read()
+        self.assertEqual(self.apu.channels[1].volume, 12)
+
+    def test_sweep_overflow(self):
+        self.apu[NR10] = 0x11
+        self.apu[NR12] = 0xF0
+        self.apu[NR13] = 0xFF
+        self.apu[NR14] = 0x87
+        self.assertEqual(self.apu[NR52] & 1, 0)
+
+    def test_sweep(self):
+        self.apu[NR10] = 0x12
+        self.apu[NR12] = 0xF0
+        self.apu[NR13] = 0x00
+        self.apu[NR14] = 0x84
+        self.apu.tick(4 * SEQUENCER_CYCLES)
+        self.assertEqual(self.apu[NR52] & 1, 1)
+        self.assertEqual(self.apu[NR13], 0xFF)
+        self.assertEqual(self.apu._frequency(self.apu.channels[0]), 0x500)
+
+    def test_power_off(self):
+        self.trigger_square()
+        self.apu[NR52] = 0
+        self.assertEqual(self.apu[NR52], 0x70)
+        self.apu[NR22] = 0xF0
+        self.assertEqual(self.apu[NR22], 0)
+        self.apu[NR52] = 0x80
+        self.assertEqual(self.apu[NR51], 0)
+
+    def test_muted_makes_no_samples(self):
+        self.trigger_square()
+        self.apu.tick(CLOCK_HZ // 60)
+        self.assertEqual(len(self.apu.read()), 0)
+
+
+class SynthesisTests(TestCase):
+    def setUp(self):
+        self.apu = APU(sample_rate=CLOCK_HZ // 64)
+
+    def test_silence(self):
+        self.apu.tick(64 * 100)
+        block = self.apu.read()
+        self.assertEqual(block.shape, (100, 2))
+        self.assertFalse(block.any())
+        self.assertEqual(len(self.apu.read()), 0)
+
+    def test_square(self):
+        # (2048 - 0x7C0) * 4 = 256 cycles, or 4 samples, per duty step
+        self.apu[NR21] = 0x80
+        self.apu[NR22] = 0xF0
+        self.apu[NR23] = 0xC0
+        self.apu[NR24] = 0x87
+        self.apu.tick(64 * 64)
+        block = self.apu.read()
+        self.assertEqual(len(block), 64)
+        high = block[:, 0] > 0
+        self.assertEqual(high.sum(), 32)
+        self.assertEqual(high[:32].tolist(), [True] * 4 + [False] * 16 +
+                         [True] * 12)
+        self.assertTrue((block[:, 0] == block[:, 1]).all())
+
+    def test_panning(self):
+        self.apu[NR51] = 0x20
+        self.apu[NR21] = 0xC0
+        self.apu[NR22] = 0xF0
+        self.apu[NR23] = 0xC0
+        self.apu[NR24] = 0x87
+        self.apu.tick(64 * 64)
+        block = self.apu.read()
+        self.assertTrue(block[:, 0].any())
+        self.assertFalse(block[:, 1].any())
+
+    def test_wave(self):
+        for i in range(16):
+            self.apu[WAVE + i] = 0xF0
+        self.apu[NR30] = 0x80
+        self.apu[NR32] = 0x20
+        # one wave sample every (2048 - 0x7E0) * 2 = 64 cycles
+        self.apu[NR33] = 0xE0
+        self.apu[NR34] = 0x87
+        self.apu.tick(64 * 8)
+        block = self.apu.read()
+        self.assertEqual((block[:, 0] > 0).tolist(), [True, False] * 4)
+
+    def test_noise(self):
+        self.apu[NR42] = 0xF0
+        self.apu[NR43] = 0x00
+        self.apu[NR44] = 0x80
+        # one LFSR step every 8 cycles, a sample every 8 steps
+        self.apu.tick(64 * 32)
+        block = self.apu.read()
+        expected = LFSR15[np.arange(32) * 8] > 0
+        self.assertEqual((block[:, 0] > 0).tolist(), expected.tolist())
+
+    def test_short_lfsr(self):
+        self.assertEqual(len(LFSR7), 127)
+        self.assertEqual(len(LFSR15), 32767)
+
+    def test_segments_at_register_writes(self):
+        self.apu[NR21] = 0x80
+        self.apu[NR22] = 0xF0
+        self.apu[NR24] = 0x80
+        self.apu.tick(64 * 10)
+        self.apu[NR22] = 0x00
+        self.apu.tick(64 * 10)
+        block = self.apu.read()
+        self.assertEqual(len(block), 20)
+        self.assertFalse(block[10:].any())
+
+    def test_overflow_drops(self):
+        apu = APU(sample_rate=CLOCK_HZ // 64, capacity=16)
+        apu.tick(64 * 10)
+        apu[NR51] = 0xFF
+        apu.tick(64 * 10)
+        self.assertEqual(len(apu.read()), 10)
+        self.assertEqual(apu.dropped, 10)
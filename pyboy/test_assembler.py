@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+from assembler import INSTRUCTIONS, LOGO, assemble, cartridge
+from fleet import spin_rom
+from z80 import Z80
+
+
+# a value for each placeholder, and what it encodes as
+FILL = {"d8": ("$12", b"\x12"), "a8": ("$FF80", b"\x80"),
+        "r8": ("4", b"\x04"), "d16": ("$1234", b"\x34\x12"),
+        "a16": ("$C000", b"\x00\xC0")}
+
+
+class AssemblerTests(TestCase):
+    def test_every_handler(self):
+        z = Z80(None)
+        self.assertEqual(sum(len(v) for v in INSTRUCTIONS.values()),
+                         len(z.op_map) - 1 + len(z.extra_ops_map))
+        for op, forms in INSTRUCTIONS.items():
+            for operands, encoding in forms:
+                text = []
+                tail = b""
+                for operand in operands:
+                    for placeholder, (value, code) in FILL.items():
+                        if operand.strip("()").replace("sp+", "") == \
+                                placeholder:
+                            operand = operand.replace(placeholder, value)
+                            tail += code
+                    text.append(operand)
+                if op == "jr":
+                    # jr takes the target: 4 past the next instruction
+                    text[-1] = "6"
+                elif op == "stop":
+                    tail = b"\x00"
+                line = "%s %s" % (op, ", ".join(text))
+                segments, _ = assemble(line)
+                self.assertEqual(segments, [(0, encoding + tail)], line)
+
+    def test_spin_rom(self):
+        segments, labels = assemble("""
+            ld a, $10           ; select buttons
+            ldh ($FF00), a
+            ld hl, $C000
+        loop:
+            inc (hl)
+            ldh a, ($00)
+            ld ($C001), a
+            jr loop
+        """, 0x100)
+        self.assertEqual(segments, [(0x100, spin_rom()[0x100:0x10F])])
+        self.assertEqual(labels, {"loop": 0x107})
+
+    def test_labels_and_data(self):
+        segments, labels = assemble("""
+            jp end
+        data: db 1, 2, -1
+            dw data + 1
+            org $20
+        end: jr data
+        """)
+        self.assertEqual(segments, [(0, b"\xC3\x20\x00\x01\x02\xFF\x04\x00"),
+                                    (0x20, b"\x18\xE1")])
+        self.assertEqual(labels, {"data": 3, "end": 0x20})
+
+    def test_errors(self):
+        self.assertRaises(ValueError, assemble, "ld a, (de+)")
+        self.assertRaises(ValueError, assemble, "jp nowhere")
+        self.assertRaises(ValueError, assemble, "ld a, 256")
+        self.assertRaises(ValueError, assemble, "jr far\norg $100\nfar:")
+        self.assertRaises(ValueError, assemble, "here:\nhere:")
+
+    def test_cartridge(self):
+        rom = cartridge("nop\nmain: jr main", "TEST", cartridge_type=0x01,
+                        banks=4)
+        self.assertEqual(len(rom), 0x10000)
+        self.assertEqual(rom[0x100:0x104], b"\x00\xC3\x51\x01")
+        self.assertEqual(rom[0x104:0x134], LOGO)
+        self.assertEqual(rom[0x134:0x144], b"TEST".ljust(16, b"\0"))
+        self.assertEqual(rom[0x147:0x14A], b"\x01\x01\x00")
+        self.assertEqual(rom[0x150:0x153], b"\x00\x18\xFE")
+        checksum = 0
+        for byte in rom[0x134:0x14D]:
+            checksum = (checksum - byte - 1) & 0xFF
+        self.assertEqual(rom[0x14D], checksum)
+        self.assertEqual(rom[0x14E] << 8 | rom[0x14F],
+                         (sum(rom) - rom[0x14E] - rom[0x14F]) & 0xFFFF)
+
+    def test_cartridge_header_clash(self):
+        self.assertRaises(ValueError, cartridge, "org $140\nnop")
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from benchmarks import WORKLOADS, compare, load, run, run_all, save
+from gameboy import GameBoy
+
+
+class WorkloadTests(TestCase):
+    def test_workloads_loop(self):
+        for name, (build, banked) in WORKLOADS.items():
+            gb = GameBoy(build(), headless=True, muted=True)
+            gb.run_frames(1)
+            self.assertTrue(0x150 <= gb.cpu.pc < 0x170, name)
+            self.assertEqual(gb.counters()["bank_switches"] > 0, banked)
+
+
+class RunnerTests(TestCase):
+    def test_run(self):
+        result = run("alu", "z80", frames=1)
+        self.assertGreaterEqual(result["cycles"], 70224)
+        self.assertGreater(result["instructions"], 0)
+        self.assertAlmostEqual(result["mhz"], result["cycles"] /
+                               result["seconds"] / 1e6)
+
+    def test_translated_matches_gameboy(self):
+        for workload in ("alu", "bank_switch"):
+            translated = run(workload, "translated", frames=1)
+            plain = run(workload, "gameboy", frames=1)
+            self.assertEqual(translated["cycles"], plain["cycles"])
+            self.assertEqual(translated["instructions"],
+                             plain["instructions"])
+
+    def test_lockstep_skips_banking(self):
+        report = run_all(["bank_switch", "memcpy"], ["lockstep"], frames=1,
+                         lanes=8)
+        self.assertEqual([r["workload"] for r in report["results"]],
+                         ["memcpy"])
+        self.assertRaises(ValueError, run, "bank_switch", "lockstep")
+
+    def test_save_and_compare(self):
+        report = {"results": [
+            {"workload": "alu", "engine": "z80", "mhz": 0.8},
+            {"workload": "memcpy", "engine": "z80", "mhz": 2.0},
+            {"workload": "recursion", "engine": "z80", "mhz": 1.0},
+        ]}
+        baseline = {"results": [
+            {"workload": "alu", "engine": "z80", "mhz": 1.0},
+            {"workload": "memcpy", "engine": "z80", "mhz": 2.1},
+        ]}
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "baseline.json")
+            save(baseline, path)
+            regressions = compare(report, load(path), tolerance=0.1)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0]["workload"], "alu")
+        self.assertAlmostEqual(regressions[0]["change"], -0.2)
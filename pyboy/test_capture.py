@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import threading
+import wave
+from unittest import TestCase
+
+import numpy as np
+
+from capture import CaptureWriter, BLOCK
+from fleet import spin_rom
+from framebuffer import WIDTH, HEIGHT
+from gameboy import GameBoy
+
+
+class HeldFile(object):
+    """
+    Wraps a file so writes wait until release is set.
+    """
+    def __init__(self, f):
+        self._f = f
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait()
+        return self._f.write(data)
+
+    def close(self):
+        self._f.close()
+
+
+class CaptureTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "run")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_frames_and_audio(self):
+        frame = np.zeros((HEIGHT, WIDTH), np.uint8)
+        audio = np.ones((10, 2), np.int16)
+        with CaptureWriter(self.path, sample_rate=8000) as writer:
+            for i in range(3):
+                frame[0, 0] = i
+                writer.push(frame, audio * i)
+        with open(self.path + ".raw", "rb") as f:
+            video = f.read()
+        self.assertEqual(len(video), 3 * WIDTH * HEIGHT)
+        self.assertEqual(video[WIDTH * HEIGHT * 2], 2)
+        w = wave.open(self.path + ".wav")
+        self.assertEqual(w.getnframes(), 30)
+        self.assertEqual(w.getframerate(), 8000)
+        samples = np.frombuffer(w.readframes(30), np.int16)
+        self.assertEqual(samples[-1], 2)
+        w.close()
+
+    def test_truncated_audio(self):
+        frame = np.zeros((HEIGHT, WIDTH), np.uint8)
+        with CaptureWriter(self.path, audio_slot=8) as writer:
+            writer.push(frame, np.ones((20, 2), np.int16))
+        self.assertEqual(writer.truncated, 12)
+        w = wave.open(self.path + ".wav")
+        self.assertEqual(w.getnframes(), 8)
+        w.close()
+
+    def test_record_keeps_a_full_apu_output(self):
+        gb = GameBoy(spin_rom())
+        # nearly all the output holds
+        gb.run_frames(10)
+        with CaptureWriter(self.path) as writer:
+            writer.record(gb)
+        self.assertEqual(writer.truncated, 0)
+        w = wave.open(self.path + ".wav")
+        self.assertGreater(w.getnframes(), 8000)
+        w.close()
+
+    def test_drop_when_full(self):
+        writer = CaptureWriter(self.path, slots=2)
+        held = writer._video = HeldFile(writer._video)
+        frame = np.zeros((HEIGHT, WIDTH), np.uint8)
+        results = [writer.push(frame) for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(writer.dropped, 2)
+        held.release.set()
+        writer.close()
+        self.assertEqual(os.path.getsize(self.path + ".raw"),
+                         2 * WIDTH * HEIGHT)
+
+    def test_block_when_full(self):
+        writer = CaptureWriter(self.path, slots=1, policy=BLOCK)
+        held = writer._video = HeldFile(writer._video)
+        frame = np.zeros((HEIGHT, WIDTH), np.uint8)
+        writer.push(frame)
+        pusher = threading.Thread(target=writer.push, args=(frame,))
+        pusher.start()
+        pusher.join(0.1)
+        self.assertTrue(pusher.is_alive())
+        held.release.set()
+        pusher.join()
+        writer.close()
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(os.path.getsize(self.path + ".raw"),
+                         2 * WIDTH * HEIGHT)
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, CaptureWriter, self.path,
+                          policy="wait")
+
+    def test_record(self):
+        gb = GameBoy(spin_rom())
+        with CaptureWriter(self.path) as writer:
+            for _ in range(2):
+                gb.run_frames(1)
+                writer.record(gb)
+        self.assertEqual(writer.frames, 2)
+        w = wave.open(self.path + ".wav")
+        self.assertGreater(w.getnframes(), 1500)
+        w.close()
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from cartridge import load_cartridge, Mbc1, CartridgeRam, BANK_SIZE
+from cartridge import CARTRIDGE_TYPE, RAM_SIZE
+from gameboy import GameBoy
+from memory import RomController, RamController
+
+
+def mbc1_rom(banks, ram=0):
+    rom = bytearray(banks * BANK_SIZE)
+    for bank in range(banks):
+        rom[bank * BANK_SIZE] = bank
+    rom[CARTRIDGE_TYPE] = 0x03 if ram else 0x01
+    rom[RAM_SIZE] = ram
+    return rom
+
+
+class CartridgeTests(TestCase):
+    def test_plain_rom(self):
+        rom, ram = load_cartridge(b"\x00" * 0x200)
+        self.assertIsInstance(rom, RomController)
+        self.assertEqual(len(rom), 0x8000)
+        self.assertIsInstance(ram, RamController)
+
+    def test_mbc1(self):
+        rom, ram = load_cartridge(mbc1_rom(8, ram=3))
+        self.assertIsInstance(rom, Mbc1)
+        self.assertIsInstance(ram, CartridgeRam)
+        self.assertEqual(rom.banks, 8)
+        self.assertEqual(rom[0x4000], 1)
+        rom[0x2000] = 5
+        self.assertEqual(rom.bank, 5)
+        self.assertEqual(rom[0x4000], 5)
+        self.assertEqual(rom[0x0000], 0)
+        rom[0x2000] = 0
+        self.assertEqual(rom[0x4000], 1)
+
+    def test_bank_wraps(self):
+        rom = Mbc1(mbc1_rom(4))
+        rom[0x2000] = 6
+        self.assertEqual(rom[0x4000], 2)
+
+    def test_ram(self):
+        rom = Mbc1(mbc1_rom(4, ram=3), 0x8000)
+        ram = rom.ram
+        ram[0] = 0x12
+        self.assertEqual(ram[0], 0xFF)
+        rom[0x0000] = 0x0A
+        ram[0] = 0x12
+        self.assertEqual(ram[0], 0x12)
+        rom[0x6000] = 1
+        rom[0x4000] = 2
+        self.assertEqual(ram[0], 0)
+        ram[0] = 0x34
+        rom[0x4000] = 0
+        self.assertEqual(ram[0], 0x12)
+
+    def test_gameboy_maps_mbc1(self):
+        gb = GameBoy(mbc1_rom(4, ram=2))
+        gb.mem.write_byte(3, 0x2000)
+        self.assertEqual(gb.mem.read_byte(0x4000), 3)
+        gb.mem.write_byte(0x0A, 0x0000)
+        gb.mem.write_byte(0x56, 0xA000)
+        self.assertEqual(gb.mem.read_byte(0xA000), 0x56)
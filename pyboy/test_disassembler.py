@@ -0,0 +1,110 @@
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+from assembler import cartridge
+from disassembler import Disassembly, decode, disassemble
+
+
+ROM = cartridge("""
+main:   ld sp, $DFF0
+        ld a, 16
+        call descend
+        ld hl, $C000
+        ldh ($FF80), a
+        jp nz, main
+        jp $FF80
+descend:
+        dec a
+        ret z
+        bit 7, (hl)
+        jr descend
+""", banks=4)
+
+
+class DecodeTests(TestCase):
+    def test_decode(self):
+        i = decode(ROM, 0, 0x150)
+        self.assertEqual((i.text, i.length, i.operands, i.cycles),
+                         ("ld sp, $DFF0", 3, (0xDFF0,), 12))
+        i = decode(ROM, 0, 0x155)
+        self.assertEqual((i.text, i.targets, i.ends_block, i.conditional),
+                         ("call $0163", (0x163,), True, False))
+        i = decode(ROM, 0, 0x15B)
+        self.assertEqual(i.text, "ldh ($FF80), a")
+        i = decode(ROM, 0, 0x15D)
+        self.assertEqual((i.conditional, i.cycles, i.branch_cycles),
+                         (True, 12, 16))
+        i = decode(ROM, 0, 0x165)
+        self.assertEqual((i.text, i.length, i.cycles), ("bit 7, (hl)", 2, 16))
+        i = decode(ROM, 0, 0x167)
+        self.assertEqual((i.text, i.targets), ("jr $0163", (0x163,)))
+
+    def test_decode_unknown(self):
+        self.assertIsNone(decode(b"\xD3", 0, 0))
+        self.assertIsNone(decode(b"\x3E", 0, 0))
+
+
+class DisassemblyTests(TestCase):
+    def setUp(self):
+        self.dis = Disassembly(ROM, [0x100])
+
+    def test_blocks(self):
+        self.assertEqual(sorted(self.dis.blocks), [
+            (0, 0x100), (0, 0x150), (0, 0x158), (0, 0x160), (0, 0x163),
+            (0, 0x165)])
+        block = self.dis.block(0, 0x150)
+        self.assertEqual(block.end, 0x158)
+        self.assertEqual([i.address for i in block.instructions],
+                         [0x150, 0x153, 0x155])
+        self.assertEqual(block.successors, ((0, 0x163), (0, 0x158)))
+        self.assertEqual(self.dis.block(0, 0x158).successors,
+                         ((0, 0x150), (0, 0x160)))
+        self.assertEqual(self.dis.block(0, 0x160).successors, ())
+        self.assertEqual(self.dis.block(0, 0x163).successors,
+                         ((0, 0x165),))
+        self.assertEqual(self.dis.block(0, 0x165).successors,
+                         ((0, 0x163),))
+        self.assertEqual(self.dis.external, set([0xFF80]))
+
+    def test_data_is_left_alone(self):
+        self.assertIsNone(self.dis.instruction(0, 0x104))
+        self.assertIsNone(self.dis.instruction(0, 0x169))
+
+    def test_banked_entry(self):
+        rom = bytearray(ROM)
+        rom[0xC000:0xC002] = b"\x18\xFE"
+        dis = Disassembly(rom, [(3, 0x4000)])
+        self.assertEqual(dis.block(3, 0x4000).instructions[0].text,
+                         "jr $4000")
+        self.assertIsNone(dis.block(1, 0x4000))
+        self.assertIsNone(dis.block(0, 0x150))
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_cache(self):
+        first = disassemble(ROM, cache=self.tmp)
+        files = os.listdir(self.tmp)
+        self.assertEqual(files, ["%s.dis" % first.sha1])
+        second = disassemble(ROM, cache=self.tmp)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.blocks, second.blocks)
+        # a different set of entries is decoded again
+        third = disassemble(ROM, [0x100], cache=self.tmp)
+        self.assertEqual(third.entries, ((0, 0x100),))
+
+    def test_stale_cache(self):
+        first = disassemble(ROM, cache=self.tmp)
+        path = os.path.join(self.tmp, "%s.dis" % first.sha1)
+        with open(path, "wb") as f:
+            pickle.dump((0, None), f)
+        self.assertEqual(disassemble(ROM, cache=self.tmp).blocks,
+                         first.blocks)
@@ -0,0 +1,88 @@
+from unittest import TestCase
+
+from dma import OAM_DMA_CYCLES, HDMA_BLOCK_CYCLES
+from gameboy import GameBoy
+from ppu import MODE_HBLANK, LINE_CYCLES
+
+
+class OamDmaTests(TestCase):
+    def setUp(self):
+        self.gb = GameBoy(b"")
+        self.gb.ppu.mode = MODE_HBLANK
+
+    def test_copy_from_wram(self):
+        self.gb.mem.view_block(0xC100, 0xA0)[:] = bytes(range(0xA0))
+        self.gb.mem.write_byte(0xC1, 0xFF46)
+        self.assertEqual(bytes(self.gb.ppu.oam), bytes(range(0xA0)))
+        self.assertEqual(self.gb.mem.read_byte(0xFF46), 0xC1)
+        self.assertTrue(self.gb.ppu.oam.sprite_index.stale)
+
+    def test_oam_locked_until_done(self):
+        self.gb.mem.write_byte(0x12, 0xC000)
+        self.gb.mem.write_byte(0xC0, 0xFF46)
+        self.assertEqual(self.gb.ppu.oam[0], 0xFF)
+        self.gb.ppu.oam[0] = 0x34
+        self.gb.ppu.tick(OAM_DMA_CYCLES)
+        self.gb.ppu.mode = MODE_HBLANK
+        self.assertEqual(self.gb.ppu.oam[0], 0x12)
+
+    def test_echo_source(self):
+        self.gb.mem.write_byte(0x56, 0xDD01)
+        self.gb.mem.write_byte(0xFD, 0xFF46)
+        self.assertEqual(bytearray.__getitem__(self.gb.ppu.oam, 1), 0x56)
+
+    def test_fallback_through_memory_map(self):
+        # 0xFF00 up is registers, not one buffer
+        self.gb.mem.write_byte(0x1F, 0xFFFF)
+        self.gb.mem.write_byte(0x11, 0xFF80)
+        self.gb.mem.write_byte(0xFF, 0xFF46)
+        oam = bytes(self.gb.ppu.oam)
+        self.assertEqual(oam[0x80], 0x11)
+        self.assertEqual(oam[0x0F], 0xE0)
+
+
+class HdmaTests(TestCase):
+    def setUp(self):
+        self.gb = GameBoy(b"", cgb=True)
+        self.gb.ppu.mode = MODE_HBLANK
+        self.gb.mem.view_block(0xC000, 0x40)[:] = bytes(range(0x40))
+        for addr, val in zip(range(0xFF51, 0xFF55), (0xC0, 0x00, 0x80, 0x10)):
+            self.gb.mem.write_byte(val, addr)
+
+    def test_general_purpose(self):
+        self.gb.mem.write_byte(0x01, 0xFF55)
+        vram = bytes(self.gb.ppu.vram)
+        self.assertEqual(vram[0x10:0x30], bytes(range(0x20)))
+        self.assertEqual(vram[0x30], 0)
+        self.assertEqual(self.gb.mem.read_byte(0xFF55), 0xFF)
+        self.assertEqual(self.gb.hdma.stall, 2 * HDMA_BLOCK_CYCLES)
+        self.assertTrue(self.gb.ppu.vram.tile_cache.stale)
+
+    def test_hblank(self):
+        self.gb.mem.write_byte(0x81, 0xFF55)
+        self.assertEqual(self.gb.mem.read_byte(0xFF55), 0x01)
+        self.gb.ppu.mode = MODE_HBLANK
+        self.gb.ppu.hdma.hblank()
+        self.assertEqual(self.gb.mem.read_byte(0xFF55), 0x00)
+        self.assertEqual(bytes(self.gb.ppu.vram)[0x20], 0)
+        self.gb.ppu.hdma.hblank()
+        self.assertEqual(self.gb.mem.read_byte(0xFF55), 0xFF)
+        self.assertEqual(bytes(self.gb.ppu.vram)[0x10:0x30],
+                         bytes(range(0x20)))
+
+    def test_hblank_driven_by_ppu(self):
+        self.gb.ppu.mode = 2
+        self.gb.mem.write_byte(0x83, 0xFF55)
+        self.gb.ppu.tick(2 * LINE_CYCLES)
+        self.assertEqual(self.gb.hdma.blocks, 2)
+
+    def test_cancel(self):
+        self.gb.mem.write_byte(0x83, 0xFF55)
+        self.gb.mem.write_byte(0x00, 0xFF55)
+        self.assertFalse(self.gb.hdma.active)
+        self.assertEqual(self.gb.mem.read_byte(0xFF55), 0x83)
+
+    def test_stall_taken_by_run_loop(self):
+        self.gb.mem.write_byte(0x01, 0xFF55)
+        self.gb.run_cycles(4)
+        self.assertEqual(self.gb.hdma.stall, 0)
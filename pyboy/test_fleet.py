@@ -0,0 +1,45 @@
+import os
+from unittest import TestCase
+from assembler import cartridge
+from fleet import Fleet, spin_rom
+from gameboy import GameBoy
+
+
+class FleetTests(TestCase):
+    def test_step(self):
+        actions = [0x00, 0x10, 0x20]
+        with Fleet(spin_rom(), 3, workers=2, observe=(0xC000, 4)) as fleet:
+            obs = fleet.step(actions, 1)
+            self.assertEqual(len(obs), 12)
+            for i, action in enumerate(actions):
+                gb = GameBoy(spin_rom())
+                gb.joypad.buttons = action
+                gb.run_frames(1)
+                self.assertEqual(bytes(fleet.observation(i)),
+                                 bytes(gb.mem.read_block(0xC000, 4)))
+
+    def test_close_with_observations_held(self):
+        fleet = Fleet(spin_rom(), 2, workers=1, observe=(0xC000, 2))
+        name = fleet._obs.name
+        obs = fleet.step([0, 0], 1)
+        fleet.close()
+        self.assertNotIn(name.lstrip("/"), os.listdir("/dev/shm"))
+        self.assertEqual(len(obs), 4)
+
+    def test_mbc1(self):
+        rom = cartridge("""
+main:   ld a, 3
+        ld ($2000), a
+        ld a, ($4000)
+        ld ($C000), a
+        halt
+        org $C000
+        db $5A
+""", cartridge_type=0x01, banks=4)
+        with Fleet(rom, 2, workers=1, observe=(0xC000, 1)) as fleet:
+            self.assertEqual(bytes(fleet.step([0, 0], 1)), b"\x5A\x5A")
+
+    def test_close_twice(self):
+        fleet = Fleet(spin_rom(), 1, workers=1)
+        fleet.close()
+        fleet.close()
@@ -0,0 +1,139 @@
+import os
+from multiprocessing import Pipe, Process
+from unittest import TestCase
+
+import numpy as np
+
+from framebuffer import FrameBuffer, FrameBufferReader, RGBA
+from framebuffer import WIDTH, HEIGHT, buffer_size
+from fleet import spin_rom
+from gameboy import GameBoy
+from ppu import LINE_CYCLES
+
+
+def _read(conn, name):
+    reader = FrameBufferReader(name, double=True, rgba=True)
+    sequence, shades, colors = reader.latest()
+    conn.send((sequence, int(shades[5, 7]), colors[5, 7].tolist()))
+    reader.close()
+    conn.close()
+
+
+class FrameBufferTests(TestCase):
+    def test_single(self):
+        screen = FrameBuffer()
+        self.assertEqual(screen.back.shape, (HEIGHT, WIDTH))
+        self.assertTrue(screen.back is screen.front or
+                        np.shares_memory(screen.back, screen.front))
+        screen.back[0, 0] = 2
+        screen.publish()
+        self.assertEqual(screen.front[0, 0], 2)
+        self.assertEqual(screen.sequence, 1)
+        self.assertIsNone(screen.front_rgba)
+
+    def test_double(self):
+        screen = FrameBuffer(double=True)
+        screen.back[0, 0] = 1
+        self.assertEqual(screen.front[0, 0], 0)
+        screen.publish()
+        self.assertEqual(screen.front[0, 0], 1)
+        screen.back[0, 0] = 3
+        self.assertEqual(screen.front[0, 0], 1)
+        screen.publish()
+        self.assertEqual(screen.front[0, 0], 3)
+        self.assertEqual(screen.sequence, 2)
+
+    def test_slow_reader(self):
+        screen = FrameBuffer(double=True, shared=True)
+        try:
+            reader = FrameBufferReader(screen.name, double=True)
+            screen.begin()[0, 0] = 1
+            screen.publish()
+            sequence, shades, colors = reader.latest()
+            self.assertEqual((sequence, shades[0, 0]), (1, 1))
+            screen.begin()[0, 0] = 2
+            screen.publish()
+            self.assertTrue(reader.intact(sequence))
+            self.assertEqual(shades[0, 0], 1)
+            screen.begin()[0, 0] = 3
+            self.assertTrue(reader.intact(sequence))
+            screen.publish()
+            screen.begin()[0, 0] = 4
+            self.assertFalse(reader.intact(sequence))
+            sequence, shades, colors = reader.latest()
+            self.assertEqual((sequence, shades[0, 0]), (3, 3))
+            self.assertTrue(reader.intact(sequence))
+            del shades, colors
+            reader.close()
+        finally:
+            screen.close()
+
+    def test_single_intact(self):
+        screen = FrameBuffer()
+        screen.begin()
+        self.assertFalse(screen.intact(0))
+        screen.publish()
+        self.assertTrue(screen.intact(1))
+        screen.begin()
+        self.assertFalse(screen.intact(1))
+
+    def test_rgba(self):
+        screen = FrameBuffer(rgba=True)
+        screen.back[1, 2] = 3
+        screen.publish()
+        self.assertEqual(screen.front_rgba.shape, (HEIGHT, WIDTH, 4))
+        self.assertEqual(screen.front_rgba[1, 2].tolist(), RGBA[3].tolist())
+        self.assertEqual(screen.front_rgba[0, 0].tolist(), RGBA[0].tolist())
+
+    def test_buffer_size(self):
+        self.assertEqual(buffer_size(), 40 + WIDTH * HEIGHT)
+        self.assertEqual(buffer_size(True, True), 40 + WIDTH * HEIGHT * 15)
+
+    def test_shared(self):
+        screen = FrameBuffer(double=True, rgba=True, shared=True)
+        try:
+            screen.back[5, 7] = 2
+            screen.publish()
+            parent, child = Pipe()
+            proc = Process(target=_read, args=(child, screen.name))
+            proc.start()
+            result = parent.recv()
+            proc.join()
+            self.assertEqual(result, (1, 2, RGBA[2].tolist()))
+        finally:
+            screen.close()
+
+    def test_close_with_ppu_attached(self):
+        screen = FrameBuffer(double=True, shared=True)
+        name = screen.name
+        gb = GameBoy(spin_rom(), screen=screen)
+        gb.run_frames(1)
+        reader = FrameBufferReader(name, double=True)
+        sequence, shades, colors = reader.latest()
+        screen.close()
+        reader.close()
+        self.assertNotIn(name.lstrip("/"), os.listdir("/dev/shm"))
+        self.assertEqual(shades.shape, (HEIGHT, WIDTH))
+
+    def test_gameboy_publishes_at_vblank(self):
+        screen = FrameBuffer(double=True)
+        gb = GameBoy(spin_rom(), screen=screen)
+        gb.run_cycles(144 * LINE_CYCLES - 100)
+        self.assertEqual(screen.sequence, 0)
+        gb.run_cycles(200)
+        self.assertEqual(screen.sequence, 1)
+        self.assertTrue(np.shares_memory(gb.ppu.framebuffer, screen.front))
+
+    def test_render_frame_mid_frame(self):
+        screen = FrameBuffer(double=True)
+        gb = GameBoy(spin_rom(), screen=screen)
+        gb.run_cycles(70 * LINE_CYCLES)
+        gb.ppu.render_frame()
+        self.assertEqual(screen.sequence, 1)
+        self.assertTrue(screen.intact(1))
+        self.assertFalse(np.shares_memory(gb.ppu._renderer.framebuffer,
+                                          screen.front))
+        front = screen.front.copy()
+        gb.run_cycles(60 * LINE_CYCLES)
+        self.assertTrue(np.array_equal(screen.front, front))
+        self.assertTrue(screen.intact(1))
@@ -0,0 +1,168 @@
+from unittest import TestCase
+
+import numpy as np
+
+from benchmarks.workloads import bank_switch, memcpy
+from gameboy import GameBoy, CYCLES_PER_FRAME
+from fleet import spin_rom
+from joypad import START
+from translator import BlockRunner
+from validator import state
+
+
+class GameBoyTests(TestCase):
+    def test_rom_is_padded(self):
+        gb = GameBoy(b"\x00" * 0x200)
+        self.assertEqual(len(gb.rom), 0x8000)
+        self.assertEqual(gb.mem.read_byte(0x7FFF), 0xFF)
+
+    def test_echo_ram(self):
+        gb = GameBoy(spin_rom())
+        gb.mem.write_byte(0x42, 0xC010)
+        self.assertEqual(gb.mem.read_byte(0xE010), 0x42)
+        gb.mem.write_word(0xBEEF, 0xFDFE)
+        self.assertEqual(gb.mem.read_word(0xDDFE), 0xBEEF)
+        self.assertEqual(gb.mem.read_block(0xF000, 2),
+                         gb.mem.read_block(0xD000, 2))
+
+    def test_run_frames(self):
+        gb = GameBoy(spin_rom())
+        gb.run_frames(1)
+        self.assertGreaterEqual(gb._overshoot, 0)
+        # setup plus 52 cycles per loop
+        loops = (CYCLES_PER_FRAME - 32) // 52
+        self.assertIn(gb.mem.read_byte(0xC000), (loops & 0xFF,
+                                                  (loops + 1) & 0xFF))
+
+    def test_joypad_in_memory(self):
+        gb = GameBoy(spin_rom())
+        gb.joypad.buttons = 0x10
+        gb.cpu.run(100)
+        self.assertEqual(gb.mem.read_byte(0xC001), 0xDE)
+
+    def test_vblank_interrupt(self):
+        rom = bytearray(0x8000)
+        rom[0x40:0x42] = bytes([0x34, 0xD9])  # inc (hl); reti
+        rom[0x100:0x10B] = bytes([
+            0x21, 0x00, 0xC0,  # ld hl, 0xC000
+            0x3E, 0x01,        # ld a, 1
+            0xE0, 0xFF,        # ldh (0xFFFF), a
+            0xFB,              # ei
+            0x76,              # halt
+            0x18, 0xFD,        # jr -3
+        ])
+        gb = GameBoy(rom, headless=True)
+        gb.run_frames(3)
+        self.assertEqual(gb.mem.read_byte(0xC000), 3)
+        self.assertEqual(gb.ppu.frames, 3)
+        self.assertTrue(gb.cpu.halted)
+
+    def test_counters(self):
+        gb = GameBoy(spin_rom(), headless=True)
+        gb.run_frames(2)
+        counters = gb.counters()
+        self.assertEqual(counters["frames"], 2)
+        self.assertGreaterEqual(counters["cycles"], 2 * CYCLES_PER_FRAME)
+        loops = 2 * CYCLES_PER_FRAME // 52
+        self.assertTrue(4 * loops <= counters["instructions"] <=
+                        4 * loops + 8)
+        self.assertEqual(counters["halted_cycles"], 0)
+        gb.reset_counters()
+        self.assertEqual(set(gb.counters().values()), set([0]))
+        gb.run_frames(1)
+        self.assertEqual(gb.counters()["frames"], 1)
+
+    def test_cache_counters(self):
+        gb = GameBoy(spin_rom())
+        gb.run_frames(2)
+        counters = gb.counters()
+        self.assertGreater(counters["tile_cache_hits"], 0)
+        self.assertEqual(counters["tile_cache_misses"], 0)
+        self.assertNotIn("blocks_run", counters)
+        gb.mem.write_byte(1, 0x8000)
+        gb.run_frames(1)
+        self.assertEqual(gb.counters()["tile_cache_misses"], 1)
+
+    def test_block_runner_counters(self):
+        gb = GameBoy(spin_rom(), headless=True)
+        gb.reset_counters()
+        with BlockRunner(gb) as runner:
+            gb.run_frames(1)
+        counters = gb.counters()
+        self.assertEqual(counters["blocks_run"], runner.blocks_run)
+        self.assertGreater(counters["blocks_run"], 0)
+        self.assertEqual(counters["interpreted"], runner.interpreted)
+        gb.reset_counters()
+        self.assertEqual(gb.counters()["blocks_run"], 0)
+
+    def test_halt_and_interrupt_counters(self):
+        rom = bytearray(0x8000)
+        rom[0x40] = 0xD9  # reti
+        rom[0x100:0x108] = bytes([
+            0x3E, 0x01,  # ld a, 1
+            0xE0, 0xFF,  # ldh (0xFFFF), a
+            0xFB,        # ei
+            0x76,        # halt
+            0x18, 0xFD,  # jr -3
+        ])
+        gb = GameBoy(rom, headless=True)
+        gb.run_frames(3)
+        counters = gb.counters()
+        self.assertEqual(counters["interrupts"], 3)
+        self.assertGreater(counters["halted_cycles"], 3 * 60000)
+
+
+class ForkTests(TestCase):
+    def assertSameState(self, gb, other):
+        self.assertEqual(state(gb), state(other))
+        self.assertEqual(gb.counters(), other.counters())
+        self.assertTrue(np.array_equal(gb.ppu.framebuffer,
+                                       other.ppu.framebuffer))
+
+    def test_fork_runs_on_alike(self):
+        for rom, cgb in ((memcpy(), False), (bank_switch(), True)):
+            gb = GameBoy(rom, cgb=cgb)
+            gb.run_cycles(3 * CYCLES_PER_FRAME + 1234)
+            child = gb.fork()
+            self.assertSameState(gb, child)
+            gb.run_frames(2)
+            child.run_frames(2)
+            self.assertSameState(gb, child)
+
+    def test_fork_is_independent(self):
+        gb = GameBoy(spin_rom())
+        gb.run_frames(1)
+        child = gb.fork()
+        child.joypad.buttons = START
+        child.mem.write_byte(0x99, 0xC100)
+        child.mem.write_byte(0x01, 0x8000)
+        child.run_frames(1)
+        self.assertEqual(gb.joypad.buttons, 0)
+        self.assertEqual(gb.mem.read_byte(0xC100), 0)
+        self.assertEqual(gb.mem.peek_block(0x8000, 1), b"\x00")
+        self.assertEqual(gb.counters()["frames"], 1)
+        self.assertIsNot(child.ppu.screen, gb.ppu.screen)
+
+    def test_fork_shares_unwritten_pages(self):
+        gb = GameBoy(spin_rom())
+        gb.run_frames(1)
+        child = gb.fork()
+        child.run_frames(1)
+        wram = gb.mem._get_controller(0xD000).controller
+        child_wram = child.mem._get_controller(0xD000).controller
+        self.assertTrue(all(a is b for a, b in
+                            zip(wram._pages, child_wram._pages)))
+        written = gb.mem._get_controller(0xC000).controller
+        ours = child.mem._get_controller(0xC000).controller
+        self.assertIsNot(written._pages[0], ours._pages[0])
+        self.assertIs(written._pages[1], ours._pages[1])
+
+    def test_fork_leaves_tools(self):
+        gb = GameBoy(spin_rom())
+        runner = BlockRunner(gb)
+        runner.start()
+        child = gb.fork()
+        self.assertNotIn("run", vars(child.cpu))
+        self.assertIsNone(child.block_runner)
+        child.run_frames(1)
+        self.assertEqual(runner.blocks_run, 0)
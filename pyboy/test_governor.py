@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from fleet import spin_rom
+from gameboy import GameBoy
+from governor import Governor
+
+
+class FakeTime(object):
+    """
+    A clock that moves on by frame_time every time a frame is run.
+    """
+    def __init__(self, gameboy, frame_time):
+        self.now = 0.0
+        self.slept = 0.0
+        self.frame_time = frame_time
+        run_frames = gameboy.run_frames
+
+        def timed_run_frames(frames=1):
+            run_frames(frames)
+            self.now += frame_time * frames
+        gameboy.run_frames = timed_run_frames
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+class GovernorTests(TestCase):
+    def governor(self, frame_time, hz=50, **kwargs):
+        self.gb = GameBoy(spin_rom())
+        self.time = FakeTime(self.gb, frame_time)
+        return Governor(self.gb, hz=hz, clock=self.time.clock,
+                        sleep=self.time.sleep, **kwargs)
+
+    def test_sleeps_off_slack(self):
+        governor = self.governor(0.005)
+        governor.run(10)
+        self.assertAlmostEqual(self.time.now, 0.2)
+        self.assertAlmostEqual(self.time.slept, 0.15)
+        self.assertEqual(governor.stats["rendered"], 10)
+        self.assertEqual(governor.stats["skipped"], 0)
+        self.assertAlmostEqual(governor.stats["average_slack"], 0.015)
+        self.assertEqual(self.gb.ppu.screen.sequence, 10)
+
+    def test_skips_rendering_when_behind(self):
+        # frames take twice as long as they should
+        governor = self.governor(2 / 64.0, hz=64, max_skip=2)
+        governor.run(9)
+        stats = governor.stats
+        self.assertEqual(stats["frames"], 9)
+        self.assertEqual(stats["rendered"], 5)
+        self.assertEqual(stats["skipped"], 4)
+        self.assertEqual(self.gb.ppu.screen.sequence, 5)
+        self.assertLess(stats["average_slack"], 0)
+        self.assertEqual(self.time.slept, 0)
+
+    def test_turbo(self):
+        governor = self.governor(0.05, turbo=True)
+        governor.run(5)
+        self.assertEqual(governor.stats["skipped"], 0)
+        self.assertEqual(governor.stats["rendered"], 5)
+        self.assertEqual(self.time.slept, 0)
+        self.assertAlmostEqual(self.time.now, 0.25)
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from fleet import spin_rom
+from gameboy import GameBoy
+from heatmap import MemoryHeatmap
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        self.gb = GameBoy(spin_rom(), headless=True)
+        self.heatmap = MemoryHeatmap(self.gb.mem)
+
+    def test_counts(self):
+        mem = self.gb.mem
+        with self.heatmap:
+            mem.write_byte(1, 0xC000)
+            mem.read_byte(0xC000)
+            mem.write_word(0x1234, 0xC0FF)
+            mem.read_word(0xFF80)
+        self.assertEqual(self.heatmap.writes[0xC000], 1)
+        self.assertEqual(self.heatmap.reads[0xC000], 1)
+        self.assertEqual(self.heatmap.writes[0xC100], 1)
+        self.assertEqual(self.heatmap.reads[0xFF81], 1)
+        reads, writes = self.heatmap.pages()
+        self.assertEqual(writes[0xC0], 2)
+        self.assertEqual(writes[0xC1], 1)
+        self.assertEqual(self.heatmap.heatmap().shape, (2, 256, 256))
+
+    def test_stop_restores_plain_methods(self):
+        self.heatmap.start()
+        self.heatmap.stop()
+        self.assertNotIn("read_byte", vars(self.gb.mem))
+        self.gb.mem.read_byte(0)
+        self.assertEqual(sum(self.heatmap.reads), 0)
+
+    def test_cpu_through_heatmap(self):
+        with self.heatmap:
+            self.gb.run_frames(1)
+        by_controller = dict((start, (reads, writes)) for
+                             _, start, reads, writes
+                             in self.heatmap.controllers())
+        # the loop fetches from ROM, bumps 0xC000 and polls the joypad
+        self.assertGreater(by_controller[0x0000][0], 5000)
+        self.assertGreater(by_controller[0xC000][1], 1000)
+        self.assertGreater(by_controller[0xFF00][0], 1000)
+        self.assertEqual(by_controller[0xFF01], (0, 0))
@@ -0,0 +1,44 @@
+from unittest import TestCase
+import interrupts
+from interrupts import InterruptRegister, service
+from test_z80 import MockMem
+from z80 import Z80
+
+
+class InterruptTests(TestCase):
+    def setUp(self):
+        self.flags = InterruptRegister()
+        self.enable = InterruptRegister()
+        self.cpu = Z80(MockMem())
+        self.cpu.pc = 0x150
+        self.cpu.sp = 0x100
+
+    def test_register(self):
+        self.flags[0] = 0xFF
+        self.assertEqual(self.flags.value, 0x1F)
+        self.flags[0] = 0x01
+        self.assertEqual(self.flags[0], 0xE1)
+
+    def test_nothing_pending(self):
+        self.cpu.ime = True
+        self.flags.value = interrupts.VBLANK
+        self.assertEqual(service(self.cpu, self.flags, self.enable), 0)
+        self.assertEqual(self.cpu.pc, 0x150)
+
+    def test_priority(self):
+        self.cpu.ime = True
+        self.flags.value = interrupts.TIMER | interrupts.STAT
+        self.enable.value = 0x1F
+        self.assertEqual(service(self.cpu, self.flags, self.enable), 20)
+        self.assertEqual(self.cpu.pc, 0x48)
+        self.assertFalse(self.cpu.ime)
+        self.assertEqual(self.flags.value, interrupts.TIMER)
+        self.assertEqual(self.cpu._pop(), 0x150)
+
+    def test_wake_without_ime(self):
+        self.cpu.halted = True
+        self.flags.value = interrupts.JOYPAD
+        self.enable.value = interrupts.JOYPAD
+        self.assertEqual(service(self.cpu, self.flags, self.enable), 0)
+        self.assertFalse(self.cpu.halted)
+        self.assertEqual(self.cpu.pc, 0x150)
@@ -0,0 +1,22 @@
+from unittest import TestCase
+from joypad import Joypad
+from joypad import A, START, DOWN, LEFT
+
+
+class JoypadTests(TestCase):
+    def test_nothing_selected(self):
+        pad = Joypad()
+        pad.buttons = A | DOWN
+        self.assertEqual(pad[0], 0xFF)
+
+    def test_select_buttons(self):
+        pad = Joypad()
+        pad.buttons = A | START | LEFT
+        pad[0] = 0x10
+        self.assertEqual(pad[0], 0xD0 | 0x6)
+
+    def test_select_directions(self):
+        pad = Joypad()
+        pad.buttons = A | DOWN
+        pad[0] = 0x20
+        self.assertEqual(pad[0], 0xE0 | 0x7)
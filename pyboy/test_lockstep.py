@@ -0,0 +1,116 @@
+import random
+from unittest import TestCase
+
+import numpy as np
+
+from lockstep import LockstepZ80, _LaneMemory, A
+from lockstep import add_8bit, sub_8bit, rotate_left, swap
+import z80
+from z80 import Z80
+
+
+def scalar_copy(engine, lane):
+    """
+    A scalar Z80 with the same state as one lane of engine.
+    """
+    z = Z80(_LaneMemory(engine.mem[lane].copy()))
+    for r, name in enumerate("bcdehl a"):
+        if name != " ":
+            setattr(z, name, int(engine.regs[r, lane]))
+    z.f = int(engine.f[lane])
+    z.sp = int(engine.sp[lane])
+    z.pc = int(engine.pc[lane])
+    return z
+
+
+class VectorALUTests(TestCase):
+    def test_matches_scalar(self):
+        values = np.arange(256, dtype=np.int64)
+        for b in (0, 1, 0xF, 0x10, 0x80, 0xFF):
+            for c in (0, 1):
+                for vec, ref in ((add_8bit, z80.add_8bit),
+                                 (sub_8bit, z80.sub_8bit)):
+                    res = vec(values, b, c)
+                    for a in range(256):
+                        self.assertEqual(
+                            tuple(bool(x) if i else int(x)
+                                  for i, x in enumerate(r[a] for r in res)),
+                            tuple(ref(a, b, c)), (ref, a, b, c))
+        for vec, ref in ((rotate_left, z80.rotate_left),
+                         (swap, z80.swap)):
+            res = vec(values)
+            for a in range(256):
+                self.assertEqual(int(res.result[a]), ref(a).result)
+                self.assertEqual(bool(res.c_flag[a]), ref(a).c_flag)
+
+
+class LockstepTests(TestCase):
+    def test_every_opcode_matches_scalar(self):
+        rng = random.Random(1234)
+        fill = np.random.RandomState(1234)
+        lanes = 16
+        skip = (0x10, 0x76, 0xD3, 0xDB, 0xDD, 0xE3, 0xE4, 0xEB, 0xEC,
+                0xED, 0xF4, 0xFC, 0xFD)
+        for op in range(256):
+            if op in skip:
+                continue
+            engine = LockstepZ80(lanes)
+            for lane in range(lanes):
+                engine.mem[lane, 0x8000:] = fill.randint(0, 256, 0x8000)
+                engine.regs[:, lane] = [rng.randrange(256) for _ in range(8)]
+                engine.regs[4, lane] |= 0x80  # keep hl out of rom
+                engine.f[lane] = rng.randrange(256) & 0xF0
+                engine.sp[lane] = rng.randrange(0x8002, 0xFFFE)
+                engine.pc[lane] = rng.randrange(0x8000, 0xFF00)
+                engine.mem[lane, engine.pc[lane]] = op
+            refs = [scalar_copy(engine, lane) for lane in range(lanes)]
+            cycles = [z.dispatch() for z in refs]
+            engine.step()
+            for lane, z in enumerate(refs):
+                msg = "op 0x%02x lane %d" % (op, lane)
+                for r, name in enumerate("bcdehl a"):
+                    if name != " ":
+                        self.assertEqual(engine.regs[r, lane],
+                                         getattr(z, name), msg)
+                self.assertEqual(engine.f[lane], z.f, msg)
+                self.assertEqual(engine.sp[lane], z.sp, msg)
+                self.assertEqual(engine.pc[lane], z.pc, msg)
+                self.assertEqual(engine.cycles[lane], cycles[lane], msg)
+                self.assertTrue(np.array_equal(engine.mem[lane],
+                                               z._mem._row), msg)
+
+    def test_lanes_diverge(self):
+        rom = bytearray(0x8000)
+        rom[0x100:0x106] = bytes([
+            0xFE, 0x00,  # cp 0
+            0x28, 0x01,  # jr z, +1
+            0x3C,        # inc a
+            0x3C,        # inc a
+        ])
+        engine = LockstepZ80(2, rom)
+        engine.regs[A, 1] = 5
+        engine.run(3)
+        self.assertEqual(list(engine.a), [1, 6])
+        self.assertEqual(list(engine.pc), [0x106, 0x105])
+        self.assertEqual(engine.instructions, 6)
+
+    def test_halted_lanes_stop(self):
+        rom = bytearray(0x8000)
+        rom[0x100:0x107] = bytes([
+            0xFE, 0x00,  # cp 0
+            0x20, 0x01,  # jr nz, +1
+            0x76,        # halt
+            0x3C,        # inc a
+            0x3C,        # inc a
+        ])
+        engine = LockstepZ80(3, rom)
+        engine.regs[A, 1] = 5
+        engine.run(5)
+        self.assertEqual(list(engine.halted), [True, False, True])
+        self.assertEqual(list(engine.a), [0, 7, 0])
+        self.assertEqual(list(engine.pc), [0x105, 0x108, 0x105])
+        self.assertEqual(engine.instructions, 11)
+        engine.halted[1] = True
+        engine.run(1)
+        self.assertEqual(list(engine.pc), [0x105, 0x108, 0x105])
+        self.assertEqual(engine.instructions, 11)
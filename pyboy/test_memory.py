@@ -1,6 +1,8 @@
 from unittest import TestCase
+from interrupts import InterruptRegister
 from memory import RamController
 from memory import MemoryController
+from memory import RomController, SharedRomController
 
 
 class RamTests(TestCase):
@@ -13,6 +15,32 @@ class RamTests(TestCase):
         ram[0] = 0xFF
         self.assertEqual(ram[0], 0xFF)
 
+    def test_pages(self):
+        ram = RamController(0x180)
+        self.assertEqual([len(page) for page in ram._pages], [0x100, 0x80])
+        ram[0x17F] = 7
+        self.assertEqual(ram[0x17F], 7)
+        self.assertEqual(ram.block(0xFF, 0x180)[-1], 7)
+        self.assertEqual(len(ram.block(0xFF, 0x180)), 0x81)
+        self.assertIsNone(ram.view(0xFF, 0x101))
+        self.assertRaises(IndexError, ram.__getitem__, 0x180)
+
+    def test_copy(self):
+        ram = RamController(32)
+        ram[3] = 0x12
+        copy = ram.copy()
+        self.assertIsInstance(copy, RamController)
+        copy[3] = 0x34
+        self.assertEqual(ram[3], 0x12)
+
+
+class RomTests(TestCase):
+    def test_writes_ignored(self):
+        rom = RomController(b"\x01\x02")
+        rom[0] = 0xFF
+        self.assertEqual(rom[0], 0x01)
+        self.assertEqual(len(rom), 2)
+
 
 class MemoryControllerTests(TestCase):
     def test_register_controller(self):
@@ -51,3 +79,129 @@ class MemoryControllerTests(TestCase):
         mem.register_controller(ram, 0)
         mem.write_word(0xAA55, 0)
         self.assertEqual(mem.read_word(0), 0xAA55)
+
+    def test_fork_shares_until_write(self):
+        ram = RamController(0x300)
+        mem = MemoryController()
+        mem.register_controller(ram, 0)
+        mem.write_byte(0x5A, 0)
+        child = mem.fork()
+        fork = child._get_controller(0).controller
+        self.assertIsNot(fork, ram)
+        self.assertEqual(fork._pages, ram._pages)
+        self.assertTrue(all(a is b for a, b in zip(fork._pages, ram._pages)))
+        child.write_byte(0xA5, 0x101)
+        self.assertIsNot(fork._pages[1], ram._pages[1])
+        self.assertIs(fork._pages[0], ram._pages[0])
+        self.assertIs(fork._pages[2], ram._pages[2])
+        self.assertEqual(child.read_byte(0), 0x5A)
+        self.assertEqual(child.read_byte(0x101), 0xA5)
+        self.assertEqual(mem.read_byte(0x101), 0)
+
+    def test_fork_parent_write(self):
+        ram = RamController(0x200)
+        mem = MemoryController()
+        mem.register_controller(ram, 0)
+        child = mem.fork()
+        fork = child._get_controller(0).controller
+        mem.write_word(0xAA55, 0)
+        self.assertEqual(mem.read_word(0), 0xAA55)
+        self.assertEqual(child.read_word(0), 0)
+        self.assertIsNot(ram._pages[0], fork._pages[0])
+        self.assertIs(ram._pages[1], fork._pages[1])
+
+    def test_fork_of_fork(self):
+        ram = RamController(0x100)
+        first = ram.fork()
+        ram[0] = 1
+        second = ram.fork()
+        ram[0] = 2
+        self.assertEqual((ram[0], first[0], second[0]), (2, 0, 1))
+
+    def test_fork_shares_rom(self):
+        rom = RomController(bytes(32))
+        ram = RamController(32)
+        mem = MemoryController()
+        mem.register_controller(rom, 0)
+        mem.register_controller(ram, 32)
+        child = mem.fork()
+        child.write_byte(1, 0)
+        child.write_byte(1, 32)
+        self.assertIs(child._get_controller(0).controller, rom)
+        self.assertIsNot(child._get_controller(32).controller, ram)
+
+    def test_fork_copies_registers(self):
+        enable = InterruptRegister()
+        mem = MemoryController()
+        mem.register_controller(enable, 0)
+        child = mem.fork()
+        child.write_byte(0x1F, 0)
+        self.assertEqual(enable.value, 0)
+        self.assertEqual(child.read_byte(0), 0xFF)
+
+    def test_fork_mirror(self):
+        ram = RamController(4)
+        mem = MemoryController()
+        mem.register_controller(ram, 0)
+        mem.register_mirror(4, 0, 4)
+        child = mem.fork()
+        child.write_byte(7, 5)
+        self.assertEqual(child.read_byte(1), 7)
+        self.assertEqual(ram[1], 0)
+        mem.write_byte(9, 6)
+        self.assertEqual(mem.read_byte(2), 9)
+        self.assertEqual(child.read_byte(6), 0)
+
+    def test_fork_refuses_unforkable(self):
+        class Register(object):
+            def __len__(self):
+                return 1
+        mem = MemoryController()
+        mem.register_controller(Register(), 0)
+        self.assertRaises(TypeError, mem.fork)
+
+    def test_read_block(self):
+        ram1 = RamController(4)
+        ram2 = RamController(4)
+        rom = SharedRomController(b"\x07\x08")
+        mem = MemoryController()
+        mem.register_controller(ram1, 0)
+        mem.register_controller(ram2, 4)
+        mem.register_controller(rom, 8)
+        mem.write_word(0x0201, 2)
+        mem.write_word(0x0403, 4)
+        self.assertEqual(mem.read_block(2, 8),
+                         b"\x01\x02\x03\x04\x00\x00\x07\x08")
+
+    def test_peek_block(self):
+        class Locked(RamController):
+            def __getitem__(self, addr):
+                return 0xFF
+        locked = Locked(4)
+        locked[1] = 6
+        mem = MemoryController()
+        mem.register_controller(locked, 0)
+        mem.register_controller(SharedRomController(b"\x07\x08"), 4)
+        self.assertEqual(mem.peek_block(1, 5), b"\x06\x00\x00\x07\x08")
+        self.assertEqual(mem.read_byte(1), 0xFF)
+
+    def test_view_block(self):
+        ram1 = RamController(4)
+        ram2 = RamController(4)
+        mem = MemoryController()
+        mem.register_controller(ram1, 0)
+        mem.register_controller(ram2, 4)
+        mem.register_controller(SharedRomController(b"\x07\x08"), 8)
+        view = mem.view_block(5, 3)
+        view[0] = 9
+        self.assertEqual(ram2[1], 9)
+        self.assertIsNone(mem.view_block(2, 4))
+        self.assertIsNone(mem.view_block(8, 2))
+
+    def test_read_block_overlapping(self):
+        mem = MemoryController()
+        mem.register_controller(RomController(b"\x05"), 2)
+        mem.register_controller(RamController(4), 0)
+        self.assertEqual(mem.read_block(0, 4), b"\x00\x00\x05\x00")
+        self.assertIsNone(mem.view_block(0, 4))
+        self.assertIsNotNone(mem.view_block(0, 2))
@@ -0,0 +1,317 @@
+from unittest import TestCase
+
+import numpy as np
+
+import interrupts
+from interrupts import InterruptRegister
+from ppu import PPU, LCDC, STAT, LY, LYC, SCX, SCY, BGP, OBP0, OBP1, WY, WX
+from ppu import WINDOW_ON, WINDOW_MAP, OBJ_ON, OBJ_SIZE, decode_rows
+from ppu import MODE_HBLANK, MODE_VBLANK, MODE_OAM, MODE_TRANSFER
+from ppu import LINE_CYCLES, WIDTH, HEIGHT
+
+
+class PPUTests(TestCase):
+    def setUp(self):
+        self.flags = InterruptRegister()
+        self.ppu = PPU(self.flags)
+
+    def run_cycles(self, cycles):
+        while cycles > 0:
+            n = min(cycles, self.ppu.cycles_to_event)
+            self.ppu.tick(n)
+            cycles -= n
+
+    def test_modes(self):
+        self.assertEqual(self.ppu[STAT] & 3, MODE_OAM)
+        self.run_cycles(80)
+        self.assertEqual(self.ppu[STAT] & 3, MODE_TRANSFER)
+        self.run_cycles(172)
+        self.assertEqual(self.ppu[STAT] & 3, MODE_HBLANK)
+        self.run_cycles(204)
+        self.assertEqual(self.ppu[LY], 1)
+        self.assertEqual(self.ppu[STAT] & 3, MODE_OAM)
+
+    def test_vblank(self):
+        self.run_cycles(144 * LINE_CYCLES - 1)
+        self.assertEqual(self.flags.value, 0)
+        self.run_cycles(1)
+        self.assertEqual(self.ppu[LY], 144)
+        self.assertEqual(self.ppu.mode, MODE_VBLANK)
+        self.assertEqual(self.flags.value, interrupts.VBLANK)
+        self.assertEqual(self.ppu.frames, 1)
+        self.run_cycles(10 * LINE_CYCLES)
+        self.assertEqual(self.ppu[LY], 0)
+        self.assertEqual(self.ppu.mode, MODE_OAM)
+
+    def test_lyc_interrupt(self):
+        self.ppu[LYC] = 3
+        self.ppu[STAT] = 0x40
+        self.run_cycles(3 * LINE_CYCLES - 1)
+        self.assertEqual(self.flags.value, 0)
+        self.run_cycles(1)
+        self.assertEqual(self.flags.value, interrupts.STAT)
+        self.assertTrue(self.ppu[STAT] & 0x4)
+
+    def test_ly_read_only(self):
+        self.run_cycles(LINE_CYCLES)
+        self.ppu[LY] = 9
+        self.assertEqual(self.ppu[LY], 1)
+
+    def test_lcd_off(self):
+        self.run_cycles(LINE_CYCLES + 100)
+        self.ppu[LCDC] = 0x11
+        self.assertEqual(self.ppu[LY], 0)
+        self.run_cycles(5 * LINE_CYCLES)
+        self.assertEqual(self.ppu[LY], 0)
+        self.assertEqual(self.ppu.mode, MODE_HBLANK)
+
+    def test_vram_locked_while_drawing(self):
+        self.ppu.vram[0] = 0x12
+        self.run_cycles(80)
+        self.assertEqual(self.ppu.vram[0], 0xFF)
+        self.ppu.vram[0] = 0x34
+        self.assertEqual(self.ppu.oam[0], 0xFF)
+        self.run_cycles(172)
+        self.assertEqual(self.ppu.vram[0], 0x12)
+        self.ppu.oam[0] = 0x56
+        self.assertEqual(self.ppu.oam[0], 0x56)
+
+    def fill_tile(self):
+        # tile 1 is solid color 3, and the whole map points at it
+        self.ppu.mode = MODE_HBLANK
+        for i in range(16):
+            self.ppu.vram[16 + i] = 0xFF
+        for i in range(0x1800, 0x1C00):
+            self.ppu.vram[i] = 1
+        self.ppu.mode = MODE_OAM
+
+    def test_render(self):
+        self.fill_tile()
+        self.ppu[BGP] = 0xE4
+        self.run_cycles(LINE_CYCLES)
+        self.assertEqual(self.ppu.framebuffer[0].tolist(), [3] * WIDTH)
+        self.assertFalse(self.ppu.framebuffer[1].any())
+
+    def test_headless_draws_nothing(self):
+        self.ppu = PPU(self.flags, headless=True)
+        self.fill_tile()
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertFalse(self.ppu.framebuffer.any())
+        self.assertEqual(self.ppu.frames, 1)
+        self.assertEqual(self.flags.value & interrupts.VBLANK,
+                         interrupts.VBLANK)
+
+    def test_render_next_frame(self):
+        self.ppu = PPU(self.flags, headless=True)
+        self.fill_tile()
+        self.ppu.render_next_frame()
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertEqual(self.ppu.framebuffer[-1, -1], 0)
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertEqual(self.ppu.framebuffer[-1, -1], 3)
+        self.ppu.framebuffer[-1, -1] = 0
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertEqual(self.ppu.framebuffer[-1, -1], 0)
+
+    def test_render_frame(self):
+        self.ppu = PPU(self.flags, headless=True)
+        self.fill_tile()
+        self.ppu[SCX] = 4
+        self.ppu.render_frame()
+        self.assertEqual(self.ppu.framebuffer[-1, -1], 3)
+
+    def test_changed_lines(self):
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertTrue(self.ppu.frame_changed())
+        self.assertEqual(len(self.ppu.changed_lines()), HEIGHT)
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertFalse(self.ppu.frame_changed())
+        self.run_cycles(10 * LINE_CYCLES + 300)
+        self.ppu.vram[0] = 1
+        self.run_cycles(144 * LINE_CYCLES - 300)
+        # lines 0-10 were drawn before the write
+        self.assertEqual(self.ppu.changed_lines().tolist(),
+                         list(range(11, HEIGHT)))
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertEqual(self.ppu.changed_lines().tolist(), list(range(11)))
+
+    def test_status_writes_change_nothing(self):
+        self.run_cycles(154 * LINE_CYCLES)
+        self.ppu[STAT] = 0x40
+        self.ppu[LYC] = 5
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertFalse(self.ppu.frame_changed())
+        self.ppu[SCX] = 1
+        self.run_cycles(154 * LINE_CYCLES)
+        self.assertTrue(self.ppu.frame_changed())
+
+
+class RendererTests(TestCase):
+    def setUp(self):
+        self.ppu = PPU(InterruptRegister(), headless=True)
+        self.ppu.mode = MODE_HBLANK
+        self.ppu[BGP] = 0xE4
+        self.ppu[OBP0] = 0xE4
+        self.ppu[OBP1] = 0x1B
+
+    def tile(self, index, rows, base=0):
+        for y, (lo, hi) in enumerate(rows):
+            self.ppu.vram[base + index * 16 + y * 2] = lo
+            self.ppu.vram[base + index * 16 + y * 2 + 1] = hi
+
+    def line(self, ly):
+        self.ppu._renderer.start_frame()
+        for y in range(ly + 1):
+            self.ppu._renderer.render_line(y)
+        return self.ppu.framebuffer[ly].tolist()
+
+    def test_decode_rows(self):
+        colors = decode_rows(np.array([0x0F], np.uint8),
+                             np.array([0x33], np.uint8))
+        self.assertEqual(colors.tolist(), [[0, 0, 2, 2, 1, 1, 3, 3]])
+
+    def test_scroll(self):
+        self.tile(1, [(0x80, 0x00)] * 8)
+        self.ppu.vram[0x1800] = 1
+        self.assertEqual(self.line(0)[:2], [1, 0])
+        self.ppu[SCX] = 0xFF
+        self.assertEqual(self.line(0)[:3], [0, 1, 0])
+        self.ppu[SCY] = 8
+        self.assertEqual(self.line(0)[:3], [0, 0, 0])
+        self.ppu.vram[0x1820] = 1
+        self.assertEqual(self.line(0)[:3], [0, 1, 0])
+
+    def test_signed_tiles(self):
+        self.ppu[LCDC] = 0x81
+        self.tile(0xFF, [(0xFF, 0xFF)] * 8, base=0x1000 - 0xFF * 16 - 16)
+        self.ppu.vram[0x1800] = 0xFF
+        self.assertEqual(self.line(0)[:9], [3] * 8 + [0])
+
+    def test_window(self):
+        self.tile(1, [(0xFF, 0x00)] * 8)
+        self.ppu[LCDC] = 0x91 | WINDOW_ON | WINDOW_MAP
+        self.ppu[WY] = 2
+        self.ppu[WX] = 7 + 150
+        for i in range(0x1C00, 0x2000):
+            self.ppu.vram[i] = 1
+        self.assertEqual(self.line(1), [0] * WIDTH)
+        self.assertEqual(self.line(2), [0] * 150 + [1] * 10)
+
+    def sprite(self, i, y, x, tile, attrs=0):
+        self.ppu.oam[i * 4:i * 4 + 4] = bytes([y, x, tile, attrs])
+
+    def test_sprites(self):
+        self.ppu[LCDC] = 0x91 | OBJ_ON
+        self.tile(2, [(0xF0, 0x00)] * 8)
+        self.tile(3, [(0xFF, 0xFF)] * 8)
+        self.sprite(0, 16, 8, 2)
+        self.sprite(1, 16, 12, 3, 0x10)
+        self.sprite(2, 16, 30, 2, 0x20)
+        line = self.line(0)
+        self.assertEqual(line[:8], [1, 1, 1, 1, 0, 0, 0, 0])
+        self.assertEqual(line[8:12], [0] * 4)
+        self.assertEqual(line[22:30], [0, 0, 0, 0, 1, 1, 1, 1])
+
+    def test_sprite_priority(self):
+        self.ppu[LCDC] = 0x91 | OBJ_ON
+        self.tile(2, [(0xFF, 0x00)] * 8)
+        self.tile(3, [(0x00, 0xFF)] * 8)
+        # lower x wins, even behind the background
+        self.sprite(0, 16, 9, 2)
+        self.sprite(1, 16, 8, 3, 0x80)
+        self.tile(1, [(0x80, 0x00)] * 8)
+        self.ppu.vram[0x1800] = 1
+        line = self.line(0)
+        self.assertEqual(line[:9], [1, 2, 2, 2, 2, 2, 2, 2, 1])
+
+    def test_ten_sprites_per_line(self):
+        self.ppu[LCDC] = 0x91 | OBJ_ON
+        self.tile(2, [(0xFF, 0x00)] * 8)
+        for i in range(12):
+            self.sprite(i, 16, 8 + i * 8, 2)
+        line = self.line(0)
+        self.assertEqual(line[:80], [1] * 80)
+        self.assertEqual(line[80:], [0] * 80)
+
+    def test_tall_sprites(self):
+        self.ppu[LCDC] = 0x91 | OBJ_ON | OBJ_SIZE
+        self.tile(4, [(0xFF, 0x00)] * 8)
+        self.tile(5, [(0x00, 0xFF)] * 8)
+        self.sprite(0, 16, 8, 5)
+        self.assertEqual(self.line(0)[:8], [1] * 8)
+        self.assertEqual(self.line(8)[:8], [2] * 8)
+        self.sprite(0, 16, 8, 5, 0x40)
+        self.assertEqual(self.line(0)[:8], [2] * 8)
+
+
+class TileCacheTests(TestCase):
+    def setUp(self):
+        self.ppu = PPU(InterruptRegister(), headless=True)
+        self.ppu.mode = MODE_HBLANK
+        self.cache = self.ppu.vram.tile_cache
+
+    def test_write_marks_one_tile(self):
+        self.ppu.vram[0x25] = 0xFF
+        self.ppu.vram[0x1800] = 0xFF
+        self.cache.refresh()
+        self.assertEqual(self.cache.decoded, 1)
+        self.assertEqual(self.cache.tiles[2, 2].tolist(), [2] * 8)
+        self.cache.refresh()
+        self.assertEqual(self.cache.decoded, 1)
+
+    def test_slice_write(self):
+        self.ppu.vram[0x10:0x40] = bytes([0xFF] * 0x30)
+        self.cache.refresh()
+        self.assertEqual(self.cache.decoded, 3)
+        self.assertEqual(self.cache.tiles[1:4].min(), 3)
+
+    def test_locked_write_ignored(self):
+        self.ppu.mode = MODE_TRANSFER
+        self.ppu.vram[0] = 0xFF
+        self.assertFalse(self.cache.stale)
+
+    def test_frame_counters(self):
+        self.ppu.vram[0] = 1
+        self.ppu.vram[0x100] = 1
+        self.ppu.render_frame()
+        self.ppu.vram[0] = 2
+        self.ppu.render_frame()
+        self.assertEqual(self.cache.decoded_last_frame, 2)
+        self.assertEqual(self.cache.decoded_this_frame, 1)
+        self.assertEqual(self.cache.decoded, 3)
+
+
+class SpriteIndexTests(TestCase):
+    def setUp(self):
+        self.ppu = PPU(InterruptRegister(), headless=True)
+        self.ppu.mode = MODE_HBLANK
+        self.index = self.ppu.oam.sprite_index
+
+    def test_lines(self):
+        self.ppu.oam[0:8] = bytes([20, 50, 0, 0, 16, 30, 0, 0])
+        self.assertEqual(self.index.line(0, 8).tolist(), [1])
+        self.assertEqual(self.index.line(4, 8).tolist(), [1, 0])
+        self.assertEqual(self.index.line(10, 8).tolist(), [0])
+        self.assertEqual(self.index.line(10, 16).tolist(), [1, 0])
+        self.assertEqual(self.index.builds, 2)
+
+    def test_built_once_until_written(self):
+        for ly in range(HEIGHT):
+            self.index.line(ly, 8)
+        self.assertEqual(self.index.builds, 1)
+        self.ppu.oam[3] = 1
+        self.index.line(0, 8)
+        self.assertEqual(self.index.builds, 2)
+
+    def test_locked_write_ignored(self):
+        self.index.line(0, 8)
+        self.ppu.mode = MODE_OAM
+        self.ppu.oam[0] = 16
+        self.assertFalse(self.index.stale)
+
+    def test_load(self):
+        self.index.line(0, 8)
+        self.ppu.mode = MODE_TRANSFER
+        self.ppu.oam.load(bytes([16, 8, 0, 0] * 40))
+        self.assertEqual(self.index.line(0, 8).tolist(), list(range(10)))
+        self.assertEqual(self.index.builds, 2)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from gameboy import GameBoy
+from opcodes import mnemonic
+from profiler import HandlerTable
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        rom = bytearray(0x8000)
+        rom[0x100:0x108] = bytes([
+            0x06, 0x03,  # ld b, 3
+            0x05,        # dec b
+            0x20, 0xFD,  # jr nz, -3
+            0xCB, 0x7F,  # bit 7, a
+            0x76,        # halt
+        ])
+        self.gb = GameBoy(rom)
+        self.plain = self.gb.cpu.op_map
+
+    def test_counts(self):
+        profiler = self.gb.cpu.profile()
+        self.gb.cpu.run(1000)
+        profiler.stop()
+        self.assertEqual(profiler.counts[0x05], 3)
+        self.assertEqual(profiler.counts[0x20], 3)
+        self.assertEqual(profiler.cycles[0x20], 12 + 12 + 8)
+        self.assertEqual(profiler.extra_counts[0x7F], 1)
+        self.assertEqual(profiler.extra_cycles[0x7F], 8)
+        self.assertIs(self.gb.cpu.op_map, self.plain)
+
+    def test_stopped_under_tracer(self):
+        cpu = self.gb.cpu
+        profiler = cpu.profile()
+        tracer = cpu.trace()
+        profiler.stop()
+        cpu.run(1000)
+        self.assertEqual(sum(profiler.counts), 0)
+        self.assertEqual(tracer.count, 9)
+        tracer.stop()
+        self.assertIs(cpu.op_map, self.plain)
+        self.assertNotIsInstance(cpu.extra_ops_map, HandlerTable)
+
+    def test_tracer_stopped_first(self):
+        cpu = self.gb.cpu
+        tracer = cpu.trace()
+        profiler = cpu.profile()
+        tracer.stop()
+        cpu.run(1000)
+        self.assertEqual(tracer.count, 0)
+        self.assertEqual(profiler.counts[0x05], 3)
+        self.assertIn("dec b", profiler.report())
+        profiler.stop()
+        self.assertIs(cpu.op_map, self.plain)
+
+    def test_histogram(self):
+        with self.gb.cpu.profile() as profiler:
+            self.gb.cpu.run(1000)
+        self.assertEqual(profiler.histogram(), {4: 4, 8: 3, 12: 2})
+
+    def test_report(self):
+        with self.gb.cpu.profile() as profiler:
+            self.gb.cpu.run(1000)
+        lines = profiler.report().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith("0x20      jr nz, r8"))
+        self.assertIn("CB 0x7F   bit 7, a", profiler.report())
+        self.assertNotIn("prefix cb", profiler.report())
+        self.assertEqual(len(profiler.report(limit=2).splitlines()), 3)
+
+    def test_mnemonics(self):
+        self.assertEqual(mnemonic("ld_a_addr_hl_inc"), "ld a, (hl+)")
+        self.assertEqual(mnemonic("bit_7_d"), "bit 7, d")
+        self.assertEqual(mnemonic("ldh_a8_a"), "ldh (a8), a")
+        self.assertEqual(mnemonic("jp_a16"), "jp a16")
+        self.assertEqual(mnemonic("pop_AF"), "pop af")
+        self.assertEqual(mnemonic("nop"), "nop")
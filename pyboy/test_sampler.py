@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from cartridge import BANK_SIZE
+from disassembler import Disassembly
+from gameboy import GameBoy
+from sampler import PcSampler, ADDRESSES
+from test_cartridge import mbc1_rom
+
+
+class SamplerTests(TestCase):
+    def setUp(self):
+        rom = mbc1_rom(4)
+        rom[0x100:0x108] = bytes([
+            0x3E, 0x03,        # ld a, 3
+            0xEA, 0x00, 0x20,  # ld (0x2000), a
+            0xC3, 0x00, 0x40,  # jp 0x4000
+        ])
+        rom[3 * BANK_SIZE:3 * BANK_SIZE + 2] = bytes([0x18, 0xFE])  # jr -2
+        self.gb = GameBoy(rom, headless=True)
+        self.sampler = PcSampler(self.gb, interval=100)
+
+    def test_samples_banked_pc(self):
+        with self.sampler:
+            self.gb.run_frames(1)
+        self.assertEqual(len(self.sampler.histogram), ADDRESSES + 2 * 0x4000)
+        self.assertGreater(self.sampler.samples, 690)
+        self.assertEqual(self.sampler.top(1)[0][:2], (3, 0x4000))
+        self.assertEqual(self.sampler.top_ranges(1)[0][:2], (3, 0x4000))
+        self.assertEqual(self.sampler.top(1)[0][2], self.sampler.samples)
+
+    def test_stopped_runs_plain(self):
+        self.sampler.start()
+        self.sampler.stop()
+        self.assertNotIn("run", vars(self.gb.cpu))
+        self.gb.run_frames(1)
+        self.assertEqual(self.sampler.samples, 0)
+
+    def test_location(self):
+        self.assertEqual(PcSampler.location(0x0150), (0, 0x0150))
+        self.assertEqual(PcSampler.location(0x4150), (1, 0x4150))
+        self.assertEqual(PcSampler.location(ADDRESSES + 0x4150),
+                         (3, 0x4150))
+
+    def test_export(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "hot.tsv")
+            with self.sampler:
+                self.gb.run_frames(1)
+            self.sampler.export(path, Disassembly(self.gb.rom._rom,
+                                                  [(3, 0x4000)]))
+            with open(path) as f:
+                lines = f.read().splitlines()
+            self.assertIn("3\t0x4000\t", "\n".join(lines))
+            self.assertTrue(lines[-1].endswith("\tjr $4000"))
+        finally:
+            shutil.rmtree(tmp)
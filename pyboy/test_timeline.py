@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fleet import spin_rom
+from gameboy import GameBoy
+from timeline import Timeline
+from translator import BlockRunner
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.gb = GameBoy(spin_rom())
+        self.timeline = Timeline(self.gb)
+
+    def test_records_phases(self):
+        with self.timeline:
+            self.gb.run_frames(2)
+            self.gb.mem.write_byte(0xC0, 0xFF46)
+            with self.timeline.span("callback"):
+                pass
+        names = set(event[0] for event in self.timeline.events)
+        self.assertEqual(names, set(["cpu", "scanline", "publish frame",
+                                     "oam dma", "callback"]))
+        scanlines = [e for e in self.timeline.events if e[0] == "scanline"]
+        self.assertEqual(len(scanlines), 2 * 144)
+
+    def test_stop_restores(self):
+        self.timeline.start()
+        self.timeline.stop()
+        self.assertNotIn("run", vars(self.gb.cpu))
+        self.assertNotIn("load", vars(self.gb.ppu.oam))
+        self.gb.run_frames(1)
+        self.assertEqual(self.timeline.events, [])
+
+    def test_stop_under_block_runner(self):
+        self.timeline.start()
+        runner = BlockRunner(self.gb)
+        runner.start()
+        self.timeline.stop()
+        self.gb.run_frames(1)
+        self.assertGreater(runner.blocks_run, 0)
+        self.assertEqual(self.timeline.events, [])
+        runner.stop()
+        self.gb.run_frames(1)
+        self.assertEqual(self.timeline.events, [])
+
+    def test_write(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "trace.json")
+            with self.timeline:
+                self.gb.run_frames(1)
+            self.timeline.write(path)
+            with open(path) as f:
+                trace = json.load(f)
+            events = trace["traceEvents"]
+            self.assertEqual(len(events), len(self.timeline.events))
+            self.assertEqual(events[0]["ph"], "X")
+            self.assertGreaterEqual(events[0]["ts"], 0)
+            self.assertTrue(all(e["dur"] >= 0 for e in events))
+        finally:
+            shutil.rmtree(tmp)
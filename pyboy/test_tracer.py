@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from gameboy import GameBoy
+from tracer import load, RECORD
+
+
+class TracerTests(TestCase):
+    def setUp(self):
+        rom = bytearray(0x8000)
+        rom[0x100:0x109] = bytes([
+            0x21, 0x34, 0x12,  # ld hl, 0x1234
+            0x06, 0x03,        # ld b, 3
+            0x05,              # dec b
+            0x20, 0xFD,        # jr nz, -3
+            0x76,              # halt
+        ])
+        self.gb = GameBoy(rom)
+        self.plain = self.gb.cpu.op_map
+
+    def test_records(self):
+        with self.gb.cpu.trace() as tracer:
+            self.gb.cpu.run(1000)
+        self.assertIs(self.gb.cpu.op_map, self.plain)
+        records = tracer.records()
+        self.assertEqual(len(records), 9)
+        self.assertEqual(records["pc"].tolist(),
+                         [0x100, 0x103, 0x105, 0x106, 0x105, 0x106, 0x105,
+                          0x106, 0x108])
+        self.assertEqual(records["opcode"][0], 0x21)
+        self.assertEqual(records["hl"][1], 0x1234)
+        self.assertEqual(records["bc"][2] >> 8, 3)
+        self.assertEqual(records["sp"][0], 0xFFFE)
+        self.assertEqual(records["cycle"].tolist()[:3], [0, 12, 20])
+
+    def test_ring_keeps_the_last(self):
+        with self.gb.cpu.trace(size=4) as tracer:
+            self.gb.cpu.run(1000)
+        self.assertEqual(len(tracer.buffer), 4 * RECORD.size)
+        self.assertEqual(tracer.records()["pc"].tolist(),
+                         [0x106, 0x105, 0x106, 0x108])
+
+    def test_dump_and_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "trace")
+            with self.gb.cpu.trace(size=4) as tracer:
+                self.gb.cpu.run(1000)
+            tracer.dump(path)
+            self.assertEqual(os.path.getsize(path), 16 + 4 * RECORD.size)
+            records = load(path)
+            self.assertEqual(records["opcode"][-1], 0x76)
+            self.assertEqual((records["pc"] == 0x106).sum(), 2)
+            del records
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import translator
+from assembler import cartridge
+from benchmarks import WORKLOADS
+from gameboy import GameBoy
+from sampler import PcSampler
+from translator import BlockRunner, shared_translation, translate
+from z80 import STATE
+
+
+# bank 2 switches to bank 3 half way through a block
+BANKED = cartridge("""
+main:   ld a, 2
+        ld ($2000), a
+        jp $4000
+        org $8000
+        ld a, 3
+        ld ($2000), a
+        ld b, $22
+        halt
+        org $C005
+        ld b, $33
+        halt
+""", cartridge_type=0x01, banks=4)
+
+
+class TranslatorTests(TestCase):
+    def assertSameRun(self, rom, frames=3, entries=translator.ENTRIES):
+        plain = GameBoy(rom, headless=True, muted=True)
+        fast = GameBoy(rom, headless=True, muted=True)
+        runner = BlockRunner(fast, translate(rom, entries))
+        with runner:
+            fast.run_frames(frames)
+        plain.run_frames(frames)
+        for reg in STATE:
+            self.assertEqual(getattr(fast.cpu, reg), getattr(plain.cpu, reg),
+                             reg)
+        self.assertEqual(bytes(fast.mem.read_block(0xC000, 0x2000)),
+                         bytes(plain.mem.read_block(0xC000, 0x2000)))
+        counters = fast.counters()
+        self.assertEqual(counters.pop("blocks_run"), runner.blocks_run)
+        self.assertEqual(counters.pop("interpreted"), runner.interpreted)
+        self.assertEqual(counters, plain.counters())
+        return fast, runner
+
+    def test_workloads(self):
+        for name, (build, banked) in WORKLOADS.items():
+            gb, runner = self.assertSameRun(build())
+            self.assertGreater(runner.blocks_run, 0, name)
+            # only what's left of a run cut short by a slice
+            self.assertLess(runner.interpreted, gb.cpu.instructions // 4,
+                            name)
+
+    def test_stops_where_the_interpreter_does(self):
+        rom = WORKLOADS["alu"][0]()
+        plain = GameBoy(rom).cpu
+        fast = GameBoy(rom)
+        BlockRunner(fast).start()
+        for cycles in (1, 5, 13, 40, 7, 100, 3):
+            self.assertEqual(fast.cpu.run(cycles), plain.run(cycles))
+            self.assertEqual(fast.cpu.pc, plain.pc)
+            self.assertEqual(fast.cpu.instructions, plain.instructions)
+
+    def test_bank_switch_mid_block(self):
+        gb, runner = self.assertSameRun(BANKED, 1, translator.ENTRIES +
+                                        ((2, 0x4000), (3, 0x4005)))
+        self.assertEqual(gb.cpu.b, 0x33)
+        self.assertTrue(gb.cpu.halted)
+        self.assertIn(3 << 16 | 0x4005, runner.translation.blocks)
+
+    def test_swapped_tables_interpret(self):
+        gb = GameBoy(WORKLOADS["bit_ops"][0]())
+        runner = BlockRunner(gb)
+        runner.start()
+        with gb.cpu.profile() as profiler:
+            gb.run_frames(1)
+        self.assertEqual(runner.blocks_run, 0)
+        self.assertGreater(profiler.extra_counts[0x37], 0)
+        runner.stop()
+        self.assertNotIn("run", vars(gb.cpu))
+
+    def test_shared(self):
+        rom = WORKLOADS["recursion"][0]()
+        gameboys = [GameBoy(rom, headless=True, muted=True)
+                    for _ in range(3)]
+        runners = [BlockRunner(gb) for gb in gameboys]
+        self.assertIs(runners[0].translation, shared_translation(rom))
+        self.assertIs(runners[1].translation, runners[0].translation)
+        self.assertIs(runners[2].translation, runners[0].translation)
+        gameboys[0].cpu.b = 1
+        for gb, runner in zip(gameboys, runners):
+            with runner:
+                gb.run_frames(1)
+        self.assertNotEqual(gameboys[0].cpu.b, gameboys[1].cpu.b)
+        self.assertEqual(gameboys[1].mem.read_block(0xC000, 0x2000),
+                         gameboys[2].mem.read_block(0xC000, 0x2000))
+
+    def test_under_sampler(self):
+        gb = GameBoy(WORKLOADS["alu"][0](), headless=True, muted=True)
+        runner = BlockRunner(gb)
+        runner.start()
+        sampler = PcSampler(gb, 100)
+        sampler.start()
+        gb.run_frames(1)
+        self.assertGreater(runner.blocks_run, 0)
+        self.assertGreater(sampler.samples, 0)
+        sampler.stop()
+        runner.stop()
+        self.assertNotIn("run", vars(gb.cpu))
+
+    def test_stopped_out_of_order(self):
+        gb = GameBoy(WORKLOADS["alu"][0](), headless=True, muted=True)
+        runner = BlockRunner(gb)
+        runner.start()
+        sampler = PcSampler(gb, 100)
+        sampler.start()
+        runner.stop()
+        gb.run_frames(1)
+        self.assertEqual(runner.blocks_run, 0)
+        self.assertGreater(sampler.samples, 0)
+        sampler.stop()
+        gb.run_frames(1)
+        self.assertEqual(runner.blocks_run, 0)
+
+    def test_cb_write_ends_run(self):
+        rom = cartridge("""
+main:   ld hl, $2000
+        jp $4000
+        org $8000
+        ld a, 3
+        swap (hl)
+        ld b, 1
+        halt
+""", cartridge_type=0x01, banks=4)
+        translation = translate(rom, translator.ENTRIES + ((2, 0x4000),))
+        self.assertIn(2 << 16 | 0x4004, translation.blocks)
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.generate = translator.generate
+
+    def tearDown(self):
+        translator.generate = self.generate
+        shutil.rmtree(self.tmp)
+
+    def test_cache(self):
+        rom = WORKLOADS["memcpy"][0]()
+        first = translate(rom, cache=self.tmp)
+        name = "%s-%d.blocks" % (first.sha1, translator.VERSION)
+        self.assertIn(name, os.listdir(self.tmp))
+
+        def fail(disassembly):
+            raise AssertionError("translated again")
+        translator.generate = fail
+        second = translate(rom, cache=self.tmp)
+        self.assertEqual(sorted(second.blocks), sorted(first.blocks))
+        self.assertRaises(AssertionError, translate, rom, [0x100],
+                          self.tmp)
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from benchmarks import WORKLOADS
+from validator import ENGINES, describe, validate
+
+
+def broken_inc_b(after):
+    """
+    An engine whose inc b adds 2 from the after'th time on.
+    """
+    def attach(gameboy):
+        cpu = gameboy.cpu
+        inc_b = cpu.op_map[0x04]
+        calls = [0]
+
+        def wrong():
+            calls[0] += 1
+            if calls[0] > after:
+                cpu.b = (cpu.b + 1) & 0xFF
+            return inc_b()
+        cpu.op_map = dict(cpu.op_map)
+        cpu.op_map[0x04] = wrong
+    return attach
+
+
+class ValidatorTests(TestCase):
+    def test_engines_match_reference(self):
+        for workload, (build, banked) in WORKLOADS.items():
+            rom = build()
+            for name in ENGINES:
+                divergence = validate(rom, name, frames=2,
+                                      interval=17556)
+                self.assertIsNone(divergence, "%s on %s:\n%s" %
+                                  (workload, name, divergence and
+                                   describe(divergence)))
+
+    def test_finds_first_divergence(self):
+        rom = WORKLOADS["alu"][0]()
+        divergence = validate(rom, broken_inc_b(300), frames=1,
+                              interval=1000)
+        self.assertEqual(divergence.instruction, "inc b")
+        self.assertEqual(divergence.pc, 0x15F)
+        self.assertGreater(divergence.cycles, 1000)
+        self.assertIn("b", [d[0] for d in divergence.differences])
+        self.assertIn("inc b", describe(divergence))
+
+    def test_inputs(self):
+        rom = WORKLOADS["memcpy"][0]()
+        self.assertIsNone(validate(rom, "translated", frames=1,
+                                   interval=10000, inputs=[0x01, 0x30]))
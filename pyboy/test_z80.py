@@ -8,6 +8,7 @@ from z80 import signed_8bit
 from z80 import shift_left, shift_right_arithmetic, shift_right_logical
 from z80 import swap
 from z80 import bit, set_bit, reset_bit
+from memory import MemoryController, RamController
 
 
 class MockMem(dict):
@@ -44,6 +45,13 @@ class Z80Tests(TestCase):
         self.assertEqual(z.pc, 1)
         self.assertEqual(cycles, 4)
 
+    def test_handlers_shared(self):
+        one = Z80(MockMem())
+        two = Z80(MockMem())
+        self.assertIs(one.op_map[0x04].__func__, two.op_map[0x04].__func__)
+        self.assertIs(one.op_map[0x04].__self__, one)
+        self.assertIs(two.extra_ops_map[0x37].__self__, two)
+
     def test_set_flags(self):
         res1 = ALUResult(0, True, True, True, True)
         res2 = ALUResult(0, False, False, False, False)
@@ -127,6 +135,34 @@ class Z80Tests(TestCase):
         self.assertEqual(z.b, 0x10)
         self.assertEqual(z.pc, 2)
 
+    def test_fork(self):
+        ram = RamController(16)
+        ram[0] = 0x4  # inc b
+        mem = MemoryController()
+        mem.register_controller(ram, 0)
+        z = Z80(mem)
+        z.b = 7
+        z.sp = 0x10
+        child = z.fork()
+        self.assertEqual(child.b, 7)
+        child.dispatch()
+        child._push(0xAA55)
+        self.assertEqual(child.b, 8)
+        self.assertEqual(z.b, 7)
+        self.assertEqual(z.pc, 0)
+        self.assertEqual(mem.read_word(0xE), 0)
+
+    def test_fork_keeps_type(self):
+        class Cpu(Z80):
+            pass
+        mem = MemoryController()
+        mem.register_controller(RamController(16), 0)
+        cpu = Cpu(mem)
+        cpu.instructions = 5
+        child = cpu.fork()
+        self.assertIs(type(child), Cpu)
+        self.assertEqual(child.instructions, 5)
+
 
 class Add8BitTests(TestCase):
     def test_8bit_add(self):
@@ -415,3 +451,37 @@ class BitTests(TestCase):
         self.assertEqual(res.result, 0x5)
         res = set_bit(0x5, 3)
         self.assertEqual(res.result, 0xD)
+
+
+class InterruptInstructionTests(TestCase):
+    def test_ei_di(self):
+        m = MockMem()
+        m[0] = 0xFB
+        m[1] = 0xF3
+        z = Z80(m)
+        z.dispatch()
+        self.assertTrue(z.ime)
+        z.dispatch()
+        self.assertFalse(z.ime)
+
+    def test_halt(self):
+        m = MockMem()
+        m[0] = 0x76
+        z = Z80(m)
+        self.assertEqual(z.run(100), 100)
+        self.assertTrue(z.halted)
+        self.assertEqual(z.pc, 1)
+
+    def test_interrupt_and_reti(self):
+        m = MockMem()
+        m[0x40] = 0xD9
+        z = Z80(m)
+        z.pc = 0x150
+        z.sp = 0x100
+        z.halted = True
+        self.assertEqual(z.interrupt(0x40), 20)
+        self.assertFalse(z.halted)
+        self.assertEqual(z.pc, 0x40)
+        z.dispatch()
+        self.assertTrue(z.ime)
+        self.assertEqual(z.pc, 0x150)
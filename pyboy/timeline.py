@@ -0,0 +1,104 @@
+"""
+Record where a GameBoy's wall clock time goes, for chrome://tracing
+or Perfetto.
+
+A Timeline wraps the phases of emulation on the instances it watches:
+cpu run slices, scanline drawing, frame publishing, sound synthesis
+and DMA copies. Each call becomes a complete event, kept in a list
+until write() saves the lot as Chrome trace_event JSON. Host code can
+add its own spans with span(). Stopping puts back what each method was
+before, unless something, say a BlockRunner, has stood in for it
+since; then the timed method passes straight through until that stops.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Timeline(object):
+    """
+    Times gameboy's phases while started.
+    """
+    def __init__(self, gameboy, clock=time.perf_counter):
+        self.gameboy = gameboy
+        self.events = []
+        self._clock = clock
+        self._origin = clock()
+        self._wrapped = []
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        gb = self.gameboy
+        self._wrap(gb.cpu, "run", "cpu", "cpu")
+        self._wrap(gb.ppu._renderer, "render_line", "scanline", "ppu")
+        self._wrap(gb.ppu, "render_frame", "render frame", "ppu")
+        self._wrap(gb.ppu.screen, "publish", "publish frame", "ppu")
+        self._wrap(gb.apu, "_synthesize", "synthesize", "apu")
+        self._wrap(gb.ppu.oam, "load", "oam dma", "dma")
+        self._wrap(gb.ppu.vram, "load", "hdma", "dma")
+        self.running = True
+
+    def stop(self):
+        # set running first, so any timed method left under another
+        # wrapper passes straight through
+        self.running = False
+        for obj, name, previous, timed in reversed(self._wrapped):
+            if vars(obj).get(name) != timed:
+                continue
+            if previous is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, previous)
+        self._wrapped = []
+
+    def _wrap(self, obj, name, event, category):
+        method = getattr(obj, name)
+        events = self.events
+        clock = self._clock
+
+        def timed(*args):
+            if not self.running:
+                return method(*args)
+            start = clock()
+            result = method(*args)
+            events.append((event, category, start, clock() - start))
+            return result
+        self._wrapped.append((obj, name, vars(obj).get(name), timed))
+        setattr(obj, name, timed)
+
+    @contextmanager
+    def span(self, name, category="host"):
+        """
+        Time the body of a with statement as an event called name.
+        """
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.events.append((name, category, start,
+                                self._clock() - start))
+
+    def trace_events(self):
+        pid = os.getpid()
+        tid = threading.get_ident()
+        origin = self._origin
+        return [{"name": name, "cat": category, "ph": "X",
+                 "ts": (start - origin) * 1e6, "dur": duration * 1e6,
+                 "pid": pid, "tid": tid}
+                for name, category, start, duration in self.events]
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(),
+                       "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,113 @@
+"""
+Keep the last instructions a Z80 ran, for working out what went wrong.
+
+Like the profiler, tracing swaps the cpu's dispatch table for one that
+records each instruction before running it, and stopping takes it
+out again, in either order with the profiler. Records are packed
+straight into a preallocated ring buffer; nothing is built per
+instruction.
+
+A record is 21 bytes, big endian: cycle (8), pc (2), opcode, a, f,
+bc (2), de (2), hl (2) and sp (2), where cycle is the number of
+cycles traced before the instruction. dump() writes the ring oldest
+first after a 16 byte header, and load() maps such a file back as a
+NumPy record array.
+"""
+import struct
+from array import array
+
+import numpy as np
+
+from profiler import install, uninstall
+
+
+RECORD = struct.Struct(">QHBBBBBBBBBH")
+RECORD_DTYPE = np.dtype([("cycle", ">u8"), ("pc", ">u2"), ("opcode", "u1"),
+                         ("a", "u1"), ("f", "u1"), ("bc", ">u2"),
+                         ("de", ">u2"), ("hl", ">u2"), ("sp", ">u2")])
+
+MAGIC = b"GBTRACE1"
+# magic, then the number of records
+HEADER = struct.Struct(">8sQ")
+
+
+def load(path):
+    """
+    The records in a dumped trace, memory mapped.
+    """
+    with open(path, "rb") as f:
+        magic, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a trace file: %s" % path)
+    if not count:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, RECORD_DTYPE, "r", HEADER.size, (count,))
+
+
+class Tracer(object):
+    """
+    Records the last size instructions cpu runs.
+    """
+    def __init__(self, cpu, size=0x10000):
+        self.cpu = cpu
+        self.size = size
+        self.buffer = array("B", bytes(size * RECORD.size))
+        self.count = 0
+        self.cycle = 0
+        self._table = None
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        self._table = install(self.cpu, "op_map", self._traced)
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            uninstall(self.cpu, "op_map", self._table)
+            self._table = None
+            self.running = False
+
+    def _traced(self, code, below):
+        cpu = self.cpu
+        pack_into = RECORD.pack_into
+        buf = self.buffer
+        width = RECORD.size
+        end = len(buf)
+        tracer = self
+
+        def traced():
+            offset = tracer.count * width % end
+            pack_into(buf, offset, tracer.cycle, cpu.pc, code, cpu.a,
+                      cpu.f, cpu.b, cpu.c, cpu.d, cpu.e, cpu.h, cpu.l,
+                      cpu.sp)
+            tracer.count += 1
+            n = below[code]()
+            tracer.cycle += n
+            return n
+        return traced
+
+    def records(self):
+        """
+        The instructions recorded, oldest first, as a record array.
+        """
+        if self.count <= self.size:
+            data = self.buffer[:self.count * RECORD.size]
+        else:
+            split = self.count % self.size * RECORD.size
+            data = self.buffer[split:] + self.buffer[:split]
+        return np.frombuffer(data, RECORD_DTYPE).copy()
+
+    def dump(self, path):
+        records = self.records()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records)))
+            f.write(records.tobytes())
@@ -0,0 +1,344 @@
+"""
+Translate the code in a ROM to Python ahead of time.
+
+The disassembler finds the basic blocks reachable from the entry
+point and the vectors. Each becomes Python functions that run the
+block's instructions one after another, with no fetch or decode.
+Blocks are cut into runs of at most MAX_RUN instructions, each one
+function, so the generated code grows with the ROM and not faster.
+Most instructions are a call to the cpu's own
+handler. A few simple ones are written out inline with their operands
+folded in: nop, jp, jr and register loads. A function stops as soon
+as its cycle budget is spent, exactly where the interpreter would, and
+the interpreter carries on from there to the start of the next run.
+
+The functions are written as one module and compiled. The code object
+is marshalled into a cache directory under the ROM's SHA-1 and
+VERSION, and later runs load it straight back. The functions take the
+cpu and its two dispatch tables, so one translation serves any number
+of cpus running the same ROM: shared_translation() keeps one for each
+ROM in the process, and BlockRunners use it unless given another.
+
+A BlockRunner stands in for the cpu's run() while started, the way
+the sampler does. When the pc is at a translated instruction, it runs
+the rest of that block. Otherwise it interprets one instruction. If a
+profiler or tracer has swapped the dispatch tables, it hands the whole
+run to whatever run() was before it. Code in RAM, and code found only
+at run time, is always interpreted.
+"""
+import hashlib
+import importlib.util
+import marshal
+import os
+
+from cartridge import BANK_SIZE, ROM_SIZE
+from disassembler import ENTRIES, disassemble, rom_offset
+
+
+# bump whenever the generated code changes, to retire old caches
+VERSION = 3
+
+# the most instructions translated as one function
+MAX_RUN = 32
+
+REGISTERS = ("a", "b", "c", "d", "e", "h", "l")
+
+# the translations shared by every BlockRunner in the process, by ROM
+# SHA-1 and entries
+_shared = {}
+
+# writes that can land in ROM, and so switch banks
+INDIRECT_WRITES = ("(hl)", "(hl+)", "(hl-)", "(bc)", "(de)")
+
+# the instructions that write to an operand, and which one
+WRITES = {"ld": 0, "inc": 0, "dec": 0, "rlc": 0, "rrc": 0, "rl": 0,
+          "rr": 0, "sla": 0, "sra": 0, "srl": 0, "swap": 0, "res": -1,
+          "set": -1}
+
+
+def block_key(bank, address):
+    """
+    The key for a block in a Translation: bank is ignored below
+    0x4000.
+    """
+    if address < BANK_SIZE:
+        return address
+    return (bank or 1) << 16 | address
+
+
+def _may_switch_bank(instruction):
+    """
+    Whether instruction can write to the bank controller.
+    """
+    op, _, rest = instruction.text.partition(" ")
+    operands = rest.split(", ")
+    if op in WRITES:
+        target = operands[WRITES[op]]
+        if target in INDIRECT_WRITES:
+            return True
+        if target.startswith("($") and int(target[2:-1], 16) < ROM_SIZE:
+            return True
+    return False
+
+
+def _inline(instruction):
+    """
+    The Python for instruction if it can be written out, with the pc
+    it leaves, else None.
+    """
+    name = instruction.name
+    parts = name.split("_")
+    after = instruction.address + instruction.length
+    if name == "nop":
+        return [], after
+    if name in ("jp_a16", "jr_r8"):
+        return [], instruction.targets[0]
+    if len(parts) == 3 and parts[0] == "ld" and parts[1] in REGISTERS:
+        if parts[2] in REGISTERS:
+            if parts[1] == parts[2]:
+                return [], after
+            return ["cpu.%s = cpu.%s" % (parts[1], parts[2])], after
+        if parts[2] == "d8":
+            return ["cpu.%s = 0x%02X" % (parts[1], instruction.operands[0])], \
+                after
+    return None
+
+
+def _block_source(function, instructions, rom):
+    """
+    A function running instructions until budget cycles have passed,
+    as the interpreter would, returning the cycles it took.
+    """
+    lines = ["def %s(cpu, ops, xops, budget):" % function]
+    fixed = 0
+    # the pc the cpu should have by now, if it hasn't been set
+    pending = None
+    for i, instruction in enumerate(instructions):
+        if i:
+            lines.append("    if budget <= %d:" % fixed)
+            if pending is not None:
+                lines.append("        cpu.pc = 0x%04X" % pending)
+            lines.append("        cpu.instructions += %d" % i)
+            lines.append("        return %d" % fixed)
+        offset = rom_offset(instruction.bank, instruction.address)
+        inline = _inline(instruction)
+        if inline is not None:
+            code, pending = inline
+            lines.extend("    " + line for line in code)
+        elif rom[offset] == 0xCB:
+            # the 0xCB handlers leave the pc alone
+            lines.append("    xops[0x%02X]()" % rom[offset + 1])
+            pending = instruction.address + instruction.length
+        else:
+            if pending is not None:
+                lines.append("    cpu.pc = 0x%04X" % instruction.address)
+                pending = None
+            if i == len(instructions) - 1:
+                lines.append("    cpu.instructions += %d" % (i + 1))
+                lines.append("    return %d + ops[0x%02X]()" %
+                             (fixed, rom[offset]))
+                return lines
+            lines.append("    ops[0x%02X]()" % rom[offset])
+        fixed += instruction.cycles
+    if pending is not None:
+        lines.append("    cpu.pc = 0x%04X" % pending)
+    lines.append("    cpu.instructions += %d" % len(instructions))
+    lines.append("    return %d" % fixed)
+    return lines
+
+
+def _split(block):
+    """
+    The runs of block's instructions to translate as one. A run stops
+    where the code leaves the bank it started in, after a write that
+    could switch the bank it is running from, and after MAX_RUN
+    instructions.
+    """
+    runs = [[]]
+    for instruction in block.instructions:
+        if (instruction.address < BANK_SIZE) != (block.start < BANK_SIZE):
+            break
+        runs[-1].append(instruction)
+        if len(runs[-1]) == MAX_RUN or (block.start >= BANK_SIZE and
+                                        _may_switch_bank(instruction)):
+            runs.append([])
+    return [run for run in runs if run]
+
+
+def generate(disassembly):
+    """
+    The source of a module translating every block in disassembly.
+    BLOCKS in it maps the block_key() of the start of each run to the
+    function running it.
+    """
+    lines = ["# translated from ROM %s by translator.py version %d" %
+             (disassembly.sha1, VERSION)]
+    table = []
+    for key in sorted(disassembly.blocks):
+        for run in _split(disassembly.blocks[key]):
+            first = run[0]
+            function = "block_%X_%04X" % (first.bank, first.address)
+            lines.append("")
+            lines.append("")
+            lines.extend(_block_source(function, run, disassembly.rom))
+            table.append("    0x%X: %s," %
+                         (block_key(first.bank, first.address), function))
+    lines.append("")
+    lines.append("")
+    lines.append("BLOCKS = {")
+    lines.extend(table)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class Translation(object):
+    """
+    The translated blocks of the ROM with SHA-1 sha1, by block_key().
+    """
+    def __init__(self, sha1, code):
+        namespace = {}
+        exec(code, namespace)
+        self.sha1 = sha1
+        self.blocks = namespace["BLOCKS"]
+
+
+def translate(rom, entries=ENTRIES, cache=None):
+    """
+    The Translation of rom, a cartridge image. With a cache directory
+    the compiled module is kept there, and the disassembly with it.
+    """
+    rom = bytes(rom)
+    sha1 = hashlib.sha1(rom).hexdigest()
+    if cache is None:
+        return Translation(sha1, _compile(disassemble(rom, entries)))
+    name = "%s-%d" % (sha1, VERSION)
+    if tuple(entries) != ENTRIES:
+        name += "-" + hashlib.sha1(repr(entries).encode()).hexdigest()[:8]
+    path = os.path.join(cache, name + ".blocks")
+    magic = importlib.util.MAGIC_NUMBER
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data.startswith(magic):
+            return Translation(sha1, marshal.loads(data[len(magic):]))
+    except (IOError, OSError, EOFError, ValueError):
+        pass
+    code = _compile(disassemble(rom, entries, cache))
+    tmp = "%s.%d" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(magic + marshal.dumps(code))
+    os.replace(tmp, path)
+    return Translation(sha1, code)
+
+
+def shared_translation(rom, entries=ENTRIES, cache=None):
+    """
+    The Translation of rom that this process shares, made with
+    translate() the first time it is asked for.
+    """
+    rom = bytes(rom)
+    key = hashlib.sha1(rom).hexdigest(), tuple(entries)
+    if key not in _shared:
+        _shared[key] = translate(rom, entries, cache)
+    return _shared[key]
+
+
+def _compile(disassembly):
+    return compile(generate(disassembly),
+                   "<translated %s>" % disassembly.sha1, "exec")
+
+
+def rom_image(rom):
+    """
+    The bytes of a GameBoy's ROM controller.
+    """
+    for attr in ("_rom", "_buf"):
+        if hasattr(rom, attr):
+            return bytes(getattr(rom, attr))
+    return bytes(rom)
+
+
+class BlockRunner(object):
+    """
+    Runs gameboy's cpu from translation, or from the
+    shared_translation() of its ROM, kept in cache if given.
+    """
+    def __init__(self, gameboy, translation=None, cache=None):
+        self.gameboy = gameboy
+        self.cpu = gameboy.cpu
+        self.rom = gameboy.rom
+        if translation is None:
+            translation = shared_translation(rom_image(self.rom),
+                                             cache=cache)
+        self.translation = translation
+        self.blocks_run = 0
+        self.interpreted = 0
+        self._op_map = self.cpu.op_map
+        self._extra_ops_map = self.cpu.extra_ops_map
+        self._previous = None
+        self._inner = None
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if not self.running:
+            cpu = self.cpu
+            self._op_map = cpu.op_map
+            self._extra_ops_map = cpu.extra_ops_map
+            # whatever stands in for run() already, say a sampler
+            self._previous = vars(cpu).get("run")
+            self._inner = cpu.run
+            cpu.run = self._run
+            self.gameboy.block_runner = self
+            self.running = True
+
+    def stop(self):
+        if self.running:
+            # if something has wrapped run() since, it stays, and
+            # _run() passes straight through to what was there before
+            if vars(self.cpu).get("run") == self._run:
+                if self._previous is None:
+                    del self.cpu.run
+                else:
+                    self.cpu.run = self._previous
+            self.running = False
+
+    def _run(self, cycles):
+        cpu = self.cpu
+        ops = cpu.op_map
+        xops = cpu.extra_ops_map
+        if (not self.running or ops is not self._op_map or
+                xops is not self._extra_ops_map):
+            return self._inner(cycles)
+        blocks = self.translation.blocks
+        rom = self.rom
+        banked = hasattr(rom, "bank")
+        read_byte = cpu._mem.read_byte
+        ran = 0
+        run = 0
+        interpreted = 0
+        while ran < cycles and not cpu.halted:
+            pc = cpu.pc
+            # RAM addresses are never keys
+            if BANK_SIZE <= pc < ROM_SIZE:
+                pc |= (rom.bank if banked else 1) << 16
+            block = blocks.get(pc)
+            if block is not None:
+                ran += block(cpu, ops, xops, cycles - ran)
+                run += 1
+            else:
+                ran += ops[read_byte(cpu.pc)]()
+                interpreted += 1
+        cpu.instructions += interpreted
+        self.blocks_run += run
+        self.interpreted += interpreted
+        if ran < cycles:
+            cpu.halted_cycles += cycles - ran
+            return cycles
+        return ran
@@ -0,0 +1,176 @@
+"""
+Check an optimized engine against the plain Z80 interpreter.
+
+validate() runs two GameBoys on the same ROM and the same inputs: the
+reference as it is, the other with an engine attached. Every interval
+cycles it compares their registers, flags, ROM bank, cycle count and
+all 64 KB of memory. When they first disagree it replays both from
+the start to bisect that interval down to the cycle, and reports the
+instruction the reference was about to run there.
+
+An engine is a function that attaches an optimization to a GameBoy.
+ENGINES has one for each optimization in the tree that stands in for
+the interpreter; every one of them has to leave the machine running
+exactly as the interpreter would.
+"""
+from collections import namedtuple
+
+from disassembler import decode
+from gameboy import CYCLES_PER_FRAME, GameBoy
+from sampler import PcSampler
+from translator import BlockRunner
+from z80 import STATE
+
+
+ADDRESSES = 0x10000
+
+FLAGS = ("z_flag", "n_flag", "h_flag", "c_flag")
+
+Divergence = namedtuple("Divergence", [
+    "cycles",         # run by the reference before the instruction
+    "pc",             # of the instruction where the two first differ
+    "instruction",    # its assembly
+    "differences",    # (what, reference, engine) for each that differs
+])
+
+
+def translated(gameboy):
+    BlockRunner(gameboy).start()
+
+
+def profiled(gameboy):
+    gameboy.cpu.profile()
+
+
+def traced(gameboy):
+    gameboy.cpu.trace(0x100)
+
+
+def sampled(gameboy):
+    PcSampler(gameboy, 97).start()
+
+
+ENGINES = {
+    "translated": translated,
+    "profiled": profiled,
+    "traced": traced,
+    "sampled": sampled,
+}
+
+
+def state(gameboy):
+    """
+    Everything validate() compares, as a dict.
+    """
+    cpu = gameboy.cpu
+    found = dict((reg, getattr(cpu, reg)) for reg in STATE + FLAGS)
+    found["cycles"] = gameboy.cycles
+    found["bank"] = getattr(gameboy.rom, "bank", 1)
+    found["memory"] = bytes(gameboy.mem.peek_block(0, ADDRESSES))
+    return found
+
+
+def differences(reference, engine):
+    """
+    What differs between two state()s, as (what, reference, engine),
+    with memory by address.
+    """
+    found = [(name, reference[name], engine[name])
+             for name in sorted(reference)
+             if name != "memory" and reference[name] != engine[name]]
+    ours, theirs = reference["memory"], engine["memory"]
+    if ours != theirs:
+        found.extend(("$%04X" % addr, ours[addr], theirs[addr])
+                     for addr in range(ADDRESSES)
+                     if ours[addr] != theirs[addr])
+    return found
+
+
+class _Replay(object):
+    """
+    A reference and an engine GameBoy running rom from the start,
+    taking the next of inputs as the joypad's buttons at the start of
+    each interval.
+    """
+    def __init__(self, rom, engine, interval, inputs):
+        self.reference = GameBoy(rom, headless=True, muted=True)
+        self.engine = GameBoy(rom, headless=True, muted=True)
+        engine(self.engine)
+        self.interval = interval
+        self.inputs = inputs
+        self.intervals = 0
+
+    def run(self, cycles):
+        if self.intervals < len(self.inputs):
+            for gameboy in (self.reference, self.engine):
+                gameboy.joypad.buttons = self.inputs[self.intervals]
+        for gameboy in (self.reference, self.engine):
+            gameboy.run_cycles(cycles)
+
+    def run_interval(self):
+        self.run(self.interval)
+        self.intervals += 1
+
+    def differences(self):
+        return differences(state(self.reference), state(self.engine))
+
+
+def _bisect(rom, engine, interval, inputs, intervals):
+    """
+    The Divergence in the interval after intervals good ones, found
+    by replaying up to a cut further into it each time.
+    """
+    def replay(cycles):
+        machines = _Replay(rom, engine, interval, inputs)
+        for _ in range(intervals):
+            machines.run_interval()
+        if cycles:
+            machines.run(cycles)
+        return machines
+
+    good, bad = 0, interval
+    while bad - good > 1:
+        middle = (good + bad) // 2
+        if replay(middle).differences():
+            bad = middle
+        else:
+            good = middle
+    reference = replay(good).reference
+    found = replay(bad).differences()
+    memory = state(reference)["memory"]
+    # the snapshot is the address space as the cpu sees it, which
+    # decodes in place as bank 1
+    instruction = decode(memory, 1, reference.cpu.pc)
+    text = instruction.text if instruction else "db $%02X" % \
+        memory[reference.cpu.pc]
+    return Divergence(reference.cycles, reference.cpu.pc, text, found)
+
+
+def validate(rom, engine, frames=10, interval=CYCLES_PER_FRAME, inputs=()):
+    """
+    Run rom for frames frames under the reference and under engine,
+    a function or a name in ENGINES, comparing them every interval
+    cycles. inputs are the joypad's buttons for each interval in turn,
+    held once they run out. Returns the first Divergence, or None if
+    they agree throughout.
+    """
+    engine = ENGINES.get(engine, engine)
+    inputs = list(inputs)
+    machines = _Replay(rom, engine, interval, inputs)
+    for intervals in range(-(-frames * CYCLES_PER_FRAME // interval)):
+        machines.run_interval()
+        if machines.differences():
+            return _bisect(rom, engine, interval, inputs, intervals)
+    return None
+
+
+def describe(divergence):
+    """
+    A divergence as text, a line for each difference.
+    """
+    lines = ["diverged at cycle %d, running $%04X: %s" %
+             (divergence.cycles, divergence.pc, divergence.instruction)]
+    for what, reference, engine in divergence.differences:
+        lines.append("    %-8s reference %-6r engine %r" %
+                     (what, reference, engine))
+    return "\n".join(lines)
@@ -1,12 +1,21 @@
 from collections import namedtuple
 from functools import wraps
 
+from memory import forked
+from profiler import Profiler
+from tracer import Tracer
+
 
 Z_FLAG = 1 << 7
 N_FLAG = 1 << 6
 H_FLAG = 1 << 5
 C_FLAG = 1 << 4
 
+REGISTERS = ("a", "b", "c", "d", "e", "f", "h", "l", "sp", "pc")
+STATE = REGISTERS + ("ime", "halted")
+
+INTERRUPT_CYCLES = 20
+
 
 def op_code(code, cycles, branch_cycles=0):
     """
@@ -17,6 +26,8 @@ def op_code(code, cycles, branch_cycles=0):
     """
     def dec(fn):
         setattr(fn, "op_code", code)
+        setattr(fn, "cycles", cycles)
+        setattr(fn, "branch_cycles", branch_cycles)
         @wraps(fn)
         def wrapper(*args, **kwargs):
             branch = fn(*args, **kwargs)
@@ -35,6 +46,28 @@ def extra_op(code):
     return dec
 
 
+# the handler functions of each Z80 class, found once per process and
+# bound to every instance
+_handler_tables = {}
+
+
+def _handlers(cls):
+    """
+    The op_code and extra_op functions of cls, as two dicts by code.
+    """
+    if cls not in _handler_tables:
+        ops = {}
+        extra_ops = {}
+        for name in dir(cls):
+            fn = getattr(cls, name)
+            if hasattr(fn, "op_code"):
+                ops[fn.op_code] = fn
+            if hasattr(fn, "extra_op"):
+                extra_ops[fn.extra_op] = fn
+        _handler_tables[cls] = ops, extra_ops
+    return _handler_tables[cls]
+
+
 class Z80(object):
 
     def __init__(self, mem):
@@ -49,19 +82,83 @@ class Z80(object):
         self.l = 0
         self.sp = 0
         self.pc = 0
-        self.op_map = {}
-        self.extra_ops_map = {}
-        for attr in dir(self):
-            attr = getattr(self, attr)
-            if hasattr(attr, "op_code"):
-                self.op_map[attr.op_code] = attr
-            if hasattr(attr, "extra_op"):
-                self.extra_ops_map[attr.extra_op] = attr
+        self.ime = False
+        self.halted = False
+        # performance counters, only ever added to
+        self.instructions = 0
+        self.halted_cycles = 0
+        ops, extra_ops = _handlers(type(self))
+        self.op_map = dict((code, fn.__get__(self))
+                           for code, fn in ops.items())
+        self.extra_ops_map = dict((code, fn.__get__(self))
+                                  for code, fn in extra_ops.items())
 
     def dispatch(self):
         instruction = self._mem.read_byte(self.pc)
         return self.op_map[instruction]()
 
+    def run(self, cycles):
+        """
+        Execute instructions until at least cycles clock cycles have
+        passed. Returns the number of cycles actually consumed, which
+        can overshoot by part of the last instruction.
+        """
+        read_byte = self._mem.read_byte
+        op_map = self.op_map
+        ran = 0
+        count = 0
+        while ran < cycles and not self.halted:
+            ran += op_map[read_byte(self.pc)]()
+            count += 1
+        self.instructions += count
+        # A halted cpu just lets the clock run.
+        if ran < cycles:
+            self.halted_cycles += cycles - ran
+            return cycles
+        return ran
+
+    def interrupt(self, vector):
+        """
+        Service an interrupt: wake up, disable further interrupts and
+        call the vector. Returns the cycles it takes.
+        """
+        self.halted = False
+        self.ime = False
+        self._push(self.pc)
+        self.pc = vector
+        return INTERRUPT_CYCLES
+
+    def profile(self):
+        """
+        Start counting every instruction this cpu runs. Returns the
+        Profiler; stop() it to run at full speed again.
+        """
+        profiler = Profiler(self)
+        profiler.start()
+        return profiler
+
+    def trace(self, size=0x10000):
+        """
+        Start recording the last size instructions this cpu runs.
+        Returns the Tracer; stop() it to run at full speed again.
+        """
+        tracer = Tracer(self, size)
+        tracer.start()
+        return tracer
+
+    def fork(self, forks=None):
+        """
+        Return a new Z80 with the same registers and counters running
+        on a copy on write fork of this one's memory, the one in forks
+        if it was forked already. Profilers, tracers and runners stay
+        with this one.
+        """
+        forks = {} if forks is None else forks
+        child = type(self)(forked(self._mem, forks))
+        for reg in STATE + ("instructions", "halted_cycles"):
+            setattr(child, reg, getattr(self, reg))
+        return child
+
     @property
     def af(self):
         return (self.a << 8) + self.f
@@ -868,7 +965,7 @@ class Z80(object):
     @op_code(0x76, 4)
     def halt(self):
         self.pc += 1
-        # do something silly to stop the cpu.
+        self.halted = True
 
     @op_code(0x77, 8)
     def ld_addr_hl_a(self):
@@ -1575,7 +1672,7 @@ class Z80(object):
 
     @op_code(0xD9, 16)
     def reti(self):
-        # enable interrupts
+        self.ime = True
         addr = self._pop()
         self.pc = addr
 
@@ -1699,7 +1796,7 @@ class Z80(object):
 
     @op_code(0xF3, 4)
     def di(self):
-        # disable interrupts
+        self.ime = False
         self.pc += 1
 
     @op_code(0xF5, 16)
@@ -1741,7 +1838,7 @@ class Z80(object):
 
     @op_code(0xFB, 4)
     def ei(self):
-        # enable interrupts
+        self.ime = True
         self.pc += 1
 
     @op_code(0xFE, 8)